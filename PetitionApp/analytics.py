@@ -0,0 +1,37 @@
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+import counters
+import rollups
+from models import Petition, PetitionCounter
+
+
+# changes whenever a petition or signature is added, removed or validated, a
+# petition is edited (its version is bumped on every update), or the rollups
+# move forward. Cheap enough to run on every dashboard refresh and used as
+# the cache key
+def data_version(db: Session) -> tuple:
+    petitions = db.execute(select(func.count(), func.max(Petition.id), func.coalesce(func.sum(Petition.version), 0))).one()
+    signatures = db.execute(
+        select(func.coalesce(func.sum(PetitionCounter.total), 0),
+               func.coalesce(func.sum(PetitionCounter.validated), 0))
+    ).one()
+    return tuple(petitions) + tuple(signatures) + (rollups.read_watermark(db, 'signature_rollup'),)
+
+
+def petition_totals(db: Session) -> list[dict]:
+    counts = counters.get_all_counts(db)
+    return [
+        {
+            'id': petition.id,
+            'user_id': petition.user_id,
+            'petition_name': petition.petition_name,
+            'signature_count': counts.get(petition.id, {}).get('total', 0),
+            'validated_count': counts.get(petition.id, {}).get('validated', 0),
+        }
+        for petition in db.execute(select(Petition.id, Petition.user_id, Petition.petition_name))
+    ]
+
+
+def daily_signatures(db: Session) -> list[dict]:
+    return rollups.daily_totals(db)
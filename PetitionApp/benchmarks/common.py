@@ -0,0 +1,60 @@
+import os
+import sys
+import tempfile
+import time
+
+# shared setup for the scripts in this directory, run from PetitionApp as
+#   python benchmarks/<name>.py
+# A throwaway SQLite database built by the migrations unless DATABASE_URL
+# points somewhere else (a scratch Postgres gives the numbers that matter)
+APP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+os.environ.setdefault("AUTH_SECRET_KEY", "bench-secret-key-bench-secret-key")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ROLLUP_INTERVAL_SECONDS", "0")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+os.chdir(APP)
+sys.path.insert(0, APP)
+
+
+def migrate():
+    from alembic import command
+    from alembic.config import Config
+
+    command.upgrade(Config(os.path.join(APP, 'alembic.ini')), 'head')
+
+
+def env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, default))
+
+
+def percentile(values: list, p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+def latency_summary(values: list) -> str:
+    return ' '.join(f'p{p}={percentile(values, p) * 1000:.1f}ms' for p in (50, 95, 99))
+
+
+# a user with a known password and one petition to work against
+def seed(db, password_hash: str = None) -> int:
+    from models import Petition, Users
+
+    user = Users(username='bench', email='bench@example.com', role='Admin', is_activate=True,
+                 hashed_password=password_hash)
+    db.add(user)
+    db.flush()
+    petition = Petition(user_id=user.id, petition_name='bench', petition_text='bench')
+    db.add(petition)
+    db.commit()
+    return petition.id
+
+
+class Timer:
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self.started
@@ -0,0 +1,67 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from common import Timer, env_int, migrate, seed
+
+# signature ingest, batched against one commit per signature. First
+# insert_signatures on its own, then POST /signatures/ from CONCURRENCY
+# clients with the batch writer on and off. Commits are counted on the engine
+#   ROWS=5000 CONCURRENCY=32 python benchmarks/ingest.py
+ROWS = env_int('ROWS', 5000)
+CONCURRENCY = env_int('CONCURRENCY', 32)
+
+
+def main():
+    migrate()
+    from sqlalchemy import event
+    from fastapi.testclient import TestClient
+
+    import ingest
+    import main as app_main
+    from database import SessionLocal, engine
+
+    commits = [0]
+    event.listen(engine, 'commit', lambda conn: commits.__setitem__(0, commits[0] + 1))
+
+    db = SessionLocal()
+    petition_id = seed(db)
+    db.close()
+
+    def row(prefix, i):
+        return dict(name='bench', email=f'{prefix}{i}@example.com', phone='1', city='Rio', state='RJ',
+                    show_signature=True, petition_id=petition_id, can_be_contacted=False)
+
+    def run(name, work):
+        commits[0] = 0
+        with Timer() as timer:
+            work()
+        print(f'{name:<34} {ROWS / timer.seconds:8.0f} rows/s  {commits[0] / timer.seconds:8.0f} commits/s  '
+              f'{commits[0]:6d} commits  {timer.seconds:6.2f}s')
+
+    def batches():
+        rows = [row('batch', i) for i in range(ROWS)]
+        for start in range(0, ROWS, ingest.SIGNATURE_BATCH_SIZE):
+            ingest.insert_signatures(rows[start:start + ingest.SIGNATURE_BATCH_SIZE])
+
+    def singles():
+        for i in range(ROWS):
+            ingest.insert_signatures([row('single', i)])
+
+    run(f'insert_signatures, {ingest.SIGNATURE_BATCH_SIZE} per batch', batches)
+    run('insert_signatures, 1 per commit', singles)
+
+    with TestClient(app_main.app) as client:
+        def post_all(prefix):
+            def post(i):
+                response = client.post('/signatures/', json=row(prefix, i))
+                assert response.status_code == 201, response.text
+            with ThreadPoolExecutor(CONCURRENCY) as pool:
+                list(pool.map(post, range(ROWS)))
+
+        run(f'POST x{CONCURRENCY}, unbatched', lambda: post_all('http'))
+        client.portal.call(ingest.signature_writer.start)
+        run(f'POST x{CONCURRENCY}, batch writer', lambda: post_all('writer'))
+        client.portal.call(ingest.signature_writer.stop)
+
+
+if __name__ == '__main__':
+    main()
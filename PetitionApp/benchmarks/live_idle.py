@@ -0,0 +1,117 @@
+import asyncio
+import os
+import resource
+import subprocess
+import sys
+import time
+
+from common import APP, env_int, latency_summary, migrate, seed
+from workers import wait_until_up
+
+# CONNECTIONS idle subscribers on one uvicorn worker's /petitions/{id}/live:
+# the server's resident memory per open stream, then ROUNDS signatures and
+# how long each takes to reach every subscriber. Linux only (reads /proc)
+#   CONNECTIONS=10000 python benchmarks/live_idle.py
+CONNECTIONS = env_int('CONNECTIONS', 2000)
+ROUNDS = env_int('ROUNDS', 5)
+PORT = env_int('PORT', 8766)
+UPDATE_INTERVAL = float(os.environ.setdefault('LIVE_UPDATE_INTERVAL', '1'))
+EVENT = b'event: counts'
+
+
+def rss_kb(pid: int) -> int:
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    raise RuntimeError('no VmRSS')
+
+
+# raw sockets rather than an HTTP client, so the client side stays cheap
+# enough to hold thousands of streams from one process
+async def listen(path: str, arrivals: list, opened: list):
+    reader, writer = await asyncio.open_connection('127.0.0.1', PORT)
+    opened.append(writer)
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: bench\r\nAccept: text/event-stream\r\n\r\n'.encode())
+    await writer.drain()
+    buffer = b''
+    while chunk := await reader.read(4096):
+        buffer += chunk
+        while (found := buffer.find(EVENT)) >= 0:
+            arrivals.append(time.perf_counter())
+            buffer = buffer[found + len(EVENT):]
+        buffer = buffer[-len(EVENT):]
+
+
+async def wait_for(condition, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise RuntimeError('timed out waiting for the subscribers')
+        await asyncio.sleep(0.01)
+
+
+async def bench(server_pid: int, petition_id: int):
+    import httpx
+
+    baseline = rss_kb(server_pid)
+    arrivals = [[] for _ in range(CONNECTIONS)]
+    opened = []
+    path = f'/petitions/{petition_id}/live'
+    listeners = [asyncio.create_task(listen(path, arrivals[n], opened)) for n in range(CONNECTIONS)]
+    await wait_for(lambda: all(arrivals))
+    await asyncio.sleep(1)
+    held = rss_kb(server_pid)
+    print(f'{CONNECTIONS} idle streams: server RSS {baseline / 1024:.1f}MB -> {held / 1024:.1f}MB, '
+          f'{(held - baseline) * 1024 / CONNECTIONS / 1024:.1f}KB per stream')
+
+    row = dict(name='bench', phone='1', city='Rio', state='RJ', show_signature=True,
+               petition_id=petition_id, can_be_contacted=False)
+    async with httpx.AsyncClient(base_url=f'http://127.0.0.1:{PORT}') as client:
+        for round in range(ROUNDS):
+            # past the per-stream throttle, so the update goes out at once
+            await asyncio.sleep(UPDATE_INTERVAL + 0.2)
+            started = time.perf_counter()
+            response = await client.post('/signatures/', json={**row, 'email': f'live{round}@example.com'})
+            assert response.status_code == 201, response.text
+            await wait_for(lambda: all(len(a) >= round + 2 for a in arrivals))
+            latencies = [a[round + 1] - started for a in arrivals]
+            print(f'round {round}: {latency_summary(latencies)}  last={max(latencies) * 1000:.1f}ms')
+
+    for writer in opened:
+        writer.close()
+    for listener in listeners:
+        listener.cancel()
+    await asyncio.gather(*listeners, return_exceptions=True)
+
+
+def main():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))  # inherited by the server
+    if CONNECTIONS + 100 > hard:
+        raise SystemExit(f'open file limit {hard} is too low for {CONNECTIONS} connections')
+
+    migrate()
+    from database import SessionLocal
+
+    db = SessionLocal()
+    petition_id = seed(db)
+    db.close()
+
+    import httpx
+
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'main:app', '--port', str(PORT), '--log-level', 'warning',
+         '--backlog', str(CONNECTIONS)],
+        cwd=APP, env=os.environ.copy())
+    try:
+        with httpx.Client(base_url=f'http://127.0.0.1:{PORT}') as probe:
+            wait_until_up(probe)
+        asyncio.run(bench(server.pid, petition_id))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == '__main__':
+    main()
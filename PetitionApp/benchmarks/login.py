@@ -0,0 +1,58 @@
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from common import env_int, latency_summary, migrate, seed
+
+# login under load: REQUESTS logins from CONCURRENCY clients against the
+# bcrypt pool (HASH_WORKERS, HASH_MAX_PENDING). Reports status codes and
+# p50/p95/p99 per outcome, so a saturated pool shows up as fast 503s rather
+# than slow 200s. Also times a request that doesn't hash while the pool is busy
+#   REQUESTS=256 CONCURRENCY=64 HASH_MAX_PENDING=16 python benchmarks/login.py
+REQUESTS = env_int('REQUESTS', 256)
+CONCURRENCY = env_int('CONCURRENCY', 64)
+
+
+def main():
+    migrate()
+    from fastapi.testclient import TestClient
+
+    import hashing
+    import main as app_main
+    from database import SessionLocal
+
+    db = SessionLocal()
+    seed(db, hashing.bcrypt_context.hash('bench password'))
+    db.close()
+    form = {'username': 'bench', 'password': 'bench password'}
+
+    with TestClient(app_main.app) as client:
+        def login(_):
+            started = time.perf_counter()
+            status = client.post('/auth/token', data=form).status_code
+            return status, time.perf_counter() - started
+
+        def probe():
+            started = time.perf_counter()
+            client.get('/signatures/count/1')
+            return time.perf_counter() - started
+
+        with ThreadPoolExecutor(CONCURRENCY + 1) as pool:
+            started = time.perf_counter()
+            logins = pool.map(login, range(REQUESTS))
+            time.sleep(0.2)
+            probes = [pool.submit(probe).result() for _ in range(10)]
+            results = list(logins)
+            elapsed = time.perf_counter() - started
+
+    print(f'{REQUESTS} logins, {CONCURRENCY} concurrent, HASH_WORKERS={hashing.HASH_WORKERS} '
+          f'HASH_MAX_PENDING={hashing.HASH_MAX_PENDING}: {elapsed:.2f}s, '
+          f'{dict(Counter(status for status, _ in results))}')
+    print(f'{"all":<6} {latency_summary([seconds for _, seconds in results])}')
+    for status in sorted({status for status, _ in results}):
+        print(f'{status:<6} {latency_summary([seconds for s, seconds in results if s == status])}')
+    print(f'{"probe":<6} {latency_summary(probes)}  (non-hashing request during the burst)')
+
+
+if __name__ == '__main__':
+    main()
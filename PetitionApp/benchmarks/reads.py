@@ -0,0 +1,67 @@
+import time
+
+from common import env_int, latency_summary, migrate, seed
+
+# the same petition read READS times by its owner: with the response cache
+# off, with cached bodies, and revalidated with If-None-Match. TEXT_BYTES
+# sizes the petition text so serialization has something to do
+#   READS=2000 TEXT_BYTES=5000 python benchmarks/reads.py
+READS = env_int('READS', 2000)
+TEXT_BYTES = env_int('TEXT_BYTES', 5000)
+
+
+def main():
+    migrate()
+    from datetime import timedelta
+
+    from sqlalchemy import event
+    from fastapi.testclient import TestClient
+
+    import main as app_main
+    from database import SessionLocal, engine
+    from models import Petition
+    from response_cache import response_cache
+    from routers.auth import create_access_token
+
+    queries = [0]
+    event.listen(engine, 'before_cursor_execute', lambda *args: queries.__setitem__(0, queries[0] + 1))
+
+    db = SessionLocal()
+    petition_id = seed(db)
+    petition = db.get(Petition, petition_id)
+    petition.petition_text = 'x' * TEXT_BYTES
+    db.commit()
+    owner_id = petition.user_id
+    db.close()
+
+    headers = {'Authorization': 'Bearer ' + create_access_token('bench', owner_id, 'Admin', timedelta(hours=1))}
+    path = f'/petitions/{petition_id}'
+
+    with TestClient(app_main.app) as client:
+        tag = client.get(path, headers=headers).headers['etag']
+
+        def run(name, request_headers, expected):
+            latencies, sent = [], 0
+            queries[0] = 0
+            started = time.perf_counter()
+            for _ in range(READS):
+                before = time.perf_counter()
+                response = client.get(path, headers=request_headers)
+                latencies.append(time.perf_counter() - before)
+                assert response.status_code == expected, response.status_code
+                sent += len(response.content)
+            seconds = time.perf_counter() - started
+            print(f'{name:<22} {READS / seconds:8.0f} reads/s  {latency_summary(latencies)}  '
+                  f'{queries[0] / READS:.1f} queries/read  {sent // READS:6d} bytes/read')
+
+        maxsize = response_cache.maxsize
+        response_cache.maxsize = 0
+        response_cache.invalidate(lambda key: True)
+        run('cache off', headers, 200)
+        response_cache.maxsize = maxsize
+        run('cached body', headers, 200)
+        run('If-None-Match (304)', {**headers, 'If-None-Match': tag}, 304)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+import asyncio
+import statistics
+
+from common import Timer, env_int, migrate, seed
+
+# one list response of ROWS signatures, the way FastAPI builds it: rows
+# read, validated against the response model, rendered. ORM instances with
+# the stdlib JSONResponse against column mappings with ORJSONResponse, each
+# stage timed REPEAT times (median shown)
+#   ROWS=10000 REPEAT=5 python benchmarks/serialization.py
+ROWS = env_int('ROWS', 10000)
+REPEAT = env_int('REPEAT', 5)
+
+
+def main():
+    migrate()
+    from fastapi.responses import JSONResponse, ORJSONResponse
+    from fastapi.routing import serialize_response
+    from fastapi.utils import create_response_field
+    from sqlalchemy import insert, select
+
+    from database import SessionLocal
+    from models import Signature
+    from schemas import SignatureResponse, response_columns
+
+    db = SessionLocal()
+    petition_id = seed(db)
+    db.execute(insert(Signature), [
+        dict(petition_id=petition_id, name=f'signer {i}', email=f's{i}@example.com', phone='21999990000',
+             city='Rio de Janeiro', state='RJ', show_signature=True, validated_signature=i % 2 == 0,
+             can_be_contacted=False)
+        for i in range(ROWS)])
+    db.commit()
+
+    field = create_response_field(name='response', type_=list[SignatureResponse], mode='serialization')
+
+    def orm_rows():
+        db.expunge_all()
+        return db.query(Signature).filter(Signature.petition_id == petition_id).all()
+
+    def column_rows():
+        stmt = select(*response_columns(Signature, SignatureResponse)).where(Signature.petition_id == petition_id)
+        return db.execute(stmt).mappings().all()
+
+    def validate(rows):
+        return asyncio.run(serialize_response(field=field, response_content=rows))
+
+    def timed(fn, *args):
+        seconds, result = [], None
+        for _ in range(REPEAT):
+            with Timer() as timer:
+                result = fn(*args)
+            seconds.append(timer.seconds)
+        return statistics.median(seconds), result
+
+    for name, read, response_class in (('ORM + JSONResponse', orm_rows, JSONResponse),
+                                       ('columns + ORJSONResponse', column_rows, ORJSONResponse)):
+        read_s, rows = timed(read)
+        validate_s, content = timed(validate, rows)
+        render_s, body = timed(lambda: response_class(content).body)
+        total = read_s + validate_s + render_s
+        print(f'{name:<26} read {read_s * 1000:7.1f}ms  validate {validate_s * 1000:7.1f}ms  '
+              f'render {render_s * 1000:7.1f}ms  total {total * 1000:7.1f}ms  {len(body) // 1024}KB')
+    db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+from datetime import timedelta
+
+from common import APP, env_int, latency_summary, migrate, seed
+
+# read throughput of a real server at 1, 4 and 16 uvicorn workers:
+# CONCURRENCY clients spend SECONDS on a mix of petition reads, signature
+# counts and complaint lists. Run it against Postgres for numbers that mean
+# anything, SQLite serializes on its file lock
+#   DATABASE_URL=postgresql://... WORKERS=1,4,16 python benchmarks/workers.py
+WORKERS = [int(n) for n in os.getenv('WORKERS', '1,4,16').split(',')]
+CONCURRENCY = env_int('CONCURRENCY', 64)
+SECONDS = env_int('SECONDS', 10)
+PORT = env_int('PORT', 8765)
+
+
+def wait_until_up(client, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            client.get('/')
+            return
+        except Exception:
+            time.sleep(0.2)
+    raise RuntimeError('server did not start')
+
+
+def run(workers: int, paths: list, headers: dict):
+    import httpx
+
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'main:app', '--port', str(PORT), '--workers', str(workers),
+         '--log-level', 'warning'],
+        cwd=APP, env=os.environ.copy())
+    try:
+        base = f'http://127.0.0.1:{PORT}'
+        with httpx.Client(base_url=base) as probe:
+            wait_until_up(probe)
+        latencies, errors = [], [0]
+        deadline = time.monotonic() + SECONDS
+
+        def client_loop(offset: int):
+            with httpx.Client(base_url=base, headers=headers, timeout=30) as client:
+                i = offset
+                while time.monotonic() < deadline:
+                    started = time.perf_counter()
+                    if client.get(paths[i % len(paths)]).status_code >= 400:
+                        errors[0] += 1
+                    latencies.append(time.perf_counter() - started)
+                    i += 1
+
+        threads = [threading.Thread(target=client_loop, args=(n,)) for n in range(CONCURRENCY)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        print(f'{workers:3d} workers: {len(latencies) / SECONDS:8.0f} req/s  {latency_summary(latencies)}  '
+              f'errors={errors[0]}')
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    migrate()
+    from database import SessionLocal
+    from models import Complaint, Petition, Signature
+    from routers.auth import create_access_token
+
+    db = SessionLocal()
+    petition_id = seed(db)
+    db.add_all([Signature(petition_id=petition_id, email=f'w{i}@example.com', name='bench') for i in range(100)])
+    db.add_all([Complaint(name='bench', city='Rio', state='RJ', complaint_type=1, complaint_text='x') for _ in range(50)])
+    db.commit()
+    owner_id = db.get(Petition, petition_id).user_id
+    db.close()
+
+    headers = {'Authorization': 'Bearer ' + create_access_token('bench', owner_id, 'Admin', timedelta(hours=1))}
+    paths = [f'/petitions/{petition_id}', f'/signatures/count/{petition_id}', '/complaints/?limit=20']
+    for workers in WORKERS:
+        run(workers, paths, headers)
+
+
+if __name__ == '__main__':
+    main()
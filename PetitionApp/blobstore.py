@@ -0,0 +1,122 @@
+import base64
+import binascii
+import hashlib
+import os
+import re
+import tempfile
+from abc import ABC, abstractmethod
+
+
+BLOB_STORE_ROOT = os.getenv("BLOB_STORE_ROOT", "blobs")
+CHUNK_SIZE = 64 * 1024
+
+_DIGEST = re.compile(r'^[0-9a-f]{64}$')
+_SIGNATURES = [
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+]
+
+
+def is_digest(digest: str) -> bool:
+    return bool(_DIGEST.match(digest))
+
+
+def sniff_content_type(head: bytes) -> str:
+    for magic, content_type in _SIGNATURES:
+        if head.startswith(magic):
+            return content_type
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    return 'application/octet-stream'
+
+
+# accepts plain base64 or a data: URI, raises ValueError on anything else
+def decode_image(value: str) -> bytes:
+    if value.startswith('data:'):
+        value = value.partition(',')[2]
+    try:
+        return base64.b64decode(value, validate=True)
+    except (binascii.Error, ValueError):
+        raise ValueError('images must be base64 encoded')
+
+
+# content-addressed storage: a blob's key is the sha256 of its bytes, so
+# storing the same image twice keeps a single copy
+class BlobStore(ABC):
+    @abstractmethod
+    def put(self, data: bytes) -> str:
+        ...
+
+    @abstractmethod
+    def exists(self, digest: str) -> bool:
+        ...
+
+    @abstractmethod
+    def size(self, digest: str) -> int:
+        ...
+
+    @abstractmethod
+    def iter(self, digest: str, chunk_size: int = CHUNK_SIZE):
+        ...
+
+    @abstractmethod
+    def delete(self, digest: str):
+        ...
+
+    def content_type(self, digest: str) -> str:
+        return sniff_content_type(next(self.iter(digest, 16), b''))
+
+
+class LocalBlobStore(BlobStore):
+    def __init__(self, root: str):
+        self.root = root
+
+    def path(self, digest: str) -> str:
+        if not is_digest(digest):
+            raise ValueError('invalid blob digest')
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def put(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        if os.path.exists(path):
+            return digest
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write aside and rename so readers never see a partial blob
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        return digest
+
+    def exists(self, digest: str) -> bool:
+        return is_digest(digest) and os.path.exists(self.path(digest))
+
+    def size(self, digest: str) -> int:
+        return os.path.getsize(self.path(digest))
+
+    def iter(self, digest: str, chunk_size: int = CHUNK_SIZE):
+        with open(self.path(digest), 'rb') as f:
+            while chunk := f.read(chunk_size):
+                yield chunk
+
+    def delete(self, digest: str):
+        try:
+            os.unlink(self.path(digest))
+        except FileNotFoundError:
+            pass
+
+
+blob_store = LocalBlobStore(BLOB_STORE_ROOT)
+
+
+def store_image(value: str | None) -> str | None:
+    if not value:
+        return None
+    return blob_store.put(decode_image(value))
@@ -0,0 +1,205 @@
+import csv
+import hashlib
+import io
+import os
+
+from anyio import from_thread
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, upsert
+from models import Signature, SignatureImport, SignatureImportError
+import counters
+import dedup
+import jobs
+import live
+
+
+IMPORT_CHUNK = int(os.getenv("IMPORT_CHUNK", "1000"))
+EXPORT_CHUNK = int(os.getenv("EXPORT_CHUNK", "1000"))
+IMPORT_ERROR_PREVIEW = 100
+
+IMPORT_COLUMNS = ('name', 'email', 'phone', 'city', 'state', 'show_signature', 'can_be_contacted')
+EXPORT_COLUMNS = ('id', 'name', 'email', 'phone', 'city', 'state', 'show_signature', 'can_be_contacted',
+                  'validated_signature', 'created_at')
+
+
+# another upload of the same file is already working through it
+class ImportConflict(Exception):
+    pass
+
+
+def file_digest(file) -> str:
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in iter(lambda: file.read(1 << 20), b''):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def _describe(error: ValidationError) -> str:
+    return '; '.join(f"{'.'.join(str(part) for part in e['loc'])}: {e['msg']}" for e in error.errors())
+
+
+# handed back to the event loop, where the deduper and the live broker live
+def _announce(petition_id: int, emails: list[str]):
+    for email in emails:
+        dedup.deduper.add(petition_id, email)
+    live.publish_counts(petition_id, total=len(emails))
+
+
+# validates one chunk of (row number, csv row) and inserts the good rows in a
+# single multi-row INSERT. Rows already signed are skipped by the unique
+# index rather than failing the batch. Errors, counters and the job's
+# progress are committed together with the rows
+def _import_chunk(db: Session, import_id: int, petition_id: int, position: int, chunk: list, validate, done: bool):
+    job = db.scalar(select(SignatureImport).where(SignatureImport.id == import_id).with_for_update())
+    if job.rows_done != position:
+        db.rollback()
+        raise ImportConflict()
+
+    rows, errors, seen = [], [], set()
+    for number, row in chunk:
+        try:
+            signature = validate(**{column: row.get(column) for column in IMPORT_COLUMNS}, petition_id=petition_id)
+        except ValidationError as e:
+            errors.append((number, _describe(e)))
+            continue
+        key = dedup.normalize_email(signature.email)
+        if key in seen:
+            errors.append((number, 'Duplicate email in file'))
+            continue
+        seen.add(key)
+        rows.append((number, {**signature.model_dump(), 'validated_signature': False}))
+
+    inserted = []
+    if rows:
+        stmt = upsert(db, Signature).on_conflict_do_nothing().returning(Signature.id, Signature.email_normalized)
+        created = db.execute(stmt, [row for _, row in rows]).all()
+        added = {email for _, email in created}
+        inserted = [row['email'] for _, row in rows if dedup.normalize_email(row['email']) in added]
+        errors.extend((number, 'Petition already signed with this email')
+                      for number, row in rows if dedup.normalize_email(row['email']) not in added)
+        # imported signers get the same validation link as those signing online
+        jobs.enqueue_many(db, 'validation_email', [{'signature_id': id} for id, _ in created])
+    if errors:
+        db.execute(insert(SignatureImportError),
+                   [{'import_id': import_id, 'row': number, 'message': message} for number, message in errors])
+    if inserted:
+        counters.increment_many(db, {petition_id: (len(inserted), 0)})
+
+    job.rows_done = position + len(chunk)
+    job.inserted += len(inserted)
+    job.failed += len(errors)
+    if done:
+        job.status = 'done'
+    db.commit()
+    if inserted:
+        from_thread.run_sync(_announce, petition_id, list(inserted))
+
+
+# runs in the threadpool on the spooled upload. The same file uploaded again
+# for the same petition resumes its import instead of starting over
+def import_csv(file, petition_id: int, user_id: int, validate) -> int:
+    digest = file_digest(file)
+    text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+    db = SessionLocal()
+    try:
+        reader = csv.DictReader(text)
+        missing = [column for column in IMPORT_COLUMNS if column not in (reader.fieldnames or ())]
+        if missing:
+            raise ValueError('Missing columns: ' + ', '.join(missing))
+
+        job = db.scalar(
+            select(SignatureImport)
+            .where(SignatureImport.petition_id == petition_id, SignatureImport.digest == digest)
+            .order_by(SignatureImport.id.desc())
+        )
+        if job is None:
+            job = SignatureImport(petition_id=petition_id, user_id=user_id, digest=digest)
+            db.add(job)
+            db.commit()
+        import_id, position = job.id, job.rows_done
+        if job.status == 'done':
+            return import_id
+
+        chunk = []
+        try:
+            for number, row in enumerate(reader, 1):
+                if number <= position:
+                    continue
+                chunk.append((number, row))
+                if len(chunk) == IMPORT_CHUNK:
+                    _import_chunk(db, import_id, petition_id, position, chunk, validate, done=False)
+                    position += len(chunk)
+                    chunk = []
+        except (UnicodeDecodeError, csv.Error) as e:
+            raise ValueError(f'Unreadable CSV after row {position + len(chunk)}: {e}')
+        _import_chunk(db, import_id, petition_id, position, chunk, validate, done=True)
+        return import_id
+    finally:
+        db.close()
+        text.detach()
+
+
+def import_summary(db: Session, import_id: int) -> dict | None:
+    job = db.get(SignatureImport, import_id)
+    if job is None:
+        return None
+    errors = db.execute(
+        select(SignatureImportError.row, SignatureImportError.message)
+        .where(SignatureImportError.import_id == import_id)
+        .order_by(SignatureImportError.row)
+        .limit(IMPORT_ERROR_PREVIEW)
+    )
+    return {
+        'id': job.id,
+        'petition_id': job.petition_id,
+        'user_id': job.user_id,
+        'status': job.status,
+        'rows_done': job.rows_done,
+        'inserted': job.inserted,
+        'failed': job.failed,
+        'errors': [{'row': row, 'message': message} for row, message in errors],
+    }
+
+
+# CSV body read through a server-side cursor, one chunk of rows at a time,
+# so memory stays flat whatever the size. Opens its own session since the
+# request's is closed before the body is sent
+def stream_csv(stmt, columns):
+    stmt = stmt.execution_options(yield_per=EXPORT_CHUNK)
+
+    def lines():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        db = SessionLocal()
+        try:
+            for chunk in db.execute(stmt).partitions():
+                writer.writerows(chunk)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            yield buffer.getvalue()
+        finally:
+            db.close()
+
+    return lines()
+
+
+def export_signatures(petition_id: int):
+    columns = [getattr(Signature, column) for column in EXPORT_COLUMNS]
+    stmt = select(*columns).where(Signature.petition_id == petition_id).order_by(Signature.id)
+    return stream_csv(stmt, EXPORT_COLUMNS)
+
+
+def export_errors(import_id: int):
+    stmt = (
+        select(SignatureImportError.row, SignatureImportError.message)
+        .where(SignatureImportError.import_id == import_id)
+        .order_by(SignatureImportError.row)
+    )
+    return stream_csv(stmt, ('row', 'message'))
@@ -0,0 +1,85 @@
+import os
+import random
+
+from sqlalchemy import func, select, delete, insert, literal
+from sqlalchemy.orm import Session
+
+from database import upsert
+from models import PetitionCounter, Signature
+
+
+# number of counter rows per petition, writers pick one at random so
+# concurrent signatures on a hot petition don't queue on the same row lock
+COUNTER_SHARDS = int(os.getenv("COUNTER_SHARDS", "16"))
+
+
+# apply {petition_id: (total_delta, validated_delta)} inside the caller's transaction
+def increment_many(db: Session, deltas: dict):
+    for petition_id, (total, validated) in deltas.items():
+        if not total and not validated:
+            continue
+        stmt = upsert(db, PetitionCounter).values(
+            petition_id=petition_id,
+            shard=random.randrange(COUNTER_SHARDS),
+            total=total,
+            validated=validated,
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[PetitionCounter.petition_id, PetitionCounter.shard],
+            set_={
+                'total': PetitionCounter.total + stmt.excluded.total,
+                'validated': PetitionCounter.validated + stmt.excluded.validated,
+            },
+        )
+        db.execute(stmt)
+
+
+def increment(db: Session, petition_id: int, total: int = 0, validated: int = 0):
+    increment_many(db, {petition_id: (total, validated)})
+
+
+def get_counts(db: Session, petition_id: int) -> dict:
+    total, validated = db.execute(
+        select(func.coalesce(func.sum(PetitionCounter.total), 0),
+               func.coalesce(func.sum(PetitionCounter.validated), 0))
+        .where(PetitionCounter.petition_id == petition_id)
+    ).one()
+    return {'petition_id': petition_id, 'total': total, 'validated': validated}
+
+
+def get_all_counts(db: Session, petition_ids=None) -> dict:
+    stmt = (
+        select(PetitionCounter.petition_id,
+               func.sum(PetitionCounter.total),
+               func.sum(PetitionCounter.validated))
+        .group_by(PetitionCounter.petition_id)
+    )
+    if petition_ids is not None:
+        stmt = stmt.where(PetitionCounter.petition_id.in_(petition_ids))
+    return {
+        petition_id: {'petition_id': petition_id, 'total': total, 'validated': validated}
+        for petition_id, total, validated in db.execute(stmt)
+    }
+
+
+def drop(db: Session, petition_id: int):
+    db.execute(delete(PetitionCounter).where(PetitionCounter.petition_id == petition_id))
+
+
+# recompute counters from the signature table, for backfills or after manual edits
+def rebuild(db: Session, petition_id: int | None = None):
+    counts = (
+        select(Signature.petition_id,
+               literal(0).label('shard'),
+               func.count().label('total'),
+               func.count().filter(Signature.validated_signature.is_(True)).label('validated'))
+        .where(Signature.petition_id.is_not(None))
+        .group_by(Signature.petition_id)
+    )
+    clear = delete(PetitionCounter)
+    if petition_id is not None:
+        counts = counts.where(Signature.petition_id == petition_id)
+        clear = clear.where(PetitionCounter.petition_id == petition_id)
+    db.execute(clear)
+    db.execute(insert(PetitionCounter).from_select(['petition_id', 'shard', 'total', 'validated'], counts))
+    db.commit()
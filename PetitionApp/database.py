@@ -1,5 +1,9 @@
+from typing import Annotated
+from fastapi import Depends
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.ext.declarative import declarative_base
 import os
 from dotenv import load_dotenv
@@ -9,10 +13,55 @@ PSQL_PASSWORD=os.getenv("PSQL_PASSWORD")
 HOST=os.getenv("HOST")
 DATABASE=os.getenv("DATABASE")
 
-SQLALCHEMY_DATABASE_URL = f'postgresql://postgres:{PSQL_PASSWORD}@{HOST}/{DATABASE}'
+# DATABASE_URL overrides the Postgres settings above, e.g. sqlite:///test.db for the tests
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL") or f'postgresql://postgres:{PSQL_PASSWORD}@{HOST}/{DATABASE}'
+ASYNC_DATABASE_URL = (SQLALCHEMY_DATABASE_URL.replace('postgresql://', 'postgresql+asyncpg://', 1)
+                      .replace('sqlite://', 'sqlite+aiosqlite://', 1))
+# the schema belongs to the Alembic migrations (alembic upgrade head). 1
+# also creates missing tables at startup, for throwaway databases
+DB_CREATE_ALL = os.getenv("DB_CREATE_ALL", "0") == "1"
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+# connection pool settings, applied to both the sync and the async engine
+POOL_SETTINGS = {
+    'pool_size': int(os.getenv("DB_POOL_SIZE", "10")),
+    'max_overflow': int(os.getenv("DB_MAX_OVERFLOW", "20")),
+    'pool_timeout': int(os.getenv("DB_POOL_TIMEOUT", "30")),
+    'pool_recycle': int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    'pool_pre_ping': os.getenv("DB_POOL_PRE_PING", "1") == "1",
+}
+
+# SQLite picks its own pool, which doesn't take these
+_pool_settings = POOL_SETTINGS if SQLALCHEMY_DATABASE_URL.startswith('postgresql') else {}
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **_pool_settings)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **_pool_settings)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
 
 Base = declarative_base()  
+
+
+# session dependencies used by every router
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+db_dependency = Annotated[Session, Depends(get_db)]
+async_db_dependency = Annotated[AsyncSession, Depends(get_async_db)]
+
+
+# INSERT ... ON CONFLICT for whichever backend the session is bound to
+def upsert(db: Session, model):
+    if db.get_bind().dialect.name == 'postgresql':
+        return postgresql.insert(model)
+    return sqlite.insert(model)
@@ -0,0 +1,168 @@
+import asyncio
+import hashlib
+import logging
+import math
+import os
+
+from sqlalchemy import exists, func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from database import SessionLocal
+from models import Signature, normalize_email
+
+logger = logging.getLogger(__name__)
+
+DEDUP_PREFILTER = os.getenv("DEDUP_PREFILTER", "1") == "1"
+DEDUP_ERROR_RATE = float(os.getenv("DEDUP_ERROR_RATE", "0.01"))
+DEDUP_INITIAL_CAPACITY = int(os.getenv("DEDUP_INITIAL_CAPACITY", "1024"))
+# bloom filters can't forget, so deleted signatures stay in them as false
+# positives until the next rebuild. 0 only loads them at startup
+DEDUP_REBUILD_SECONDS = int(os.getenv("DEDUP_REBUILD_SECONDS", "3600"))
+# the filters hold every signature in memory, ~1.2 bytes per email at the
+# default error rate plus ~1.2KB per petition. Past this many signatures the
+# prefilter stays off and every check goes to the index
+DEDUP_MAX_ENTRIES = int(os.getenv("DEDUP_MAX_ENTRIES", "5000000"))
+
+
+class DuplicateSignature(Exception):
+    pass
+
+
+# Postgres names the index, SQLite the columns
+def is_duplicate_error(error: IntegrityError) -> bool:
+    message = str(error.orig)
+    return 'ux_signature_petition_email' in message or 'signature.email_normalized' in message
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+# chain of bloom filters that doubles in capacity as a petition grows, so
+# small petitions stay small. Each new filter halves its error rate, which
+# keeps the combined rate under `error_rate` however long the chain gets
+class ScalableBloomFilter:
+    def __init__(self, capacity: int, error_rate: float):
+        self.filters = [BloomFilter(capacity, error_rate / 2)]
+        self.error_rates = [error_rate / 2]
+
+    def add(self, item: str):
+        last = self.filters[-1]
+        if last.count >= last.capacity:
+            self.error_rates.append(self.error_rates[-1] / 2)
+            last = BloomFilter(last.capacity * 2, self.error_rates[-1])
+            self.filters.append(last)
+        last.add(item)
+
+    def __contains__(self, item: str) -> bool:
+        return any(item in f for f in self.filters)
+
+
+# per-petition prefilter in front of the unique index. A negative answer is
+# certain and skips the lookup; a positive one is confirmed in the database,
+# so a false positive never turns a signer away. Filled from the event loop;
+# checks run in the threadpool and only read the bits. One racing with the
+# add of the same email can miss it, the unique index still catches that
+class SignatureDeduper:
+    def __init__(self, error_rate: float, initial_capacity: int, max_entries: int):
+        self.error_rate = error_rate
+        self.initial_capacity = initial_capacity
+        self.max_entries = max_entries
+        self.filters = {}
+        self.loaded = False
+        self.rebuilding = None
+        self.stats = {'checked': 0, 'skipped_lookup': 0, 'blocked': 0, 'false_positives': 0, 'blocked_by_index': 0}
+
+    def _add(self, filters: dict, petition_id: int, email: str):
+        bloom = filters.get(petition_id)
+        if bloom is None:
+            bloom = filters[petition_id] = ScalableBloomFilter(self.initial_capacity, self.error_rate)
+        bloom.add(email)
+
+    def add(self, petition_id: int, email: str):
+        if self.loaded:
+            self._add(self.filters, petition_id, normalize_email(email))
+        rebuilding = self.rebuilding
+        if rebuilding is not None:
+            rebuilding.append((petition_id, normalize_email(email)))
+
+    # rebuilt from the database at startup and every DEDUP_REBUILD_SECONDS.
+    # Adds made while the table is read are replayed into the new filters
+    # once they replace the old ones
+    def load(self):
+        filters = {}
+        self.rebuilding = []
+        db = SessionLocal()
+        try:
+            total = db.scalar(select(func.count()).select_from(Signature))
+            if total > self.max_entries:
+                logger.warning('%d signatures is over DEDUP_MAX_ENTRIES, dedup prefilter disabled', total)
+                self.loaded = False
+                self.filters = {}
+                self.rebuilding = None
+                return
+            rows = db.execute(
+                select(Signature.petition_id, Signature.email_normalized)
+                .where(Signature.petition_id.is_not(None), Signature.email_normalized.is_not(None))
+                .execution_options(yield_per=10000)
+            )
+            for petition_id, email in rows:
+                self._add(filters, petition_id, email)
+        except BaseException:
+            self.rebuilding = None
+            raise
+        finally:
+            db.close()
+        self.filters = filters
+        self.loaded = True
+        added, self.rebuilding = self.rebuilding, None
+        for petition_id, email in added:
+            self._add(filters, petition_id, email)
+
+    def is_duplicate(self, db: Session, petition_id: int, email: str) -> bool:
+        self.stats['checked'] += 1
+        key = normalize_email(email)
+        if self.loaded:
+            bloom = self.filters.get(petition_id)
+            if bloom is None or key not in bloom:
+                self.stats['skipped_lookup'] += 1
+                return False
+        found = db.scalar(select(exists().where(Signature.petition_id == petition_id, Signature.email_normalized == key)))
+        if found:
+            self.stats['blocked'] += 1
+        elif self.loaded:
+            self.stats['false_positives'] += 1
+        return found
+
+
+deduper = SignatureDeduper(DEDUP_ERROR_RATE, DEDUP_INITIAL_CAPACITY, DEDUP_MAX_ENTRIES)
+
+
+async def rebuild_forever(interval: int = DEDUP_REBUILD_SECONDS):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_in_threadpool(deduper.load)
+        except Exception:
+            logger.exception('dedup rebuild failed')
@@ -0,0 +1,138 @@
+import base64
+import json
+import os
+import re
+
+from sqlalchemy import REAL, and_, bindparam, cast, func, inspect, literal_column, or_, select, text
+from sqlalchemy.orm import Session
+
+from models import Complaint, Petition
+
+
+SEARCH_CONFIG = os.getenv("SEARCH_CONFIG", "portuguese")
+
+# what is indexed per kind, weighted in this order, and what a hit returns
+TARGETS = {
+    'petition': (Petition, ('petition_name', 'petition_text'), ('id', 'user_id', 'petition_name')),
+    'complaint': (Complaint, ('complaint_text',), ('id', 'complaint_type', 'city', 'state', 'complaint_text')),
+}
+_WEIGHTS = 'ABCD'
+
+
+# Postgres keeps a weighted tsvector as a generated column, so inserts,
+# updates and deletes maintain the GIN index with no application code.
+# SQLite gets FTS5 external-content tables kept in step by triggers.
+# Every statement is safe to run again
+def index_statements(dialect: str, kinds=TARGETS) -> list[str]:
+    statements = []
+    for kind in kinds:
+        model, columns, _ = TARGETS[kind]
+        table = model.__tablename__
+        if dialect == 'postgresql':
+            vector = ' || '.join(
+                f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce({column}, '')), '{_WEIGHTS[i]}')"
+                for i, column in enumerate(columns))
+            statements += [
+                f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector '
+                f'GENERATED ALWAYS AS ({vector}) STORED',
+                f'CREATE INDEX IF NOT EXISTS ix_{table}_search_vector ON {table} USING gin (search_vector)',
+            ]
+            continue
+        fts = f'{kind}_fts'
+        names = ', '.join(columns)
+        new = ', '.join(f'new.{column}' for column in columns)
+        old = ', '.join(f'old.{column}' for column in columns)
+        statements += [
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({names}, content='{table}', "
+            f"content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+            f'CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN '
+            f'INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new}); END',
+            f'CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN '
+            f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old}); END",
+            f'CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {table} BEGIN '
+            f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old}); "
+            f'INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new}); END',
+        ]
+    return statements
+
+
+# only for the kinds that have no index yet: even a no-op ALTER TABLE takes
+# an exclusive lock on Postgres. On SQLite a new index is filled from its table
+def create_index(conn):
+    if conn.dialect.name == 'postgresql':
+        inspector = inspect(conn)
+        missing = [kind for kind, (model, _, _) in TARGETS.items()
+                   if 'search_vector' not in {c['name'] for c in inspector.get_columns(model.__tablename__)}]
+    else:
+        existing = {name for name, in conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'table'"))}
+        missing = [kind for kind in TARGETS if f'{kind}_fts' not in existing]
+    for statement in index_statements(conn.dialect.name, missing):
+        conn.execute(text(statement))
+    if conn.dialect.name != 'postgresql':
+        for kind in missing:
+            conn.execute(text(f"INSERT INTO {kind}_fts({kind}_fts) VALUES ('rebuild')"))
+
+
+# run at startup next to create_all, when DB_CREATE_ALL is on
+def ensure_index(engine):
+    with engine.begin() as conn:
+        create_index(conn)
+
+
+def encode_cursor(rank: float, id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([rank, id]).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[float, int]:
+    try:
+        rank, id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(rank), int(id)
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+
+
+# FTS5 has its own query syntax, user input is reduced to quoted terms that
+# must all match
+def _fts5_query(q: str) -> str:
+    return ' '.join(f'"{term}"' for term in re.findall(r'\w+', q))
+
+
+def _after(rank, id_column, cursor, rank_type=None):
+    after_rank, after_id = cursor
+    bound = bindparam('after_rank', after_rank)
+    if rank_type is not None:
+        bound = cast(bound, rank_type)
+    return or_(rank < bound, and_(rank == bound, id_column > after_id))
+
+
+# best matches first, ties broken by id. `cursor` is the (rank, id) of the
+# last hit of the previous page
+def search(db: Session, kind: str, q: str, limit: int, cursor: tuple[float, int] | None = None) -> list[dict]:
+    model, columns, returned = TARGETS[kind]
+    table = model.__table__
+    if db.get_bind().dialect.name == 'postgresql':
+        query = func.websearch_to_tsquery(literal_column(f"'{SEARCH_CONFIG}'::regconfig"), q)
+        vector = literal_column(f'{table.name}.search_vector')
+        # ts_rank is a float4, the cursor is compared as one so ties stay exact
+        rank = func.ts_rank_cd(vector, query)
+        stmt = select(*(table.c[name] for name in returned), rank.label('rank')).where(vector.op('@@')(query))
+        if cursor is not None:
+            stmt = stmt.where(_after(rank, table.c.id, cursor, REAL))
+    else:
+        terms = _fts5_query(q)
+        if not terms:
+            return []
+        fts = f'{kind}_fts'
+        weights = ', '.join('10.0' if i == 0 else '1.0' for i in range(len(columns)))
+        hits = (
+            select(literal_column('rowid').label('id'), (-func.bm25(literal_column(fts), text(weights))).label('rank'))
+            .select_from(text(fts))
+            .where(literal_column(fts).op('MATCH')(terms))
+            .subquery()
+        )
+        rank = hits.c.rank
+        stmt = select(*(table.c[name] for name in returned), rank).join(hits, hits.c.id == table.c.id)
+        if cursor is not None:
+            stmt = stmt.where(_after(rank, table.c.id, cursor))
+    stmt = stmt.order_by(rank.desc(), table.c.id).limit(limit)
+    return [dict(row) for row in db.execute(stmt).mappings()]
@@ -0,0 +1,165 @@
+import re
+import unicodedata
+
+from sqlalchemy import case, delete, func, select, update
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, upsert
+from models import Complaint, GeoRollup, Signature
+import rollups
+
+
+# default number of states and of cities /stats/geo returns, largest first
+GEO_TOP = 50
+
+_STATES = {
+    'AC': 'acre', 'AL': 'alagoas', 'AP': 'amapa', 'AM': 'amazonas', 'BA': 'bahia',
+    'CE': 'ceara', 'DF': 'distrito federal', 'ES': 'espirito santo', 'GO': 'goias',
+    'MA': 'maranhao', 'MT': 'mato grosso', 'MS': 'mato grosso do sul', 'MG': 'minas gerais',
+    'PA': 'para', 'PB': 'paraiba', 'PR': 'parana', 'PE': 'pernambuco', 'PI': 'piaui',
+    'RJ': 'rio de janeiro', 'RN': 'rio grande do norte', 'RS': 'rio grande do sul',
+    'RO': 'rondonia', 'RR': 'roraima', 'SC': 'santa catarina', 'SP': 'sao paulo',
+    'SE': 'sergipe', 'TO': 'tocantins',
+}
+_STATE_CODES = {name: code for code, name in _STATES.items()}
+_STATE_CODES.update({code.lower(): code for code in _STATES})
+
+
+# "  São   PAULO " -> "sao paulo"
+def fold(value: str | None) -> str:
+    if not value:
+        return ''
+    value = unicodedata.normalize('NFKD', value)
+    value = ''.join(c for c in value if not unicodedata.combining(c))
+    value = re.sub(r'[^\w\s]', ' ', value.casefold())
+    return ' '.join(value.split())
+
+
+# Brazilian states collapse to their two-letter code, anything else is kept folded
+def normalize_state(value: str | None) -> str:
+    key = fold(value)
+    return _STATE_CODES.get(key, key.upper())[:50]
+
+
+def normalize_city(value: str | None) -> str:
+    return fold(value).title()[:100]
+
+
+# removals only lower rows that exist and never below zero: a complaint
+# created before the backfill ran has no row to take from
+def _add(db: Session, source: str, deltas: dict):
+    for (scope_id, state, city), total in deltas.items():
+        if not total:
+            continue
+        if total < 0:
+            db.execute(
+                update(GeoRollup)
+                .where(GeoRollup.source == source, GeoRollup.scope_id == scope_id,
+                       GeoRollup.state == state, GeoRollup.city == city, GeoRollup.total > 0)
+                .values(total=case((GeoRollup.total + total > 0, GeoRollup.total + total), else_=0))
+            )
+            continue
+        stmt = upsert(db, GeoRollup).values(source=source, scope_id=scope_id, state=state, city=city, total=total)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['source', 'scope_id', 'state', 'city'],
+            set_={'total': GeoRollup.total + stmt.excluded.total},
+        )
+        db.execute(stmt)
+
+
+# called by the complaint handlers inside their transaction, delta is +1 or -1
+def record_complaint(db: Session, complaint_type, state, city, delta: int):
+    if complaint_type is None:
+        return
+    _add(db, 'complaint', {(complaint_type, normalize_state(state), normalize_city(city)): delta})
+
+
+# the spelling normalization happens in Python, so signatures are read as
+# (petition, state, city) groups rather than rows
+def _fold_signatures(db: Session, lower: int, upper: int):
+    deltas = {}
+    groups = db.execute(
+        select(Signature.petition_id, Signature.state, Signature.city, func.count())
+        .where(Signature.id > lower, Signature.id <= upper, Signature.petition_id.is_not(None))
+        .group_by(Signature.petition_id, Signature.state, Signature.city)
+    )
+    for petition_id, state, city, total in groups:
+        key = (petition_id, normalize_state(state), normalize_city(city))
+        deltas[key] = deltas.get(key, 0) + total
+    _add(db, 'signature', deltas)
+
+
+# background job, folds the next batch of signatures into the rollup
+def refresh_signatures() -> int:
+    db = SessionLocal()
+    try:
+        watermark = rollups.lock_watermark(db, 'signature_geo')
+        last_id = watermark.last_id
+        upper = rollups.next_upper(db, last_id, rollups.ROLLUP_BATCH)
+        if upper is None:
+            db.commit()
+            return 0
+        _fold_signatures(db, last_id, upper)
+        watermark.last_id = upper
+        db.commit()
+        return upper - last_id
+    finally:
+        db.close()
+
+
+# the signature half of the rollup rebuilt below the watermark, same as
+# rollups.reconcile. Complaints are kept exact by their handlers
+def reconcile_signatures():
+    db = SessionLocal()
+    try:
+        watermark = rollups.lock_watermark(db, 'signature_geo')
+        db.execute(delete(GeoRollup).where(GeoRollup.source == 'signature'))
+        _fold_signatures(db, 0, watermark.last_id)
+        db.commit()
+    finally:
+        db.close()
+
+
+def counts(db: Session, source: str, scope_id: int, limit: int = GEO_TOP) -> dict:
+    scope = (GeoRollup.source == source, GeoRollup.scope_id == scope_id, GeoRollup.total > 0)
+    states = db.execute(
+        select(GeoRollup.state, func.sum(GeoRollup.total).label('total'))
+        .where(*scope)
+        .group_by(GeoRollup.state)
+        .order_by(func.sum(GeoRollup.total).desc())
+        .limit(limit)
+    )
+    cities = db.execute(
+        select(GeoRollup.state, GeoRollup.city, GeoRollup.total)
+        .where(*scope)
+        .order_by(GeoRollup.total.desc())
+        .limit(limit)
+    )
+    return {
+        'states': [{'state': state, 'total': total} for state, total in states],
+        'cities': [{'state': state, 'city': city, 'total': total} for state, city, total in cities],
+    }
+
+
+# one-off backfill for complaints created before the rollup existed
+def rebuild_complaints():
+    db = SessionLocal()
+    try:
+        db.execute(delete(GeoRollup).where(GeoRollup.source == 'complaint'))
+        deltas = {}
+        groups = db.execute(
+            select(Complaint.complaint_type, Complaint.state, Complaint.city, func.count())
+            .where(Complaint.complaint_type.is_not(None))
+            .group_by(Complaint.complaint_type, Complaint.state, Complaint.city)
+        )
+        for complaint_type, state, city, total in groups:
+            key = (complaint_type, normalize_state(state), normalize_city(city))
+            deltas[key] = deltas.get(key, 0) + total
+        _add(db, 'complaint', deltas)
+        db.commit()
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    rebuild_complaints()
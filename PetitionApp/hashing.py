@@ -0,0 +1,62 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+from passlib.context import CryptContext
+from starlette import status
+
+
+# bcrypt is ~250ms of CPU per call, it runs on its own small pool so it never
+# blocks the event loop. HASH_WORKERS caps how many run at once and
+# HASH_MAX_PENDING how many may wait, past that callers get a cheap 503
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", "4"))
+HASH_MAX_PENDING = int(os.getenv("HASH_MAX_PENDING", "64"))
+
+bcrypt_context = CryptContext(schemes=['bcrypt'], deprecated='auto') # hash password
+_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix='bcrypt')
+
+stats = {'pending': 0, 'completed': 0, 'rejected': 0, 'seconds': 0.0}
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+async def _run(fn, *args):
+    if stats['pending'] >= HASH_MAX_PENDING:
+        stats['rejected'] += 1
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail='Server busy, try again later',
+                            headers={'Retry-After': '1'})
+    stats['pending'] += 1
+    try:
+        result, elapsed = await asyncio.get_running_loop().run_in_executor(_executor, _timed, fn, *args)
+    finally:
+        stats['pending'] -= 1
+    stats['completed'] += 1
+    stats['seconds'] += elapsed
+    return result
+
+
+async def hash_password(password: str) -> str:
+    return await _run(bcrypt_context.hash, password)
+
+
+async def verify_password(password: str, hashed_password: str) -> bool:
+    return await _run(bcrypt_context.verify, password, hashed_password)
+
+
+def metrics() -> dict:
+    in_flight = min(stats['pending'], HASH_WORKERS)
+    return {
+        'workers': HASH_WORKERS,
+        'in_flight': in_flight,
+        'queue_depth': stats['pending'] - in_flight,
+        'completed': stats['completed'],
+        'rejected': stats['rejected'],
+        'seconds': stats['seconds'],
+    }
@@ -0,0 +1,229 @@
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from fastapi import HTTPException, Request, Response
+from fastapi.routing import APIRoute
+from sqlalchemy import delete, select, update
+from starlette.concurrency import run_in_threadpool
+
+from database import SessionLocal, upsert
+from models import IdempotencyKey
+import ratelimit
+
+
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+# how long a claimed key stays locked if its request never finishes
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "60"))
+PURGE_BATCH = 1000
+
+# never replayed, they belong to the original caller's session
+_SKIPPED_HEADERS = {'content-length', 'set-cookie'}
+
+
+class KeyInProgress(Exception):
+    pass
+
+
+class KeyReused(Exception):
+    pass
+
+
+def _digest(*parts) -> str:
+    digest = hashlib.blake2b(digest_size=32)
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode())
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+# the first request with a key inserts its row, or takes over one that has
+# expired; anyone else finds the row and either waits (409) or replays it
+def _claim(key: str, fingerprint: str):
+    db = SessionLocal()
+    try:
+        now = _now()
+        locked = {'fingerprint': fingerprint, 'status_code': None, 'headers': None, 'body': None,
+                  'expires_at': now + timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS)}
+        inserted = db.execute(upsert(db, IdempotencyKey).values(key=key, **locked).on_conflict_do_nothing()).rowcount
+        if not inserted:
+            inserted = db.execute(
+                update(IdempotencyKey)
+                .where(IdempotencyKey.key == key, IdempotencyKey.expires_at < now)
+                .values(**locked)
+            ).rowcount
+        db.commit()
+        if inserted:
+            return None
+        row = db.execute(
+            select(IdempotencyKey.fingerprint, IdempotencyKey.status_code, IdempotencyKey.headers, IdempotencyKey.body)
+            .where(IdempotencyKey.key == key)
+        ).first()
+    finally:
+        db.close()
+    if row is None or row.fingerprint != fingerprint:
+        raise KeyReused()
+    if row.status_code is None:
+        raise KeyInProgress()
+    return row.status_code, json.loads(row.headers), row.body
+
+
+def _store(key: str, status_code: int, headers: list, body: bytes):
+    db = SessionLocal()
+    try:
+        db.execute(
+            update(IdempotencyKey)
+            .where(IdempotencyKey.key == key)
+            .values(status_code=status_code, headers=json.dumps(headers), body=body,
+                    expires_at=_now() + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS))
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def _release(key: str):
+    db = SessionLocal()
+    try:
+        db.execute(delete(IdempotencyKey).where(IdempotencyKey.key == key, IdempotencyKey.status_code.is_(None)))
+        db.commit()
+    finally:
+        db.close()
+
+
+# batch job for the rollup loop, returns how many expired keys it removed
+def purge_expired() -> int:
+    db = SessionLocal()
+    try:
+        expired = select(IdempotencyKey.key).where(IdempotencyKey.expires_at < _now()).limit(PURGE_BATCH)
+        removed = db.execute(delete(IdempotencyKey).where(IdempotencyKey.key.in_(expired.scalar_subquery()))).rowcount
+        db.commit()
+        return removed
+    finally:
+        db.close()
+
+
+# bounded LRU in front of the idempotency_key table, so a retry that lands on
+# the same worker is answered without a database round trip. Only touched
+# from the event loop, so no locking
+class IdempotencyStore:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self.stats = {'replayed': 0, 'replayed_from_db': 0, 'in_progress': 0, 'reused': 0, 'stored': 0}
+
+    def _remember(self, key: str, fingerprint: str, response: tuple):
+        self._entries[key] = (time.time() + IDEMPOTENCY_TTL_SECONDS, fingerprint, response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    # the stored (status, headers, body) to replay, or None when this request
+    # now owns the key and should run
+    async def begin(self, key: str, fingerprint: str):
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.time():
+            if entry[1] != fingerprint:
+                self.stats['reused'] += 1
+                raise KeyReused()
+            self._entries.move_to_end(key)
+            self.stats['replayed'] += 1
+            return entry[2]
+        try:
+            response = await run_in_threadpool(_claim, key, fingerprint)
+        except KeyInProgress:
+            self.stats['in_progress'] += 1
+            raise
+        except KeyReused:
+            self.stats['reused'] += 1
+            raise
+        if response is not None:
+            self._remember(key, fingerprint, response)
+            self.stats['replayed_from_db'] += 1
+        return response
+
+    async def finish(self, key: str, fingerprint: str, status_code: int, headers: list, body: bytes):
+        await run_in_threadpool(_store, key, status_code, headers, body)
+        self._remember(key, fingerprint, (status_code, headers, body))
+        self.stats['stored'] += 1
+
+    async def release(self, key: str):
+        await run_in_threadpool(_release, key)
+
+
+store = IdempotencyStore(IDEMPOTENCY_CACHE_SIZE)
+
+
+def _replay(response: tuple) -> Response:
+    status_code, headers, body = response
+    replayed = Response(content=body, status_code=status_code)
+    for name, value in headers:
+        replayed.headers.append(name, value)
+    replayed.headers['Idempotent-Replayed'] = 'true'
+    return replayed
+
+
+# whose key it is: the Authorization header, or for anonymous callers their
+# address (X-Forwarded-For behind a trusted proxy, as for rate limiting), so
+# one anonymous client can't replay another's response. A retry from a new
+# address runs again; signatures are still caught by their unique index.
+# None when there is neither, and the request runs without replay
+def _owner(request: Request) -> str | None:
+    authorization = request.headers.get('authorization')
+    if authorization:
+        return 'authorization:' + authorization
+    address = ratelimit.client_ip(request.scope, request.headers, {})
+    return 'address:' + address if address else None
+
+
+# route class for routers with creating endpoints: a POST answering 201 that
+# carries an Idempotency-Key header runs once per key, caller and body, and
+# retries within IDEMPOTENCY_TTL_SECONDS get the first response back
+class IdempotentRoute(APIRoute):
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        if 'POST' not in self.methods or self.status_code != 201:
+            return handler
+
+        async def route(request: Request) -> Response:
+            idempotency_key = request.headers.get('idempotency-key')
+            owner = _owner(request)
+            if not idempotency_key or owner is None:
+                return await handler(request)
+            if len(idempotency_key) > 255:
+                raise HTTPException(status_code=400, detail='Idempotency-Key is too long')
+
+            key = _digest(idempotency_key, request.method, request.url.path, owner)
+            fingerprint = _digest(await request.body())
+            try:
+                stored = await store.begin(key, fingerprint)
+            except KeyInProgress:
+                raise HTTPException(status_code=409, detail='A request with this Idempotency-Key is still in progress')
+            except KeyReused:
+                raise HTTPException(status_code=422, detail='Idempotency-Key was already used with a different request')
+            if stored is not None:
+                return _replay(stored)
+
+            try:
+                response = await handler(request)
+            except BaseException:
+                await store.release(key)
+                raise
+            body = getattr(response, 'body', None)
+            if body is None or response.status_code >= 500:
+                await store.release(key)
+                return response
+            headers = [(name.decode('latin-1'), value.decode('latin-1')) for name, value in response.raw_headers
+                       if name.decode('latin-1').lower() not in _SKIPPED_HEADERS]
+            await store.finish(key, fingerprint, response.status_code, headers, body)
+            return response
+
+        return route
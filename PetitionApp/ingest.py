@@ -0,0 +1,156 @@
+import asyncio
+import os
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from starlette.concurrency import run_in_threadpool
+
+from database import SessionLocal
+from models import Signature
+import counters
+import jobs
+from dedup import DuplicateSignature, is_duplicate_error
+
+
+# knobs for the buffered signature write path
+SIGNATURE_BATCHING = os.getenv("SIGNATURE_BATCHING", "0") == "1"
+SIGNATURE_BATCH_SIZE = int(os.getenv("SIGNATURE_BATCH_SIZE", "500"))
+SIGNATURE_BATCH_MAX_LATENCY_MS = int(os.getenv("SIGNATURE_BATCH_MAX_LATENCY_MS", "50"))
+
+
+# collects items submitted by request handlers and hands them to `flush` in
+# batches, either when `batch_size` items are waiting or when the oldest one
+# has waited `max_latency` seconds. `flush` runs in the threadpool and must
+# return one result (or exception) per item, in order.
+class BatchWriter:
+    def __init__(self, flush, batch_size: int, max_latency: float):
+        self.flush = flush
+        self.batch_size = batch_size
+        self.max_latency = max_latency
+        self.queue: asyncio.Queue | None = None
+        self.task: asyncio.Task | None = None
+        self.stats = {"batches": 0, "rows": 0, "errors": 0}
+
+    @property
+    def running(self):
+        return self.task is not None
+
+    async def start(self):
+        if self.task is not None:
+            return
+        self.queue = asyncio.Queue()
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is None:
+            return
+        await self.queue.put(None)  # sentinel, flushes what is left and exits
+        await self.task
+        self.task = None
+
+    async def submit(self, item):
+        if self.task is None:
+            raise RuntimeError("BatchWriter is not running")
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((item, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            entry = await self.queue.get()
+            if entry is None:
+                break
+            batch = [entry]
+            deadline = loop.time() + self.max_latency
+            while len(batch) < self.batch_size:
+                if self.queue.empty():
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        entry = await asyncio.wait_for(self.queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    entry = self.queue.get_nowait()
+                if entry is None:
+                    stopping = True
+                    break
+                batch.append(entry)
+            await self._flush(batch)
+
+    async def _flush(self, batch):
+        items = [item for item, _ in batch]
+        try:
+            results = await run_in_threadpool(self.flush, items)
+        except Exception as exc:
+            self.stats["errors"] += 1
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        self.stats["batches"] += 1
+        self.stats["rows"] += len(items)
+        for (_, future), result in zip(batch, results):
+            if future.done():  # caller went away
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+def _count(rows):
+    deltas = {}
+    for row in rows:
+        total, validated = deltas.get(row['petition_id'], (0, 0))
+        deltas[row['petition_id']] = (total + 1, validated)
+    return deltas
+
+
+# one multi-row INSERT ... RETURNING and a single commit per batch. If the
+# insert fails (a duplicate signature, a value the column rejects, ...) the
+# batch is retried row by row so only the offending rows fail
+def insert_signatures(rows: list[dict]) -> list:
+    db = SessionLocal()
+    try:
+        stmt = insert(Signature).returning(Signature.id, sort_by_parameter_order=True)
+        try:
+            ids = db.scalars(stmt, rows).all()
+        except SQLAlchemyError:
+            db.rollback()
+            return _insert_one_by_one(db, rows)
+        counters.increment_many(db, _count(rows))
+        jobs.enqueue_many(db, 'validation_email', [{'signature_id': id} for id in ids])
+        db.commit()
+        return list(ids)
+    finally:
+        db.close()
+
+
+def _insert_one_by_one(db, rows: list[dict]) -> list:
+    results, inserted = [], []
+    for row in rows:
+        try:
+            with db.begin_nested():
+                results.append(db.scalar(insert(Signature).returning(Signature.id), row))
+            inserted.append(row)
+        except IntegrityError as e:
+            results.append(DuplicateSignature() if is_duplicate_error(e) else e)
+        except SQLAlchemyError as e:
+            results.append(e)
+    counters.increment_many(db, _count(inserted))
+    jobs.enqueue_many(db, 'validation_email',
+                      [{'signature_id': result} for result in results if not isinstance(result, Exception)])
+    db.commit()
+    return results
+
+
+signature_writer = BatchWriter(
+    insert_signatures,
+    batch_size=SIGNATURE_BATCH_SIZE,
+    max_latency=SIGNATURE_BATCH_MAX_LATENCY_MS / 1000,
+)
@@ -0,0 +1,208 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import socket
+import sys
+import time
+import traceback
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from database import SessionLocal
+from models import Job
+
+logger = logging.getLogger(__name__)
+
+JOB_BATCH = int(os.getenv("JOB_BATCH", "10"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_BACKOFF_SECONDS = float(os.getenv("JOB_BACKOFF_SECONDS", "5"))
+JOB_BACKOFF_MAX_SECONDS = float(os.getenv("JOB_BACKOFF_MAX_SECONDS", "3600"))
+# a running job whose worker hasn't finished it by then is handed out again
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "300"))
+# 1 also runs a worker inside each API process, by default jobs are left to
+# `python jobs.py`
+JOB_IN_PROCESS_WORKER = os.getenv("JOB_IN_PROCESS_WORKER", "0") == "1"
+
+handlers = {}
+
+# per job name, for the jobs run by this process
+metrics = {}
+
+
+def job(name: str):
+    def register(handler):
+        handlers[name] = handler
+        return handler
+    return register
+
+
+# added to the caller's session, so the job exists exactly when the caller's
+# own changes are committed
+def enqueue(db: Session, name: str, payload: dict, delay: float = 0, max_attempts: int = JOB_MAX_ATTEMPTS):
+    db.add(Job(
+        name=name,
+        payload=json.dumps(payload),
+        max_attempts=max_attempts,
+        run_at=datetime.now(timezone.utc) + timedelta(seconds=delay),
+    ))
+
+
+def enqueue_many(db: Session, name: str, payloads: list[dict], max_attempts: int = JOB_MAX_ATTEMPTS):
+    now = datetime.now(timezone.utc)
+    db.add_all(Job(name=name, payload=json.dumps(payload), max_attempts=max_attempts, run_at=now) for payload in payloads)
+
+
+def backoff(attempts: int) -> float:
+    delay = min(JOB_BACKOFF_MAX_SECONDS, JOB_BACKOFF_SECONDS * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1)
+
+
+def _reclaim(db: Session, now: datetime):
+    db.execute(
+        update(Job)
+        .where(Job.status == 'running', Job.locked_at < now - timedelta(seconds=JOB_LEASE_SECONDS))
+        .values(status='queued', locked_by=None, locked_at=None)
+    )
+
+
+# marks up to `limit` due jobs as running for this worker and returns their
+# ids. Postgres workers skip each other's locked rows; SQLite serializes
+# writers anyway, so a single UPDATE ... RETURNING is enough there
+def claim(db: Session, worker_id: str, limit: int = JOB_BATCH) -> list[int]:
+    now = datetime.now(timezone.utc)
+    _reclaim(db, now)
+    due = (
+        select(Job.id)
+        .where(Job.status == 'queued', Job.run_at <= now)
+        .order_by(Job.run_at, Job.id)
+        .limit(limit)
+    )
+    if db.get_bind().dialect.name == 'postgresql':
+        ids = db.scalars(due.with_for_update(skip_locked=True)).all()
+        condition = Job.id.in_(ids)
+    else:
+        ids = None
+        condition = Job.id.in_(due.scalar_subquery())
+    if ids == []:
+        db.commit()
+        return []
+    claimed = db.scalars(
+        update(Job)
+        .where(condition, Job.status == 'queued')
+        .values(status='running', locked_by=worker_id, locked_at=now, attempts=Job.attempts + 1)
+        .returning(Job.id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.commit()
+    return sorted(claimed)
+
+
+def _record(name: str, outcome: str, seconds: float):
+    entry = metrics.setdefault(name, {'succeeded': 0, 'retried': 0, 'failed': 0, 'seconds': 0.0})
+    entry[outcome] += 1
+    entry['seconds'] += seconds
+
+
+def run(db: Session, job_id: int, worker_id: str):
+    job = db.get(Job, job_id)
+    if job is None or job.status != 'running' or job.locked_by != worker_id:
+        return
+    started = time.perf_counter()
+    try:
+        handler = handlers.get(job.name)
+        if handler is None:
+            raise LookupError(f'no handler for job {job.name!r}')
+        handler(**json.loads(job.payload))
+    except Exception:
+        job.duration = time.perf_counter() - started
+        job.last_error = traceback.format_exc(limit=5)
+        job.locked_by = job.locked_at = None
+        if job.attempts < job.max_attempts:
+            job.status = 'queued'
+            job.run_at = datetime.now(timezone.utc) + timedelta(seconds=backoff(job.attempts))
+            _record(job.name, 'retried', job.duration)
+        else:
+            job.status = 'failed'
+            job.finished_at = datetime.now(timezone.utc)
+            _record(job.name, 'failed', job.duration)
+            logger.error('job %s (%s) failed for good after %s attempts', job.id, job.name, job.attempts)
+    else:
+        job.duration = time.perf_counter() - started
+        job.status = 'done'
+        job.finished_at = datetime.now(timezone.utc)
+        job.last_error = None
+        _record(job.name, 'succeeded', job.duration)
+    db.commit()
+
+
+# claims and runs one batch, returns how many jobs it ran
+def work_once(worker_id: str) -> int:
+    db = SessionLocal()
+    try:
+        ids = claim(db, worker_id)
+        for job_id in ids:
+            run(db, job_id, worker_id)
+        return len(ids)
+    finally:
+        db.close()
+
+
+def worker_name() -> str:
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def work_forever(worker_id: str | None = None):
+    worker_id = worker_id or worker_name()
+    while True:
+        try:
+            if work_once(worker_id):
+                continue
+        except Exception:
+            logger.exception('job worker %s', worker_id)
+        time.sleep(JOB_POLL_SECONDS)
+
+
+# the in-process worker, same loop driven from the event loop
+async def run_forever(worker_id: str | None = None):
+    worker_id = worker_id or worker_name()
+    while True:
+        try:
+            if await run_in_threadpool(work_once, worker_id):
+                continue
+        except Exception:
+            logger.exception('job worker %s', worker_id)
+        await asyncio.sleep(JOB_POLL_SECONDS)
+
+
+# queue depth and timings per job name and status, across all workers
+def queue_stats(db: Session) -> list[dict]:
+    rows = db.execute(
+        select(Job.name, Job.status, func.count(), func.avg(Job.duration), func.max(Job.duration),
+               func.min(Job.run_at))
+        .group_by(Job.name, Job.status)
+        .order_by(Job.name, Job.status)
+    )
+    return [
+        {'name': name, 'status': status, 'count': count, 'avg_seconds': avg, 'max_seconds': longest,
+         'oldest_run_at': oldest}
+        for name, status, count, avg, longest, oldest in rows
+    ]
+
+
+# python jobs.py [processes]
+if __name__ == '__main__':
+    import multiprocessing
+    import tasks  # registers the handlers
+
+    logging.basicConfig(level=logging.INFO)
+    processes = [multiprocessing.Process(target=work_forever) for _ in range(int(sys.argv[1]) if len(sys.argv) > 1 else 1)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
@@ -0,0 +1,200 @@
+import asyncio
+import json
+import logging
+import os
+from abc import ABC, abstractmethod
+
+from starlette.concurrency import run_in_threadpool
+
+from database import SQLALCHEMY_DATABASE_URL
+
+logger = logging.getLogger(__name__)
+
+# 'memory' keeps updates inside this worker, 'postgres' fans them out to
+# every worker through LISTEN/NOTIFY on the database we already have
+LIVE_BROKER = os.getenv("LIVE_BROKER", "memory")
+# subscribers get at most one update per interval, deltas in between are summed
+LIVE_UPDATE_INTERVAL = float(os.getenv("LIVE_UPDATE_INTERVAL", "1"))
+LIVE_HEARTBEAT_SECONDS = float(os.getenv("LIVE_HEARTBEAT_SECONDS", "15"))
+# first wait before reconnecting a dropped LISTEN connection, doubled up to the max
+LIVE_RECONNECT_SECONDS = float(os.getenv("LIVE_RECONNECT_SECONDS", "1"))
+LIVE_RECONNECT_MAX_SECONDS = float(os.getenv("LIVE_RECONNECT_MAX_SECONDS", "60"))
+NOTIFY_CHANNEL = 'petition_live'
+
+
+# one per open connection: the summed deltas and a flag, no long-lived task
+# of its own. Each connection still costs tasks around it: Starlette runs a
+# disconnect listener per streaming response, and wait_for wraps every wait
+# in a short-lived task. benchmarks/live_idle.py measures the total per stream
+class Subscription:
+    __slots__ = ('channel', 'pending', 'event')
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.pending = {}
+        self.event = asyncio.Event()
+
+    def push(self, delta: dict):
+        for key, value in delta.items():
+            self.pending[key] = self.pending.get(key, 0) + value
+        self.event.set()
+
+    async def wait(self, timeout: float) -> dict | None:
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        self.event.clear()
+        delta, self.pending = self.pending, {}
+        return delta
+
+
+class Broker(ABC):
+    def __init__(self):
+        self.subscribers = {}
+
+    def subscribe(self, channel) -> Subscription:
+        subscription = Subscription(channel)
+        self.subscribers.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self.subscribers.get(subscription.channel)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self.subscribers[subscription.channel]
+
+    def deliver(self, channel, delta: dict):
+        for subscription in self.subscribers.get(channel, ()):
+            subscription.push(delta)
+
+    @abstractmethod
+    def publish(self, channel, delta: dict):
+        ...
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+
+class InMemoryBroker(Broker):
+    def publish(self, channel, delta: dict):
+        self.deliver(channel, delta)
+
+
+# deltas are summed per channel and sent as one NOTIFY per channel every
+# LIVE_UPDATE_INTERVAL. Every worker, this one included, gets them back
+# through LISTEN and delivers to its own subscribers. A dropped connection
+# is reopened with backoff; deltas published meanwhile wait in the outbox
+class PostgresBroker(Broker):
+    def __init__(self, dsn: str):
+        super().__init__()
+        self.dsn = dsn
+        self.outbox = {}
+        self.connection = None
+        self.tasks = []
+
+    def publish(self, channel, delta: dict):
+        pending = self.outbox.setdefault(channel, {})
+        for key, value in delta.items():
+            pending[key] = pending.get(key, 0) + value
+
+    def _on_notify(self, connection, pid, notify_channel, payload):
+        message = json.loads(payload)
+        self.deliver(message['channel'], message['delta'])
+
+    async def start(self):
+        self.tasks = [asyncio.create_task(self._listen_forever()), asyncio.create_task(self._flush_forever())]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        self.tasks = []
+        await self._close()
+
+    async def _close(self):
+        connection, self.connection = self.connection, None
+        if connection is not None and not connection.is_closed():
+            try:
+                await connection.close(timeout=5)
+            except Exception:
+                connection.terminate()
+
+    # holds the LISTEN connection open: a query every heartbeat notices a
+    # silently dead one, and any failure reconnects after a growing delay
+    async def _listen_forever(self):
+        import asyncpg
+        delay = LIVE_RECONNECT_SECONDS
+        while True:
+            try:
+                connection = await asyncpg.connect(self.dsn)
+                lost = asyncio.Event()
+                connection.add_termination_listener(lambda _, lost=lost: lost.set())
+                await connection.add_listener(NOTIFY_CHANNEL, self._on_notify)
+                self.connection = connection
+                delay = LIVE_RECONNECT_SECONDS
+                while not lost.is_set():
+                    try:
+                        await asyncio.wait_for(lost.wait(), LIVE_HEARTBEAT_SECONDS)
+                    except asyncio.TimeoutError:
+                        await connection.execute('SELECT 1')
+                logger.warning('live LISTEN connection closed, reconnecting')
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception('live LISTEN connection failed, retrying in %ss', delay)
+            await self._close()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, LIVE_RECONNECT_MAX_SECONDS)
+
+    async def _flush_forever(self):
+        while True:
+            await asyncio.sleep(LIVE_UPDATE_INTERVAL)
+            if self.connection is None:
+                continue
+            outbox, self.outbox = self.outbox, {}
+            for channel, delta in outbox.items():
+                try:
+                    await self.connection.execute(
+                        'SELECT pg_notify($1, $2)', NOTIFY_CHANNEL, json.dumps({'channel': channel, 'delta': delta}))
+                except Exception:
+                    # kept for the next flush, on this or the reconnected connection
+                    logger.exception('live update for %s delayed', channel)
+                    self.publish(channel, delta)
+
+
+broker = PostgresBroker(SQLALCHEMY_DATABASE_URL) if LIVE_BROKER == 'postgres' else InMemoryBroker()
+
+
+# called by the signature handlers once their change is committed
+def publish_counts(petition_id: int, total: int = 0, validated: int = 0):
+    broker.publish(petition_id, {'total': total, 'validated': validated})
+
+
+def _event(counts: dict) -> str:
+    return f'event: counts\ndata: {json.dumps(counts)}\n\n'
+
+
+# text/event-stream body: the current counts, then coalesced updates, and a
+# comment line as heartbeat so idle connections aren't dropped by proxies.
+# Subscribes before `read_counts` (run in the threadpool) takes the
+# snapshot, so no update falls between the two
+async def count_events(petition_id: int, read_counts):
+    subscription = broker.subscribe(petition_id)
+    try:
+        counts = await run_in_threadpool(read_counts, petition_id)
+        yield _event(counts)
+        while True:
+            delta = await subscription.wait(LIVE_HEARTBEAT_SECONDS)
+            if delta is None:
+                yield ': ping\n\n'
+                continue
+            counts['total'] += delta.get('total', 0)
+            counts['validated'] += delta.get('validated', 0)
+            yield _event(counts)
+            await asyncio.sleep(LIVE_UPDATE_INTERVAL)
+    finally:
+        broker.unsubscribe(subscription)
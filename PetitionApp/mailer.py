@@ -0,0 +1,30 @@
+import logging
+import os
+import smtplib
+from email.message import EmailMessage
+
+logger = logging.getLogger(__name__)
+
+SMTP_HOST = os.getenv("SMTP_HOST")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_USER = os.getenv("SMTP_USER")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+MAIL_FROM = os.getenv("MAIL_FROM", "noreply@localhost")
+APP_BASE_URL = os.getenv("APP_BASE_URL", "http://localhost:8000")
+
+
+# without SMTP_HOST the message is only logged, handy in development
+def send(to: str, subject: str, body: str):
+    if not SMTP_HOST:
+        logger.info('mail to %s: %s\n%s', to, subject, body)
+        return
+    message = EmailMessage()
+    message['From'] = MAIL_FROM
+    message['To'] = to
+    message['Subject'] = subject
+    message.set_content(body)
+    with smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=30) as smtp:
+        smtp.starttls()
+        if SMTP_USER:
+            smtp.login(SMTP_USER, SMTP_PASSWORD)
+        smtp.send_message(message)
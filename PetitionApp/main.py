@@ -1,18 +1,84 @@
+import asyncio
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 import models
-from database import engine
+import ingest
+import dedup
+import rollups
+import geo
+import live
+import validation
+import jobs
+import tasks
+import idempotency
+import fulltext
+import reference
+import ratelimit
+import metrics
+import querystats
+from starlette.concurrency import run_in_threadpool
+from database import engine, async_engine, DB_CREATE_ALL
 from starlette.staticfiles import StaticFiles
 from starlette import status
 from starlette.responses import RedirectResponse
-from routers import auth, admin, users, petitions, signatures, complaints_type, complaints
+from routers import auth, admin, users, petitions, signatures, complaints_type, complaints, stats, search
+from routers import metrics as metrics_router
 
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
+app.add_middleware(ratelimit.RateLimitMiddleware)
+if metrics.METRICS_ENABLED or querystats.QUERY_DEBUG:
+    querystats.install(engine, async_engine.sync_engine)
+if querystats.QUERY_DEBUG:
+    app.add_middleware(querystats.QueryDebugMiddleware)
+if metrics.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
 
-models.Base.metadata.create_all(bind=engine)
+if DB_CREATE_ALL:
+    models.Base.metadata.create_all(bind=engine)
+    fulltext.ensure_index(engine)
 
 app.mount("/static",StaticFiles(directory="static"),name="static")
 
+@app.on_event("startup")
+async def startup():
+    if dedup.DEDUP_PREFILTER:
+        await run_in_threadpool(dedup.deduper.load)
+    await run_in_threadpool(reference.complaint_types.load)
+    if ingest.SIGNATURE_BATCHING:
+        await ingest.signature_writer.start()
+    if validation.VALIDATION_BATCHING:
+        await validation.validation_writer.start()
+    await live.broker.start()
+    if rollups.ROLLUP_INTERVAL_SECONDS > 0:
+        batch_jobs = [rollups.refresh, geo.refresh_signatures, idempotency.purge_expired]
+        if ratelimit.RATE_LIMIT_BACKEND == 'database':
+            batch_jobs.append(ratelimit.purge_idle)
+        app.state.rollup_task = asyncio.create_task(rollups.run_forever(batch_jobs))
+        if rollups.ROLLUP_RECONCILE_SECONDS > 0:
+            app.state.reconcile_task = asyncio.create_task(
+                rollups.reconcile_forever([rollups.reconcile, geo.reconcile_signatures]))
+    if jobs.JOB_IN_PROCESS_WORKER:
+        app.state.job_task = asyncio.create_task(jobs.run_forever())
+    if dedup.DEDUP_PREFILTER and dedup.DEDUP_REBUILD_SECONDS > 0:
+        app.state.dedup_task = asyncio.create_task(dedup.rebuild_forever())
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await ingest.signature_writer.stop()
+    await validation.validation_writer.stop()
+    await live.broker.stop()
+    if getattr(app.state, 'rollup_task', None) is not None:
+        app.state.rollup_task.cancel()
+    if getattr(app.state, 'reconcile_task', None) is not None:
+        app.state.reconcile_task.cancel()
+    if getattr(app.state, 'job_task', None) is not None:
+        app.state.job_task.cancel()
+    if getattr(app.state, 'dedup_task', None) is not None:
+        app.state.dedup_task.cancel()
+
+
 @app.get("/")
 async def root():
      return RedirectResponse(url="/auth",status_code=status.HTTP_302_FOUND)
@@ -25,3 +91,6 @@ app.include_router(users.router)
 app.include_router(signatures.router)
 app.include_router(complaints_type.router)
 app.include_router(complaints.router)
+app.include_router(stats.router)
+app.include_router(search.router)
+app.include_router(metrics_router.router)
@@ -0,0 +1,170 @@
+import os
+import time
+from bisect import bisect_left
+from collections import Counter
+
+from database import engine, async_engine
+from response_cache import response_cache
+from token_cache import token_cache
+import dedup
+import hashing
+import idempotency
+import jobs
+import querystats
+import ratelimit
+import reference
+
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# fixed buckets per label set, counted per bucket and made cumulative only
+# when rendered, so an observation is one bisect and three additions
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple, buckets: tuple):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self.series = {}  # label values -> [per-bucket counts..., +Inf count, sum]
+
+    def observe(self, values: tuple, value: float):
+        series = self.series.get(values)
+        if series is None:
+            series = self.series[values] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for values, series in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{_labels(self.labels + ("le",), values + (bound,))} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labels, values)} {series[-1]}')
+            lines.append(f'{self.name}_count{_labels(self.labels, values)} {cumulative}')
+        return lines
+
+
+def _family(name: str, kind: str, help: str, samples) -> list[str]:
+    lines = [f'# HELP {name} {help}', f'# TYPE {name} {kind}']
+    lines.extend(f'{name}{_labels(labels, values)} {value}' for labels, values, value in samples)
+    return lines
+
+
+in_flight = 0
+requests = Counter()  # (method, route, status) -> count
+request_seconds = Histogram('http_request_duration_seconds', 'Time to answer a request, streaming included.',
+                            ('method', 'route'), LATENCY_BUCKETS)
+request_queries = Histogram('http_request_db_queries', 'Database queries run for one request.',
+                            ('method', 'route'), QUERY_BUCKETS)
+request_db_seconds = Histogram('http_request_db_seconds', 'Time spent in database queries for one request.',
+                               ('method', 'route'), LATENCY_BUCKETS)
+
+
+# ASGI middleware around the whole app. Requests are labelled by their
+# route template, not their path, so ids don't multiply the series
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        global in_flight
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        stats = querystats.track()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        in_flight += 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            in_flight -= 1
+            route = scope.get('route')
+            values = (scope['method'], route.path if route is not None else 'unmatched')
+            requests[values + (status,)] += 1
+            request_seconds.observe(values, elapsed)
+            request_queries.observe(values, stats.queries)
+            request_db_seconds.observe(values, stats.seconds)
+
+
+# QueuePool counts overflow from -pool_size, only the part past pool_size
+# is reported. Pools without these counters (SQLite's) are skipped
+def _pool_samples(engines: dict):
+    for name, engine in engines.items():
+        pool = engine.pool
+        if hasattr(pool, 'checkedout'):
+            yield 'checked_out', name, pool.checkedout()
+            yield 'overflow', name, max(0, pool.overflow())
+            yield 'size', name, pool.size()
+
+
+def _stats_samples(sources: dict):
+    for source, stats in sources.items():
+        for event, value in stats.items():
+            if isinstance(value, (int, float)):
+                yield ('cache', 'event'), (source, event), value
+
+
+# Prometheus text format, built on each scrape from this process's state
+def render() -> str:
+    lines = _family('http_requests_in_flight', 'gauge', 'Requests being answered right now.', [((), (), in_flight)])
+    lines += _family('http_requests_total', 'counter', 'Requests answered, by route and status.',
+                     ((('method', 'route', 'status'), values, count) for values, count in sorted(requests.items())))
+    lines += request_seconds.render() + request_queries.render() + request_db_seconds.render()
+
+    lines += _family('db_queries_total', 'counter', 'Database queries run by this process.',
+                     [((), (), querystats.totals['queries'])])
+    lines += _family('db_query_seconds_total', 'counter', 'Time spent in database queries by this process.',
+                     [((), (), querystats.totals['seconds'])])
+    pools = list(_pool_samples({'sync': engine, 'async': async_engine.sync_engine}))
+    for metric, help in (('checked_out', 'Connections in use.'), ('overflow', 'Connections opened past pool_size.'),
+                         ('size', 'Configured pool size.')):
+        lines += _family(f'db_pool_{metric}', 'gauge', help,
+                         ((('engine',), (name,), value) for sample, name, value in pools if sample == metric))
+
+    bcrypt = hashing.metrics()
+    lines += [
+        '# HELP bcrypt_seconds Time spent hashing and verifying passwords.', '# TYPE bcrypt_seconds summary',
+        f'bcrypt_seconds_sum {bcrypt["seconds"]}', f'bcrypt_seconds_count {bcrypt["completed"]}',
+    ]
+    lines += _family('bcrypt_rejected_total', 'counter', 'Hashes refused because the queue was full.', [((), (), bcrypt['rejected'])])
+    lines += _family('bcrypt_in_flight', 'gauge', 'Hashes running now.', [((), (), bcrypt['in_flight'])])
+    lines += _family('bcrypt_queue_depth', 'gauge', 'Hashes waiting for a worker.', [((), (), bcrypt['queue_depth'])])
+
+    lines += _family('cache_events_total', 'counter', 'Hits, misses and other events of the in-process caches.',
+                     _stats_samples({'token': token_cache.stats, 'response': response_cache.stats,
+                                     'idempotency': idempotency.store.stats, 'complaint_type': reference.complaint_types.stats,
+                                     'dedup': dedup.deduper.stats}))
+    lines += _family('rate_limit_checked_total', 'counter', 'Requests checked against a rate limit.',
+                     [((), (), ratelimit.stats['checked'])])
+    lines += _family('rate_limit_throttled_total', 'counter', 'Requests turned away with a 429.',
+                     ((('policy', 'key'), tuple(name.split(':')), count) for name, count in sorted(ratelimit.throttled.items())))
+    lines += _family('job_runs_total', 'counter', 'Jobs run by this process, by outcome.',
+                     ((('name', 'outcome'), (name, outcome), entry[outcome])
+                      for name, entry in sorted(jobs.metrics.items()) for outcome in ('succeeded', 'retried', 'failed')))
+    lines += _family('job_seconds_total', 'counter', 'Time spent running jobs in this process.',
+                     ((('name',), (name,), entry['seconds']) for name, entry in sorted(jobs.metrics.items())))
+    return '\n'.join(lines) + '\n'
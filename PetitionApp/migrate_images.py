@@ -0,0 +1,57 @@
+# moves inline base64 images out of petition.images into the blob store
+# usage: python migrate_images.py [--batch-size 100]
+import argparse
+
+from sqlalchemy import inspect, text
+
+from blobstore import blob_store, decode_image
+from database import SessionLocal, engine
+from models import Petition
+
+
+def ensure_image_ref_column():
+    columns = [column['name'] for column in inspect(engine).get_columns('petition')]
+    if 'image_ref' not in columns:
+        with engine.begin() as conn:
+            conn.execute(text('ALTER TABLE petition ADD COLUMN image_ref VARCHAR(64)'))
+
+
+def migrate(batch_size: int):
+    ensure_image_ref_column()
+    db = SessionLocal()
+    last_id, moved, skipped = 0, 0, 0
+    try:
+        while True:
+            rows = (
+                db.query(Petition.id, Petition.images)
+                .filter(Petition.id > last_id)
+                .filter(Petition.images.is_not(None))
+                .filter(Petition.image_ref.is_(None))
+                .order_by(Petition.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not rows:
+                break
+            for petition_id, images in rows:
+                try:
+                    image_ref = blob_store.put(decode_image(images))
+                except ValueError:
+                    print(f'petition {petition_id}: not base64, left in place')
+                    skipped += 1
+                    continue
+                db.query(Petition).filter(Petition.id == petition_id).update(
+                    {'image_ref': image_ref, 'images': None, 'version': Petition.version + 1}, synchronize_session=False)
+                moved += 1
+            db.commit()
+            last_id = rows[-1].id
+            print(f'moved {moved} images, up to petition {last_id}')
+    finally:
+        db.close()
+    print(f'done: {moved} moved, {skipped} skipped')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Move petition images to the blob store')
+    parser.add_argument('--batch-size', type=int, default=100)
+    migrate(parser.parse_args().batch_size)
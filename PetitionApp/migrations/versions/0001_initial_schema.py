@@ -0,0 +1,113 @@
+"""initial schema
+
+Creates the tables that used to come from Base.metadata.create_all. Tables
+and columns that already exist are left alone, so databases created before
+migrations can simply be upgraded.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    tables = inspector.get_table_names()
+
+    if 'users' not in tables:
+        op.create_table(
+            'users',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('username', sa.String(), unique=True),
+            sa.Column('email', sa.String(), unique=True),
+            sa.Column('first_name', sa.String()),
+            sa.Column('last_name', sa.String()),
+            sa.Column('hashed_password', sa.String()),
+            sa.Column('is_activate', sa.Boolean()),
+            sa.Column('role', sa.String()),
+        )
+        op.create_index('ix_users_id', 'users', ['id'])
+
+    if 'petition' not in tables:
+        op.create_table(
+            'petition',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id')),
+            sa.Column('petition_name', sa.String()),
+            sa.Column('petition_text', sa.String()),
+            sa.Column('images', sa.String()),
+            sa.Column('image_ref', sa.String(64)),
+        )
+        op.create_index('ix_petition_id', 'petition', ['id'])
+    elif 'image_ref' not in [c['name'] for c in inspector.get_columns('petition')]:
+        op.add_column('petition', sa.Column('image_ref', sa.String(64)))
+
+    if 'signature' not in tables:
+        op.create_table(
+            'signature',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('petition_id', sa.Integer(), sa.ForeignKey('petition.id')),
+            sa.Column('name', sa.String(255)),
+            sa.Column('email', sa.String(255)),
+            sa.Column('phone', sa.String(20)),
+            sa.Column('city', sa.String(100)),
+            sa.Column('state', sa.String(50)),
+            sa.Column('show_signature', sa.Boolean()),
+            sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id')),
+            sa.Column('validated_signature', sa.Boolean()),
+            sa.Column('can_be_contacted', sa.Boolean()),
+        )
+        op.create_index('ix_signature_id', 'signature', ['id'])
+
+    if 'complaints' not in tables:
+        op.create_table(
+            'complaints',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('name', sa.String(255)),
+            sa.Column('email', sa.String(255)),
+            sa.Column('phone', sa.String(20)),
+            sa.Column('city', sa.String(100)),
+            sa.Column('state', sa.String(50)),
+            sa.Column('complaint_type', sa.Integer()),
+            sa.Column('complaint_text', sa.String()),
+        )
+        op.create_index('ix_complaints_id', 'complaints', ['id'])
+
+    if 'complaints_type' not in tables:
+        op.create_table(
+            'complaints_type',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('complaint_type', sa.Integer()),
+            sa.Column('dictionary', sa.String()),
+        )
+        op.create_index('ix_complaints_type_id', 'complaints_type', ['id'])
+
+    if 'petition_counter' not in tables:
+        op.create_table(
+            'petition_counter',
+            sa.Column('petition_id', sa.Integer(), primary_key=True),
+            sa.Column('shard', sa.Integer(), primary_key=True),
+            sa.Column('total', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('validated', sa.Integer(), nullable=False, server_default='0'),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table('petition_counter')
+    op.drop_table('complaints_type')
+    op.drop_table('complaints')
+    op.drop_table('signature')
+    op.drop_table('petition')
+    op.drop_table('users')
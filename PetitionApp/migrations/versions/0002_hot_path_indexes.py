@@ -0,0 +1,45 @@
+"""indexes for the router query shapes
+
+Each index leads with the filter column and ends with id, so the filtered
+keyset pages (WHERE x = ? AND id > ? ORDER BY id LIMIT n) are index range
+scans. On Postgres they are built CONCURRENTLY so upgrading a live database
+does not block writes.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 10:05:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEXES = [
+    ('ix_signature_petition_id_id', 'signature', ['petition_id', 'id']),
+    ('ix_signature_user_id_id', 'signature', ['user_id', 'id']),
+    ('ix_signature_email', 'signature', ['email']),
+    ('ix_petition_user_id_id', 'petition', ['user_id', 'id']),
+    ('ix_complaints_complaint_type_id', 'complaints', ['complaint_type', 'id']),
+]
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, if_not_exists=True, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _ in INDEXES:
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
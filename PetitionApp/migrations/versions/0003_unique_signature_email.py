@@ -0,0 +1,41 @@
+"""one signature per normalized email per petition
+
+Fails with a clear message if the table already holds duplicates; those
+have to be cleaned up by hand before upgrading.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    duplicates = op.get_bind().scalar(sa.text(
+        'SELECT count(*) FROM (SELECT 1 FROM signature WHERE email IS NOT NULL '
+        'GROUP BY petition_id, lower(trim(email)) HAVING count(*) > 1) AS d'
+    ))
+    if duplicates:
+        raise RuntimeError(f'{duplicates} (petition_id, email) pairs are signed more than once, '
+                           'remove the extra signatures before upgrading')
+    with op.get_context().autocommit_block():
+        op.create_index('ux_signature_petition_email', 'signature',
+                        ['petition_id', sa.text('lower(trim(email))')],
+                        unique=True, if_not_exists=True, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ux_signature_petition_email', table_name='signature',
+                      if_exists=True, postgresql_concurrently=True)
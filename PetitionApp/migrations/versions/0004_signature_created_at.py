@@ -0,0 +1,32 @@
+"""signature.created_at
+
+Existing rows keep NULL rather than all getting the migration date; new
+rows get now() from the column default.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('signature', sa.Column('created_at', sa.DateTime(timezone=True)))
+    # SQLite can't change a column default in place, the model sets it from Python there
+    if op.get_bind().dialect.name != 'sqlite':
+        op.alter_column('signature', 'created_at', server_default=sa.func.now())
+
+
+def downgrade() -> None:
+    op.drop_column('signature', 'created_at')
@@ -0,0 +1,40 @@
+"""signature rollups and job watermarks
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'signature_rollup',
+        sa.Column('period', sa.String(4), primary_key=True),
+        sa.Column('petition_id', sa.Integer(), primary_key=True),
+        sa.Column('bucket', sa.DateTime(timezone=True), primary_key=True),
+        sa.Column('state', sa.String(50), primary_key=True),
+        sa.Column('city', sa.String(100), primary_key=True),
+        sa.Column('total', sa.Integer(), nullable=False, server_default='0'),
+    )
+    op.create_table(
+        'watermark',
+        sa.Column('name', sa.String(50), primary_key=True),
+        sa.Column('last_id', sa.Integer(), nullable=False, server_default='0'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('watermark')
+    op.drop_table('signature_rollup')
@@ -0,0 +1,37 @@
+"""geo rollup
+
+Complaints created before this revision are backfilled with
+`python geo.py` after upgrading; signatures are picked up by the
+background job.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'geo_rollup',
+        sa.Column('source', sa.String(10), primary_key=True),
+        sa.Column('scope_id', sa.Integer(), primary_key=True),
+        sa.Column('state', sa.String(50), primary_key=True),
+        sa.Column('city', sa.String(100), primary_key=True),
+        sa.Column('total', sa.Integer(), nullable=False, server_default='0'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('geo_rollup')
@@ -0,0 +1,46 @@
+"""signature import
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'signature_import',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('petition_id', sa.Integer(), sa.ForeignKey('petition.id')),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id')),
+        sa.Column('digest', sa.String(64), nullable=False),
+        sa.Column('status', sa.String(10), nullable=False, server_default='running'),
+        sa.Column('rows_done', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('inserted', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('failed', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index('ix_signature_import_petition_digest', 'signature_import', ['petition_id', 'digest'])
+    op.create_table(
+        'signature_import_error',
+        sa.Column('import_id', sa.Integer(), sa.ForeignKey('signature_import.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('row', sa.Integer(), primary_key=True),
+        sa.Column('message', sa.Text(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('signature_import_error')
+    op.drop_index('ix_signature_import_petition_digest', table_name='signature_import')
+    op.drop_table('signature_import')
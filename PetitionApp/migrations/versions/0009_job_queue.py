@@ -0,0 +1,43 @@
+"""job queue
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0009'
+down_revision: Union[str, None] = '0008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'job',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('name', sa.String(50), nullable=False),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('status', sa.String(10), nullable=False, server_default='queued'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('max_attempts', sa.Integer(), nullable=False, server_default='5'),
+        sa.Column('run_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        sa.Column('locked_by', sa.String(100)),
+        sa.Column('locked_at', sa.DateTime(timezone=True)),
+        sa.Column('last_error', sa.Text()),
+        sa.Column('duration', sa.Float()),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column('finished_at', sa.DateTime(timezone=True)),
+    )
+    op.create_index('ix_job_status_run_at', 'job', ['status', 'run_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_job_status_run_at', table_name='job')
+    op.drop_table('job')
@@ -0,0 +1,36 @@
+"""idempotency key
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0010'
+down_revision: Union[str, None] = '0009'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'idempotency_key',
+        sa.Column('key', sa.String(64), primary_key=True),
+        sa.Column('fingerprint', sa.String(64), nullable=False),
+        sa.Column('status_code', sa.Integer()),
+        sa.Column('headers', sa.Text()),
+        sa.Column('body', sa.LargeBinary()),
+        sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+    )
+    op.create_index('ix_idempotency_key_expires_at', 'idempotency_key', ['expires_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_idempotency_key_expires_at', table_name='idempotency_key')
+    op.drop_table('idempotency_key')
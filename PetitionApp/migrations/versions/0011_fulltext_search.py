@@ -0,0 +1,80 @@
+"""full-text search
+
+Postgres: a generated, weighted tsvector column plus GIN index on petition
+and complaints. SQLite: FTS5 tables kept in step by triggers. The DDL is
+written out here as it was at this revision; fulltext.index_statements
+builds the same statements for DB_CREATE_ALL but may move on.
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0011'
+down_revision: Union[str, None] = '0010'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+POSTGRES = [
+    "ALTER TABLE petition ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('portuguese', coalesce(petition_name, '')), 'A') || "
+    "setweight(to_tsvector('portuguese', coalesce(petition_text, '')), 'B')) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_petition_search_vector ON petition USING gin (search_vector)",
+    "ALTER TABLE complaints ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('portuguese', coalesce(complaint_text, '')), 'A')) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_complaints_search_vector ON complaints USING gin (search_vector)",
+]
+
+SQLITE = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS petition_fts USING fts5(petition_name, petition_text, "
+    "content='petition', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS petition_fts_ai AFTER INSERT ON petition BEGIN "
+    "INSERT INTO petition_fts(rowid, petition_name, petition_text) "
+    "VALUES (new.id, new.petition_name, new.petition_text); END",
+    "CREATE TRIGGER IF NOT EXISTS petition_fts_ad AFTER DELETE ON petition BEGIN "
+    "INSERT INTO petition_fts(petition_fts, rowid, petition_name, petition_text) "
+    "VALUES ('delete', old.id, old.petition_name, old.petition_text); END",
+    "CREATE TRIGGER IF NOT EXISTS petition_fts_au AFTER UPDATE ON petition BEGIN "
+    "INSERT INTO petition_fts(petition_fts, rowid, petition_name, petition_text) "
+    "VALUES ('delete', old.id, old.petition_name, old.petition_text); "
+    "INSERT INTO petition_fts(rowid, petition_name, petition_text) "
+    "VALUES (new.id, new.petition_name, new.petition_text); END",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS complaint_fts USING fts5(complaint_text, "
+    "content='complaints', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS complaint_fts_ai AFTER INSERT ON complaints BEGIN "
+    "INSERT INTO complaint_fts(rowid, complaint_text) VALUES (new.id, new.complaint_text); END",
+    "CREATE TRIGGER IF NOT EXISTS complaint_fts_ad AFTER DELETE ON complaints BEGIN "
+    "INSERT INTO complaint_fts(complaint_fts, rowid, complaint_text) "
+    "VALUES ('delete', old.id, old.complaint_text); END",
+    "CREATE TRIGGER IF NOT EXISTS complaint_fts_au AFTER UPDATE ON complaints BEGIN "
+    "INSERT INTO complaint_fts(complaint_fts, rowid, complaint_text) "
+    "VALUES ('delete', old.id, old.complaint_text); "
+    "INSERT INTO complaint_fts(rowid, complaint_text) VALUES (new.id, new.complaint_text); END",
+    # index the rows that existed before the triggers
+    "INSERT INTO petition_fts(petition_fts) VALUES ('rebuild')",
+    "INSERT INTO complaint_fts(complaint_fts) VALUES ('rebuild')",
+]
+
+
+def upgrade() -> None:
+    for statement in POSTGRES if op.get_bind().dialect.name == 'postgresql' else SQLITE:
+        op.execute(sa.text(statement))
+
+
+def downgrade() -> None:
+    for kind, table in (('petition', 'petition'), ('complaint', 'complaints')):
+        if op.get_bind().dialect.name == 'postgresql':
+            op.execute(f'DROP INDEX IF EXISTS ix_{table}_search_vector')
+            op.execute(f'ALTER TABLE {table} DROP COLUMN IF EXISTS search_vector')
+        else:
+            for suffix in ('ai', 'ad', 'au'):
+                op.execute(f'DROP TRIGGER IF EXISTS {kind}_fts_{suffix}')
+            op.execute(f'DROP TABLE IF EXISTS {kind}_fts')
@@ -0,0 +1,34 @@
+"""rate limit bucket
+
+Revision ID: 0013
+Revises: 0012
+Create Date: 2026-10-18 21:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0013'
+down_revision: Union[str, None] = '0012'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'rate_limit_bucket',
+        sa.Column('key', sa.String(100), primary_key=True),
+        sa.Column('tokens', sa.Float(), nullable=False),
+        sa.Column('updated_at', sa.Float(), nullable=False),
+        sa.Column('allowed', sa.Boolean(), nullable=False, server_default=sa.true()),
+    )
+    op.create_index('ix_rate_limit_bucket_updated_at', 'rate_limit_bucket', ['updated_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_rate_limit_bucket_updated_at', table_name='rate_limit_bucket')
+    op.drop_table('rate_limit_bucket')
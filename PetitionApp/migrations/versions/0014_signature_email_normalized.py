@@ -0,0 +1,69 @@
+"""signature email_normalized
+
+The unique email index moves from lower(trim(email)) to a stored column
+filled by models.normalize_email, so Python and the database agree on what
+the same email is (SQLite's lower/trim only handle ASCII letters and
+spaces). Fails with a clear message if the stricter normalization finds
+duplicates; those have to be cleaned up by hand before upgrading.
+
+Revision ID: 0014
+Revises: 0013
+Create Date: 2026-10-18 22:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0014'
+down_revision: Union[str, None] = '0013'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 5000
+
+
+# written out here rather than imported, the model's version may move on
+def normalize_email(email: str) -> str:
+    return email.strip().lower()
+
+
+def upgrade() -> None:
+    op.add_column('signature', sa.Column('email_normalized', sa.String(255), nullable=True))
+    bind = op.get_bind()
+    last = 0
+    while True:
+        rows = bind.execute(sa.text(
+            'SELECT id, email FROM signature WHERE id > :last AND email IS NOT NULL ORDER BY id LIMIT :limit'
+        ), {'last': last, 'limit': BATCH_SIZE}).all()
+        if not rows:
+            break
+        bind.execute(sa.text('UPDATE signature SET email_normalized = :email WHERE id = :id'),
+                     [{'id': id, 'email': normalize_email(email)} for id, email in rows])
+        last = rows[-1].id
+
+    duplicates = bind.scalar(sa.text(
+        'SELECT count(*) FROM (SELECT 1 FROM signature WHERE email_normalized IS NOT NULL '
+        'GROUP BY petition_id, email_normalized HAVING count(*) > 1) AS d'
+    ))
+    if duplicates:
+        raise RuntimeError(f'{duplicates} (petition_id, email) pairs are signed more than once, '
+                           'remove the extra signatures before upgrading')
+    with op.get_context().autocommit_block():
+        op.drop_index('ux_signature_petition_email', table_name='signature',
+                      if_exists=True, postgresql_concurrently=True)
+        op.create_index('ux_signature_petition_email', 'signature', ['petition_id', 'email_normalized'],
+                        unique=True, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ux_signature_petition_email', table_name='signature',
+                      if_exists=True, postgresql_concurrently=True)
+        op.create_index('ux_signature_petition_email', 'signature',
+                        ['petition_id', sa.text('lower(trim(email))')],
+                        unique=True, postgresql_concurrently=True)
+    op.drop_column('signature', 'email_normalized')
@@ -1,5 +1,6 @@
+from datetime import datetime, timezone
 from database import Base
-from sqlalchemy import Column, ForeignKey, Integer, String, Boolean
+from sqlalchemy import Column, ForeignKey, Integer, String, Boolean, DateTime, Float, Index, LargeBinary, func
 #from sqlalchemy.orm import relationship
 
 
@@ -18,21 +19,46 @@ class Users(Base):
 
 class Petition(Base):
     __tablename__ = 'petition'
+    __table_args__ = (
+        Index('ix_petition_user_id_id', 'user_id', 'id'),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey('users.id'))
     petition_name = Column(String)
     petition_text = Column(String)
-    images = Column(String)
+    images = Column(String) # legacy inline base64, moved to the blob store by migrate_images.py
+    image_ref = Column(String(64)) # sha256 of the image in the blob store
+    version = Column(Integer, nullable=False, default=1, server_default='1') # bumped on every ORM update, feeds the ETag
+
+    __mapper_args__ = {'version_id_col': version}
+
+
+# the one normalization of signer emails. It is stored in
+# signature.email_normalized, which the unique index is on, so the dedup
+# lookups and the index can't disagree about what counts as the same email
+def normalize_email(email: str) -> str:
+    return email.strip().lower()
+
+
+def _email_normalized(context):
+    email = context.get_current_parameters().get('email')
+    return normalize_email(email) if email is not None else None
 
 
 class Signature(Base):
     __tablename__ = 'signature'
+    __table_args__ = (
+        Index('ix_signature_petition_id_id', 'petition_id', 'id'),
+        Index('ix_signature_user_id_id', 'user_id', 'id'),
+        Index('ix_signature_email', 'email'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     petition_id = Column(Integer, ForeignKey('petition.id'))
     name = Column(String(255))
     email = Column(String(255))
+    email_normalized = Column(String(255), default=_email_normalized) # set on insert, emails are never edited
     phone = Column(String(20))
     city = Column(String(100))
     state = Column(String(50))
@@ -40,9 +66,17 @@ class Signature(Base):
     user_id = Column(Integer, ForeignKey('users.id'))
     validated_signature = Column(Boolean)
     can_be_contacted = Column(Boolean)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), server_default=func.now())
+
+
+# one signature per normalized email per petition
+Index('ux_signature_petition_email', Signature.petition_id, Signature.email_normalized, unique=True)
 
 class Complaint(Base):
     __tablename__ = 'complaints'
+    __table_args__ = (
+        Index('ix_complaints_complaint_type_id', 'complaint_type', 'id'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255))
@@ -59,3 +93,128 @@ class Complaint_Type(Base):
     id = Column(Integer, primary_key=True, index=True)
     complaint_type = Column(Integer)
     dictionary = Column(String)
+
+
+# sharded per-petition counters, a petition's count is the sum over its shards
+class PetitionCounter(Base):
+    __tablename__ = 'petition_counter'
+
+    petition_id = Column(Integer, primary_key=True)
+    shard = Column(Integer, primary_key=True)
+    total = Column(Integer, nullable=False, default=0)
+    validated = Column(Integer, nullable=False, default=0)
+
+
+# signatures per petition, state and city, bucketed by hour and by day.
+# Maintained by rollups.refresh from signature.created_at
+class SignatureRollup(Base):
+    __tablename__ = 'signature_rollup'
+
+    period = Column(String(4), primary_key=True) # 'hour' or 'day'
+    petition_id = Column(Integer, primary_key=True)
+    bucket = Column(DateTime(timezone=True), primary_key=True)
+    state = Column(String(50), primary_key=True)
+    city = Column(String(100), primary_key=True)
+    total = Column(Integer, nullable=False, default=0)
+
+
+# how far each incremental job has read, by signature id
+class Watermark(Base):
+    __tablename__ = 'watermark'
+
+    name = Column(String(50), primary_key=True)
+    last_id = Column(Integer, nullable=False, default=0)
+
+
+# signature and complaint counts per normalized state and city, scoped to a
+# petition (source 'signature') or a complaint type (source 'complaint')
+class GeoRollup(Base):
+    __tablename__ = 'geo_rollup'
+
+    source = Column(String(10), primary_key=True)
+    scope_id = Column(Integer, primary_key=True)
+    state = Column(String(50), primary_key=True)
+    city = Column(String(100), primary_key=True)
+    total = Column(Integer, nullable=False, default=0)
+
+
+# one uploaded CSV of signatures. rows_done is committed together with each
+# chunk it covers, so re-uploading the same file carries on from there
+class SignatureImport(Base):
+    __tablename__ = 'signature_import'
+    __table_args__ = (
+        Index('ix_signature_import_petition_digest', 'petition_id', 'digest'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    petition_id = Column(Integer, ForeignKey('petition.id'))
+    user_id = Column(Integer, ForeignKey('users.id'))
+    digest = Column(String(64), nullable=False) # sha256 of the uploaded file
+    status = Column(String(10), nullable=False, default='running') # 'running' or 'done'
+    rows_done = Column(Integer, nullable=False, default=0)
+    inserted = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), server_default=func.now())
+
+
+class SignatureImportError(Base):
+    __tablename__ = 'signature_import_error'
+
+    import_id = Column(Integer, ForeignKey('signature_import.id', ondelete='CASCADE'), primary_key=True)
+    row = Column(Integer, primary_key=True) # data row in the file, header excluded
+    message = Column(String, nullable=False)
+
+
+# durable background work, claimed by the workers in jobs.py
+class Job(Base):
+    __tablename__ = 'job'
+    __table_args__ = (
+        Index('ix_job_status_run_at', 'status', 'run_at'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(50), nullable=False)
+    payload = Column(String, nullable=False) # JSON
+    status = Column(String(10), nullable=False, default='queued') # queued, running, done or failed
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    run_at = Column(DateTime(timezone=True), nullable=False)
+    locked_by = Column(String(100))
+    locked_at = Column(DateTime(timezone=True))
+    last_error = Column(String)
+    duration = Column(Float) # seconds taken by the last attempt
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), server_default=func.now())
+    finished_at = Column(DateTime(timezone=True))
+
+
+# first response to a request sent with an Idempotency-Key, replayed for
+# retries. status_code is NULL while that first request is still running
+class IdempotencyKey(Base):
+    __tablename__ = 'idempotency_key'
+
+    key = Column(String(64), primary_key=True) # blake2b of the key, method, path and caller
+    fingerprint = Column(String(64), nullable=False) # blake2b of the request body
+    status_code = Column(Integer)
+    headers = Column(String) # JSON list of [name, value]
+    body = Column(LargeBinary)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+
+# bumped whenever a cached reference table changes, so every worker can
+# tell its copy is stale with one cheap read
+class CacheVersion(Base):
+    __tablename__ = 'cache_version'
+
+    name = Column(String(50), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+# token buckets for the shared rate limiter backend, one row per policy,
+# key kind and client. updated_at is epoch seconds
+class RateLimitBucket(Base):
+    __tablename__ = 'rate_limit_bucket'
+
+    key = Column(String(100), primary_key=True)
+    tokens = Column(Float, nullable=False)
+    updated_at = Column(Float, nullable=False, index=True)
+    allowed = Column(Boolean, nullable=False, default=True) # outcome of the last take
@@ -0,0 +1,101 @@
+import orjson
+from typing import Annotated
+
+from fastapi import Depends, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from schemas import response_columns
+
+
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_CHUNK = 1000
+
+
+# ?limit=&after=&stream= on every list endpoint. `after` is the last id of
+# the previous page, the next one is sent back in the X-Next-After header
+class PageParams:
+    def __init__(self, limit: int = Query(PAGE_SIZE, gt=0, le=MAX_PAGE_SIZE),
+                 after: int = Query(0, ge=0), stream: bool = False):
+        self.limit = limit
+        self.after = after
+        self.stream = stream
+
+
+page_dependency = Annotated[PageParams, Depends()]
+
+
+# plain column tuples rather than ORM instances: nothing to hydrate, track
+# in the identity map or lazy load, the response model validates the mappings.
+# Only the columns `schema` exposes are read
+def _page_query(model, schema, filters, page: PageParams):
+    return (
+        select(*response_columns(model, schema))
+        .where(*filters)
+        .where(model.id > page.after)
+        .order_by(model.id)
+        .limit(page.limit)
+    )
+
+
+def _set_next_after(rows, page: PageParams, response: Response):
+    if len(rows) == page.limit:
+        response.headers['X-Next-After'] = str(rows[-1]['id'])
+
+
+def keyset_page(db: Session, model, schema, filters, page: PageParams, response: Response):
+    rows = db.execute(_page_query(model, schema, filters, page)).mappings().all()
+    _set_next_after(rows, page, response)
+    return rows
+
+
+async def keyset_page_async(db: AsyncSession, model, schema, filters, page: PageParams, response: Response):
+    rows = (await db.execute(_page_query(model, schema, filters, page))).mappings().all()
+    _set_next_after(rows, page, response)
+    return rows
+
+
+# the same page over rows already held in memory, sorted by id
+def memory_page(rows, page: PageParams, response: Response):
+    rows = [row for row in rows if row['id'] > page.after][:page.limit]
+    _set_next_after(rows, page, response)
+    return rows
+
+
+# one JSON object per line, read through a server-side cursor so memory stays
+# flat whatever the table size. The request session is already closed when
+# the body is sent, so the generator opens its own
+def stream_ndjson(model, schema, filters, after: int = 0):
+    stmt = (
+        select(*response_columns(model, schema))
+        .where(*filters)
+        .where(model.id > after)
+        .order_by(model.id)
+        .execution_options(yield_per=STREAM_CHUNK)
+    )
+
+    def lines():
+        db = SessionLocal()
+        try:
+            for chunk in db.execute(stmt).mappings().partitions():
+                yield b''.join(orjson.dumps(dict(row), default=str) + b'\n' for row in chunk)
+        finally:
+            db.close()
+
+    return StreamingResponse(lines(), media_type='application/x-ndjson')
+
+
+def list_response(db: Session, model, schema, filters, page: PageParams, response: Response):
+    if page.stream:
+        return stream_ndjson(model, schema, filters, page.after)
+    return keyset_page(db, model, schema, filters, page, response)
+
+
+async def list_response_async(db: AsyncSession, model, schema, filters, page: PageParams, response: Response):
+    if page.stream:
+        return stream_ndjson(model, schema, filters, page.after)
+    return await keyset_page_async(db, model, schema, filters, page, response)
@@ -0,0 +1,133 @@
+import contextvars
+import logging
+import os
+import time
+from collections import Counter
+
+from sqlalchemy import event
+from starlette.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+# tests and staging: record every statement, send the X-Query-Count and
+# Server-Timing headers, and check each request against its query budget
+QUERY_DEBUG = os.getenv("QUERY_DEBUG", "0") == "1"
+# warn logs a request over budget, raise answers it with a 500 listing its
+# statements (when the response hasn't started streaming yet)
+QUERY_BUDGET_MODE = os.getenv("QUERY_BUDGET_MODE", "warn")
+# for endpoints without their own @query_budget
+QUERY_BUDGET_DEFAULT = int(os.getenv("QUERY_BUDGET_DEFAULT", "25"))
+# the same statement run more often than this in one request is a likely N+1
+QUERY_REPEAT_LIMIT = int(os.getenv("QUERY_REPEAT_LIMIT", "5"))
+
+
+# what the database did on behalf of one request. The middleware sets a
+# fresh one per request; it is shared by reference, so queries run from the
+# threadpool (which copies the context) land in the same object
+class QueryStats:
+    __slots__ = ('queries', 'seconds', 'statements')
+
+    def __init__(self, record: bool = False):
+        self.queries = 0
+        self.seconds = 0.0
+        self.statements = [] if record else None
+
+
+current = contextvars.ContextVar('query_stats', default=None)
+
+# every query this process ran, in a request or not
+totals = {'queries': 0, 'seconds': 0.0}
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info['query_started'] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info.pop('query_started', time.perf_counter())
+    totals['queries'] += 1
+    totals['seconds'] += elapsed
+    stats = current.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.seconds += elapsed
+        if stats.statements is not None:
+            stats.statements.append(statement)
+
+
+# for the sync engine and the async engine's sync_engine
+def install(*engines):
+    for engine in engines:
+        if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+def track() -> QueryStats:
+    stats = QueryStats(QUERY_DEBUG)
+    current.set(stats)
+    return stats
+
+
+# the most queries one request to this endpoint may run, checked when
+# QUERY_DEBUG is on. Goes under the router decorator
+def query_budget(limit: int):
+    def mark(endpoint):
+        endpoint.query_budget = limit
+        return endpoint
+    return mark
+
+
+# what is wrong with a request's queries, empty when nothing is
+def problems(stats: QueryStats, route) -> list[str]:
+    found = []
+    budget = getattr(getattr(route, 'endpoint', None), 'query_budget', QUERY_BUDGET_DEFAULT)
+    if stats.queries > budget:
+        found.append(f'{stats.queries} queries, budget is {budget}')
+    repeated = Counter(stats.statements or ())
+    found.extend(f'ran {count} times: {statement}' for statement, count in repeated.most_common()
+                 if count > QUERY_REPEAT_LIMIT)
+    return found
+
+
+def _headers(stats: QueryStats) -> list[tuple]:
+    return [
+        (b'x-query-count', str(stats.queries).encode()),
+        (b'server-timing', f'db;dur={stats.seconds * 1000:.2f};desc="{stats.queries} queries"'.encode()),
+    ]
+
+
+# ASGI middleware, installed only with QUERY_DEBUG. Adds the query headers
+# and holds each request to its budget. Reuses the QueryStats of the
+# metrics middleware when that one runs outside it
+class QueryDebugMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        stats = current.get()
+        if stats is None or stats.statements is None:
+            stats = track()
+        name = f"{scope['method']} {scope['path']}"
+        replaced = False
+
+        async def send_checked(message):
+            nonlocal replaced
+            if replaced:
+                return
+            if message['type'] == 'http.response.start':
+                found = problems(stats, scope.get('route'))
+                if found and QUERY_BUDGET_MODE == 'raise':
+                    replaced = True
+                    response = JSONResponse(
+                        {'detail': 'Query budget exceeded', 'problems': found, 'statements': stats.statements},
+                        status_code=500, headers={'X-Query-Count': str(stats.queries)})
+                    return await response(scope, receive, send)
+                if found:
+                    logger.warning('%s: %s', name, '; '.join(found))
+                message = {**message, 'headers': list(message.get('headers', [])) + _headers(stats)}
+            await send(message)
+
+        await self.app(scope, receive, send_checked)
@@ -0,0 +1,298 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from collections import Counter, OrderedDict
+from urllib.parse import parse_qs
+
+from dotenv import load_dotenv
+from jose import jwt, JWTError
+from sqlalchemy import case, delete, func, select
+from starlette.responses import JSONResponse
+
+from database import AsyncSessionLocal, SessionLocal, upsert
+from models import RateLimitBucket
+from token_cache import REVOKED, token_cache, user_from_claims
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+SECRET_KEY = os.getenv("AUTH_SECRET_KEY")
+ALGORITHM = os.getenv("ALGORITHM")
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") == "1"
+# memory keeps buckets per process, database shares them across workers
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+# bodies larger than this are not parsed for an email, only the other keys
+# apply. Bodies without a Content-Length are read up to this many bytes
+RATE_LIMIT_BODY_BYTES = int(os.getenv("RATE_LIMIT_BODY_BYTES", "65536"))
+# 1 when behind a proxy that sets X-Forwarded-For, otherwise it is spoofable
+RATE_LIMIT_TRUST_FORWARDED = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "0") == "1"
+# database buckets untouched for this long are full again and get purged
+RATE_LIMIT_IDLE_SECONDS = int(os.getenv("RATE_LIMIT_IDLE_SECONDS", "3600"))
+PURGE_BATCH = 1000
+
+# "<count>/<second|minute|hour|day>", empty or 0 turns the limit off
+RATE_LIMIT_LOGIN_IP = os.getenv("RATE_LIMIT_LOGIN_IP", "30/minute")
+RATE_LIMIT_LOGIN_EMAIL = os.getenv("RATE_LIMIT_LOGIN_EMAIL", "5/minute")
+RATE_LIMIT_REGISTER_IP = os.getenv("RATE_LIMIT_REGISTER_IP", "10/hour")
+RATE_LIMIT_SIGN_IP = os.getenv("RATE_LIMIT_SIGN_IP", "60/minute")
+RATE_LIMIT_SIGN_EMAIL = os.getenv("RATE_LIMIT_SIGN_EMAIL", "5/hour")
+RATE_LIMIT_VALIDATE_IP = os.getenv("RATE_LIMIT_VALIDATE_IP", "60/minute")
+RATE_LIMIT_WRITE_USER = os.getenv("RATE_LIMIT_WRITE_USER", "600/minute")
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+# requests let through and turned away, the latter per policy and key kind
+stats = {'checked': 0, 'throttled': 0, 'backend_errors': 0}
+throttled = Counter()
+
+
+# (burst, tokens per second), or None when the limit is off
+def parse_rate(rate: str):
+    if not rate or rate == '0':
+        return None
+    count, _, period = rate.partition('/')
+    return int(count), int(count) / PERIODS[period or 'second']
+
+
+def _digest(value: str) -> str:
+    return hashlib.blake2b(value.encode(), digest_size=16).hexdigest()
+
+
+# one bucket per client, refilled continuously at `rate` up to `burst`.
+# Only touched from the event loop, so no locking
+class MemoryBackend:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+
+    # 0 when the request may go ahead, otherwise seconds until it could
+    async def take(self, key: str, burst: int, rate: float, cost: float = 1) -> float:
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        allowed = tokens >= cost
+        self._buckets[key] = (tokens - cost if allowed else tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.maxsize:
+            self._buckets.popitem(last=False)
+        return 0 if allowed else (cost - tokens) / rate
+
+
+# same buckets in the rate_limit_bucket table: refill, check and take happen
+# in one upsert, so concurrent workers can't both spend the last token
+class DatabaseBackend:
+    async def take(self, key: str, burst: int, rate: float, cost: float = 1) -> float:
+        now = time.time()
+        async with AsyncSessionLocal() as db:
+            least = func.least if db.get_bind().dialect.name == 'postgresql' else func.min
+            refilled = least(burst, RateLimitBucket.tokens + (now - RateLimitBucket.updated_at) * rate)
+            stmt = (
+                upsert(db, RateLimitBucket)
+                .values(key=key, tokens=burst - cost, updated_at=now, allowed=True)
+                .on_conflict_do_update(index_elements=['key'], set_={
+                    'tokens': case((refilled >= cost, refilled - cost), else_=refilled),
+                    'updated_at': now,
+                    'allowed': refilled >= cost,
+                })
+                .returning(RateLimitBucket.tokens, RateLimitBucket.allowed)
+            )
+            tokens, allowed = (await db.execute(stmt)).one()
+            await db.commit()
+        return 0 if allowed else (cost - tokens) / rate
+
+
+backend = DatabaseBackend() if RATE_LIMIT_BACKEND == 'database' else MemoryBackend(RATE_LIMIT_MAX_KEYS)
+
+
+# batch job for the rollup loop when buckets live in the database
+def purge_idle() -> int:
+    db = SessionLocal()
+    try:
+        idle = (
+            select(RateLimitBucket.key)
+            .where(RateLimitBucket.updated_at < time.time() - RATE_LIMIT_IDLE_SECONDS)
+            .limit(PURGE_BATCH)
+        )
+        removed = db.execute(delete(RateLimitBucket).where(RateLimitBucket.key.in_(idle.scalar_subquery()))).rowcount
+        db.commit()
+        return removed
+    finally:
+        db.close()
+
+
+# what a limit counts by. Each returns None when the request doesn't carry
+# that key, and the limit is skipped
+def client_ip(scope, headers: dict, body: dict):
+    if RATE_LIMIT_TRUST_FORWARDED and 'x-forwarded-for' in headers:
+        return headers['x-forwarded-for'].split(',')[0].strip()
+    return scope['client'][0] if scope.get('client') else None
+
+
+# the verified user id from the bearer token, same check as get_current_user
+# but without the database. A token verified here is cached for the route, a
+# revoked one has no user
+def bearer_user(scope, headers: dict, body: dict):
+    scheme, _, token = headers.get('authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not token:
+        return None
+    user = token_cache.peek(token)
+    if user is REVOKED:
+        return None
+    if user is None:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError:
+            return None
+        user = user_from_claims(payload)
+        if user is None:
+            return None
+        token_cache.put(token, user, payload.get('exp'))
+    return user.get('id')
+
+
+# the login form sends the email as `username` (OAuth2 form) or `email`
+def body_email(scope, headers: dict, body: dict):
+    email = body.get('email') or body.get('username')
+    return email.strip().lower() if isinstance(email, str) and email.strip() else None
+
+
+KEYS = {'ip': client_ip, 'user': bearer_user, 'email': body_email}
+
+
+class Limit:
+    def __init__(self, kind: str, rate: str):
+        self.kind = kind
+        self.key = KEYS[kind]
+        self.rate = parse_rate(rate)
+
+
+class Policy:
+    def __init__(self, name: str, methods: set, path: str, limits: list[Limit]):
+        self.name = name
+        self.methods = methods
+        self.path = re.compile(path)
+        self.limits = [limit for limit in limits if limit.rate is not None]
+        self.needs_body = any(limit.kind == 'email' for limit in self.limits)
+
+    def matches(self, method: str, path: str) -> bool:
+        return method in self.methods and self.path.fullmatch(path) is not None
+
+
+# first match wins
+POLICIES = [
+    Policy('login', {'POST'}, r'/auth/(token)?', [Limit('ip', RATE_LIMIT_LOGIN_IP), Limit('email', RATE_LIMIT_LOGIN_EMAIL)]),
+    Policy('register', {'POST'}, r'/auth/register', [Limit('ip', RATE_LIMIT_REGISTER_IP)]),
+    Policy('sign', {'POST'}, r'/signatures/?', [Limit('ip', RATE_LIMIT_SIGN_IP), Limit('email', RATE_LIMIT_SIGN_EMAIL)]),
+    Policy('validate', {'GET', 'PUT'}, r'/signatures/validate(/\d+)?', [Limit('ip', RATE_LIMIT_VALIDATE_IP)]),
+    Policy('write', {'POST', 'PUT', 'DELETE'}, r'/.*', [Limit('user', RATE_LIMIT_WRITE_USER)]),
+]
+
+
+def _parse_body(content_type: str, raw: bytes) -> dict:
+    try:
+        if content_type.startswith('application/json'):
+            body = json.loads(raw)
+            return body if isinstance(body, dict) else {}
+        if content_type.startswith('application/x-www-form-urlencoded'):
+            return {name: values[0] for name, values in parse_qs(raw.decode()).items()}
+    except ValueError:
+        pass
+    return {}
+
+
+def metrics() -> dict:
+    return {**stats, 'backend': RATE_LIMIT_BACKEND, 'throttled_by': dict(throttled)}
+
+
+# ASGI middleware in front of every route. A throttled request is answered
+# with a 429 here, before the app parses, authenticates, hashes or queries
+# anything. When a policy keys on the body, the body is read once and
+# replayed to the app
+class RateLimitMiddleware:
+    def __init__(self, app, policies: list[Policy] = POLICIES):
+        self.app = app
+        self.policies = policies
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not RATE_LIMIT_ENABLED:
+            return await self.app(scope, receive, send)
+        policy = next((p for p in self.policies if p.matches(scope['method'], scope['path'])), None)
+        if policy is None or not policy.limits:
+            return await self.app(scope, receive, send)
+
+        headers = {name.decode('latin-1'): value.decode('latin-1') for name, value in scope['headers']}
+        body = {}
+        if policy.needs_body and _body_fits(headers):
+            raw, complete, receive = await _buffer(receive, RATE_LIMIT_BODY_BYTES)
+            if complete:
+                body = _parse_body(headers.get('content-type', ''), raw)
+
+        stats['checked'] += 1
+        for limit in policy.limits:
+            value = limit.key(scope, headers, body)
+            if value is None:
+                continue
+            burst, rate = limit.rate
+            try:
+                wait = await backend.take(f'{policy.name}:{limit.kind}:{_digest(str(value))}', burst, rate)
+            except Exception:
+                # fail open, a broken limiter must not take the API down
+                stats['backend_errors'] += 1
+                logger.exception('rate limit backend')
+                continue
+            if wait:
+                stats['throttled'] += 1
+                throttled[f'{policy.name}:{limit.kind}'] += 1
+                response = JSONResponse({'detail': 'Too many requests'}, status_code=429,
+                                        headers={'Retry-After': str(max(1, round(wait)))})
+                return await response(scope, receive, send)
+        await self.app(scope, receive, send)
+
+
+# a declared length over the cap, or one that isn't a number, leaves the
+# email key out. Chunked bodies declare none and are read up to the cap
+def _body_fits(headers: dict) -> bool:
+    length = headers.get('content-length')
+    if length is None:
+        return True
+    try:
+        return int(length) <= RATE_LIMIT_BODY_BYTES
+    except ValueError:
+        return False
+
+
+# reads the body until it ends or passes `limit` bytes, whichever is first.
+# The bytes read are replayed to the app ahead of the rest of the stream
+async def _buffer(receive, limit: int):
+    chunks, size, more_body = [], 0, True
+    while more_body and size <= limit:
+        message = await receive()
+        if message['type'] != 'http.request':
+            # the client went away, the app sees the same
+            return b'', False, _prepend(message, receive)
+        chunk = message.get('body', b'')
+        chunks.append(chunk)
+        size += len(chunk)
+        more_body = message.get('more_body', False)
+    raw = b''.join(chunks)
+    message = {'type': 'http.request', 'body': raw, 'more_body': more_body}
+    return raw, not more_body and size <= limit, _prepend(message, receive)
+
+
+def _prepend(message: dict, receive):
+    replayed = False
+
+    async def replay():
+        nonlocal replayed
+        if not replayed:
+            replayed = True
+            return message
+        return await receive()
+
+    return replay
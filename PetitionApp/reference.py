@@ -0,0 +1,102 @@
+import os
+import time
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, upsert
+from models import CacheVersion, Complaint_Type
+
+
+# how stale another worker's change may look here, in seconds
+REFERENCE_CHECK_SECONDS = float(os.getenv("REFERENCE_CHECK_SECONDS", "5"))
+
+
+def _version_query(name: str):
+    return select(CacheVersion.version).where(CacheVersion.name == name)
+
+
+def _bump_statement(db, name: str):
+    stmt = upsert(db, CacheVersion).values(name=name, version=1)
+    return stmt.on_conflict_do_update(index_elements=['name'], set_={'version': CacheVersion.version + 1})
+
+
+# the whole complaint_type table held in memory. Reads check the shared
+# version stamp at most every REFERENCE_CHECK_SECONDS and reload when it
+# moved; writers bump it in their own transaction. A reload swaps in whole
+# new dicts, so readers on the event loop and in the threadpool never see a
+# half-filled table, and two threads reloading at once just do it twice
+class ComplaintTypeCache:
+    name = 'complaint_type'
+
+    def __init__(self):
+        self.types = {}  # id -> row dict, in id order
+        self.labels = {}  # complaint_type code -> dictionary
+        self.version = None
+        self.checked_at = 0.0
+        self.stats = {'hits': 0, 'reloads': 0, 'checks': 0}
+
+    def _fill(self, version, rows):
+        self.types = {row['id']: dict(row) for row in rows}
+        self.labels = {row['complaint_type']: row['dictionary'] for row in self.types.values()}
+        self.version = version
+        self.checked_at = time.monotonic()
+        self.stats['reloads'] += 1
+
+    def _rows_query(self):
+        return select(Complaint_Type.id, Complaint_Type.complaint_type, Complaint_Type.dictionary).order_by(Complaint_Type.id)
+
+    def _due(self) -> bool:
+        if self.version is not None and time.monotonic() - self.checked_at < REFERENCE_CHECK_SECONDS:
+            self.stats['hits'] += 1
+            return False
+        return True
+
+    def refresh(self, db: Session):
+        if not self._due():
+            return
+        self.stats['checks'] += 1
+        version = db.scalar(_version_query(self.name)) or 0
+        if version == self.version:
+            self.checked_at = time.monotonic()
+            return
+        self._fill(version, db.execute(self._rows_query()).mappings().all())
+
+    async def refresh_async(self, db: AsyncSession):
+        if not self._due():
+            return
+        self.stats['checks'] += 1
+        version = await db.scalar(_version_query(self.name)) or 0
+        if version == self.version:
+            self.checked_at = time.monotonic()
+            return
+        self._fill(version, (await db.execute(self._rows_query())).mappings().all())
+
+    # at startup, from the threadpool
+    def load(self):
+        db = SessionLocal()
+        try:
+            self.refresh(db)
+        finally:
+            db.close()
+
+    # part of the writer's transaction, other workers reload on their next check
+    async def bump(self, db: AsyncSession):
+        await db.execute(_bump_statement(db, self.name))
+
+    # after the writer commits, so this worker reads its own write
+    def invalidate(self):
+        self.version = None
+
+    def rows(self) -> list[dict]:
+        return list(self.types.values())
+
+    def get(self, id: int) -> dict | None:
+        return self.types.get(id)
+
+    def label(self, complaint_type) -> str | None:
+        return self.labels.get(complaint_type)
+
+
+complaint_types = ComplaintTypeCache()
@@ -0,0 +1,81 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import orjson
+from fastapi import Request, Response
+
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+
+
+def etag(*parts) -> str:
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()
+    return f'"{digest}"'
+
+
+def not_modified(request: Request, tag: str) -> bool:
+    header = request.headers.get('if-none-match')
+    if not header:
+        return False
+    candidates = [candidate.strip().removeprefix('W/') for candidate in header.split(',')]
+    return '*' in candidates or tag in candidates
+
+
+def serialize(value) -> bytes:
+    return orjson.dumps(value, default=str)
+
+
+def json_response(body: bytes, tag: str, headers: dict | None = None) -> Response:
+    return Response(content=body, media_type='application/json', headers={'ETag': tag, **(headers or {})})
+
+
+def not_modified_response(tag: str, headers: dict | None = None) -> Response:
+    return Response(status_code=304, headers={'ETag': tag, **(headers or {})})
+
+
+# bounded LRU of serialized response bodies. Keys carry the row version (or
+# the page's ETag), so an entry can never be served stale even when another
+# worker changed the row; invalidation only frees the memory early. The
+# handlers using it run in the threadpool, hence the lock
+class ResponseCache:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'not_modified': 0, 'invalidated': 0}
+
+    def get(self, key) -> bytes | None:
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return body
+
+    def put(self, key, body: bytes):
+        with self._lock:
+            self._entries[key] = body
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, predicate):
+        with self._lock:
+            for key in [key for key in self._entries if predicate(key)]:
+                del self._entries[key]
+                self.stats['invalidated'] += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+
+response_cache = ResponseCache(RESPONSE_CACHE_SIZE)
+
+
+# a petition changed or went away: its own entries and every cached listing page
+def invalidate_petition(petition_id: int):
+    response_cache.invalidate(lambda key: key[0] == 'petition_page' or (key[0] == 'petition' and key[1] == petition_id))
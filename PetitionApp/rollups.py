@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, func, literal, select
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from database import SessionLocal, upsert
+from models import Signature, SignatureRollup, Watermark
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_INTERVAL_SECONDS = int(os.getenv("ROLLUP_INTERVAL_SECONDS", "30"))
+ROLLUP_BATCH = int(os.getenv("ROLLUP_BATCH", "50000"))
+# rows are only picked up once they are this old, so a transaction that took
+# a new id but had not committed yet is not skipped by the watermark
+WATERMARK_SETTLE_SECONDS = int(os.getenv("WATERMARK_SETTLE_SECONDS", "5"))
+# the watermark only moves forward: deleted signatures and rows that commit
+# below it after it passed (a transaction open longer than the settle window)
+# are only picked up by the full reconcile, at most this long later. 0 disables it
+ROLLUP_RECONCILE_SECONDS = int(os.getenv("ROLLUP_RECONCILE_SECONDS", "3600"))
+
+PERIODS = ('hour', 'day')
+_SQLITE_BUCKETS = {'hour': '%Y-%m-%d %H:00:00', 'day': '%Y-%m-%d 00:00:00'}
+
+
+# row-locked for the rest of the transaction, so two workers never fold the
+# same range of signatures twice
+def lock_watermark(db: Session, name: str) -> Watermark:
+    db.execute(upsert(db, Watermark).values(name=name, last_id=0).on_conflict_do_nothing())
+    return db.scalar(select(Watermark).where(Watermark.name == name).with_for_update())
+
+
+def read_watermark(db: Session, name: str) -> int:
+    return db.scalar(select(Watermark.last_id).where(Watermark.name == name)) or 0
+
+
+# last signature id of the next batch after `last_id`, stopping before the
+# first row that has not settled yet. None when there is nothing to do
+def next_upper(db: Session, last_id: int, batch: int) -> int | None:
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=WATERMARK_SETTLE_SECONDS)
+    latest = db.scalar(select(func.max(Signature.id)).where(Signature.id > last_id))
+    if latest is None:
+        return None
+    unsettled = db.scalar(
+        select(func.min(Signature.id)).where(Signature.id > last_id, Signature.created_at >= cutoff))
+    upper = min(last_id + batch, latest if unsettled is None else unsettled - 1)
+    return upper if upper > last_id else None
+
+
+def _bucket(db: Session, period: str):
+    if db.get_bind().dialect.name == 'postgresql':
+        return func.date_trunc(period, Signature.created_at)
+    return func.strftime(_SQLITE_BUCKETS[period], Signature.created_at)
+
+
+# adds the signatures with lower < id <= upper to the rollups
+def _fold(db: Session, lower: int, upper: int):
+    for period in PERIODS:
+        bucket = _bucket(db, period)
+        state = func.coalesce(Signature.state, '')
+        city = func.coalesce(Signature.city, '')
+        rows = (
+            select(literal(period), Signature.petition_id, bucket, state, city, func.count())
+            .where(Signature.id > lower, Signature.id <= upper)
+            .where(Signature.petition_id.is_not(None), Signature.created_at.is_not(None))
+            .group_by(Signature.petition_id, bucket, state, city)
+        )
+        stmt = upsert(db, SignatureRollup).from_select(
+            ['period', 'petition_id', 'bucket', 'state', 'city', 'total'], rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['period', 'petition_id', 'bucket', 'state', 'city'],
+            set_={'total': SignatureRollup.total + stmt.excluded.total},
+        )
+        db.execute(stmt)
+
+
+# folds the next batch of signatures into the hourly and daily rollups,
+# returns how many ids it covered (0 when caught up)
+def refresh() -> int:
+    db = SessionLocal()
+    try:
+        watermark = lock_watermark(db, 'signature_rollup')
+        last_id = watermark.last_id
+        upper = next_upper(db, last_id, ROLLUP_BATCH)
+        if upper is None:
+            db.commit()
+            return 0
+        _fold(db, last_id, upper)
+        watermark.last_id = upper
+        db.commit()
+        return upper - last_id
+    finally:
+        db.close()
+
+
+# rebuilds the rollups of everything below the watermark from the table, a
+# full scan. Holds the watermark lock, so refresh waits rather than folding
+# rows twice
+def reconcile():
+    db = SessionLocal()
+    try:
+        watermark = lock_watermark(db, 'signature_rollup')
+        db.execute(delete(SignatureRollup))
+        _fold(db, 0, watermark.last_id)
+        db.commit()
+    finally:
+        db.close()
+
+
+# runs each incremental job until it has caught up, then sleeps
+async def run_forever(jobs, interval: int = ROLLUP_INTERVAL_SECONDS):
+    while True:
+        for job in jobs:
+            try:
+                while await run_in_threadpool(job):
+                    pass
+            except Exception:
+                logger.exception('%s failed', job.__name__)
+        await asyncio.sleep(interval)
+
+
+# the first full reconcile runs one interval after startup, not on every boot
+async def reconcile_forever(jobs, interval: int = ROLLUP_RECONCILE_SECONDS):
+    while True:
+        await asyncio.sleep(interval)
+        for job in jobs:
+            try:
+                await run_in_threadpool(job)
+            except Exception:
+                logger.exception('%s failed', job.__name__)
+
+
+def timeseries(db: Session, petition_id: int, period: str, since=None, until=None) -> list[dict]:
+    stmt = (
+        select(SignatureRollup.bucket, func.sum(SignatureRollup.total))
+        .where(SignatureRollup.period == period, SignatureRollup.petition_id == petition_id)
+        .group_by(SignatureRollup.bucket)
+        .order_by(SignatureRollup.bucket)
+    )
+    if since is not None:
+        stmt = stmt.where(SignatureRollup.bucket >= since)
+    if until is not None:
+        stmt = stmt.where(SignatureRollup.bucket < until)
+    return [{'bucket': bucket, 'total': total} for bucket, total in db.execute(stmt)]
+
+
+def daily_totals(db: Session) -> list[dict]:
+    stmt = (
+        select(SignatureRollup.petition_id, SignatureRollup.bucket, func.sum(SignatureRollup.total))
+        .where(SignatureRollup.period == 'day')
+        .group_by(SignatureRollup.petition_id, SignatureRollup.bucket)
+        .order_by(SignatureRollup.petition_id, SignatureRollup.bucket)
+    )
+    return [
+        {'petition_id': petition_id, 'day': bucket, 'signature_count': total}
+        for petition_id, bucket, total in db.execute(stmt)
+    ]
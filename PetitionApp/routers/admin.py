@@ -1,11 +1,23 @@
 from typing import Annotated
 from sqlalchemy.orm import Session
+from pydantic import BaseModel, Field
 
-from fastapi import Depends, HTTPException, Path, APIRouter
+from fastapi import Depends, HTTPException, Path, APIRouter, Request, Response
 from models import Petition, Signature
-from database import SessionLocal
+from schemas import PetitionResponse, SignatureResponse, response_columns
+from database import db_dependency
 from starlette import status
+from starlette.concurrency import run_in_threadpool
+from anyio import from_thread
 from .auth import get_current_user
+import counters
+import validation
+import jobs
+import live
+import ratelimit
+from querystats import query_budget
+from pagination import page_dependency, list_response, stream_ndjson
+from response_cache import response_cache, etag, not_modified, not_modified_response, serialize, json_response, invalidate_petition
 
 
 router = APIRouter(
@@ -14,33 +26,52 @@ router = APIRouter(
 )
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-        
-        
-db_dependency = Annotated[Session, Depends(get_db)]
 user_dependency = Annotated[dict, Depends(get_current_user)]
 
 
-@router.get("/petition", status_code=status.HTTP_200_OK)
-async def read_all(user: user_dependency, db: db_dependency):
+class BulkValidationRequest(BaseModel):
+    ids: list[int] = Field(min_length=1, max_length=100000)
+    validated: bool = True
+
+
+class ValidationLinksRequest(BaseModel):
+    ids: list[int] = Field(min_length=1, max_length=10000)
+
+
+@router.get("/petition", status_code=status.HTTP_200_OK, response_model=list[PetitionResponse])
+def read_all(user: user_dependency, db: db_dependency, page: page_dependency, request: Request):
     if user is None or user.get('user_role') != 'Admin':
         raise HTTPException(status_code=401, detail='Authentication Failed')
-    return db.query(Petition).all()
+    if page.stream:
+        return stream_ndjson(Petition, PetitionResponse, [], page.after)
+
+    # the page's ETag comes from its (id, version) pairs, bodies are only
+    # read when the client's copy is stale and the page isn't cached
+    versions = [tuple(row) for row in db.query(Petition.id, Petition.version).filter(Petition.id > page.after).order_by(Petition.id).limit(page.limit)]
+    headers = {'X-Next-After': str(versions[-1][0])} if len(versions) == page.limit else {}
+    tag = etag('petition_page', page.after, page.limit, versions)
+    if not_modified(request, tag):
+        response_cache.stats['not_modified'] += 1
+        return not_modified_response(tag, headers)
+
+    body = response_cache.get(('petition_page', tag))
+    if body is None:
+        rows = db.query(*response_columns(Petition, PetitionResponse)).filter(Petition.id.in_([id for id, _ in versions])).order_by(Petition.id).all()
+        tag = etag('petition_page', page.after, page.limit, [(row.id, row.version) for row in rows])
+        body = serialize([PetitionResponse.model_validate(row).model_dump() for row in rows])
+        response_cache.put(('petition_page', tag), body)
+    return json_response(body, tag, headers)
 
-@router.get("/signature", status_code=status.HTTP_200_OK)
-async def read_all(user: user_dependency, db: db_dependency):
+@router.get("/signature", status_code=status.HTTP_200_OK, response_model=list[SignatureResponse])
+def read_all(user: user_dependency, db: db_dependency, page: page_dependency, response: Response):
     if user is None or user.get('user_role') != 'Admin':
         raise HTTPException(status_code=401, detail='Authentication Failed')
-    return db.query(Signature).all()
+    return list_response(db, Signature, SignatureResponse, [], page, response)
 
 
 @router.delete("/petition/{petition_id}", status_code=status.HTTP_202_ACCEPTED)
-async def delete_petition(user: user_dependency, db: db_dependency, petition_id: int = Path(gt=0)):
+@query_budget(3)
+def delete_petition(user: user_dependency, db: db_dependency, petition_id: int = Path(gt=0)):
     if user is None or user.get('user_role') != 'Admin':
         raise HTTPException(status_code=401, detail='Authentication Failed')
     
@@ -48,11 +79,14 @@ async def delete_petition(user: user_dependency, db: db_dependency, petition_id:
     if todo_model is None:
         raise HTTPException(status_code=404, detail='Petition not found')
     db.query(Petition).filter(Petition.id ==  petition_id).delete()
+    counters.drop(db, petition_id)
 
     db.commit()
+    invalidate_petition(petition_id)
 
 @router.delete("/signature/{signature_id}", status_code=status.HTTP_202_ACCEPTED)
-async def delete_petition(user: user_dependency, db: db_dependency, signature_id: int = Path(gt=0)):
+@query_budget(3)
+def delete_petition(user: user_dependency, db: db_dependency, signature_id: int = Path(gt=0)):
     if user is None or user.get('user_role') != 'Admin':
         raise HTTPException(status_code=401, detail='Authentication Failed')
     
@@ -60,5 +94,39 @@ async def delete_petition(user: user_dependency, db: db_dependency, signature_id
     if todo_model is None:
         raise HTTPException(status_code=404, detail='Signature not found')
     db.query(Signature).filter(Signature.id ==  signature_id).delete()
+    validated = -1 if todo_model.validated_signature else 0
+    counters.increment(db, todo_model.petition_id, total=-1, validated=validated)
 
     db.commit()
+    from_thread.run_sync(live.publish_counts, todo_model.petition_id, -1, validated)
+
+
+@router.post("/signature/validate", status_code=status.HTTP_200_OK)
+async def bulk_validate(user: user_dependency, request: BulkValidationRequest):
+    if user is None or user.get('user_role') != 'Admin':
+        raise HTTPException(status_code=401, detail='Authentication Failed')
+    updated = await run_in_threadpool(validation.bulk_set_validated, request.ids, request.validated)
+    return {'updated': updated}
+
+
+# tokens for a mail-out, one per signature id that exists
+@router.post("/signature/validation-tokens", status_code=status.HTTP_200_OK)
+def validation_tokens(user: user_dependency, db: db_dependency, request: ValidationLinksRequest):
+    if user is None or user.get('user_role') != 'Admin':
+        raise HTTPException(status_code=401, detail='Authentication Failed')
+    ids = db.query(Signature.id).filter(Signature.id.in_(request.ids)).all()
+    return {signature_id: validation.issue_token(signature_id) for signature_id, in ids}
+
+
+@router.get("/jobs", status_code=status.HTTP_200_OK)
+def job_stats(user: user_dependency, db: db_dependency):
+    if user is None or user.get('user_role') != 'Admin':
+        raise HTTPException(status_code=401, detail='Authentication Failed')
+    return {'queue': jobs.queue_stats(db), 'this_process': jobs.metrics}
+
+
+@router.get("/rate-limits", status_code=status.HTTP_200_OK)
+async def rate_limit_stats(user: user_dependency):
+    if user is None or user.get('user_role') != 'Admin':
+        raise HTTPException(status_code=401, detail='Authentication Failed')
+    return ratelimit.metrics()
@@ -2,9 +2,10 @@ from datetime import datetime, timedelta
 from typing import Annotated # for dependency injection
 from fastapi import APIRouter, Depends, HTTPException, status, Request, Response, Form  # for router and dependency injection, raise exception
 from pydantic import BaseModel
-from database import SessionLocal , engine
+from database import engine, get_db, db_dependency
 from models import Users
-from passlib.context import CryptContext
+from hashing import hash_password, verify_password
+from token_cache import token_cache, user_from_claims, REVOKED
 from sqlalchemy.orm import Session 
 from starlette import status # for status code
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer # form to get username and password, decode JWT token
@@ -13,6 +14,8 @@ import os
 from dotenv import load_dotenv
 from typing import Optional
 import models
+import jobs
+from starlette.concurrency import run_in_threadpool
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
 from starlette.responses import RedirectResponse
@@ -47,13 +50,11 @@ class LoginForm:
         self.username = form.get("email")
         self.password = form.get("password")
 
-models.Base.metadata.create_all(bind=engine)
-bcrypt_context = CryptContext(schemes=['bcrypt'], deprecated='auto') # hash password
 oauth2_bearer = OAuth2PasswordBearer(tokenUrl='auth/token') # get token from url to authenticate user
 
 
-def get_password_hash(password):
-    return bcrypt_context.hash(password)
+async def get_password_hash(password):
+    return await hash_password(password)
 # request model to create user
 class CreateUserRequest(BaseModel): 
     username: str
@@ -68,23 +69,13 @@ class token(BaseModel):
     access_token: str
     token_type: str
     
-# function to get database
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-        
-# dependency injection to get database        
-db_dependency = Annotated[Session, Depends(get_db)]
 
 #function to authenticate user
-def authenticate_user(username: str, password: str, db):
-    user = db.query(Users).filter(Users.username == username).first()
+async def authenticate_user(username: str, password: str, db):
+    user = await run_in_threadpool(db.query(Users).filter(Users.username == username).first)
     if not user:
         return False
-    if not bcrypt_context.verify(password, user.hashed_password):
+    if not await verify_password(password, user.hashed_password):
         return False
     return user
 
@@ -103,14 +94,19 @@ async def get_current_user(request: Request, token: Annotated[str, Depends(oauth
         detail='Could not validate credentials',
         headers={'WWW-Authenticate': 'Bearer'}
     )
+    # repeat requests from the same session skip signature verification
+    user = token_cache.get(token)
+    if user is REVOKED:
+        raise credentials_exception
+    if user is not None:
+        return user
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get('sub') # type: ignore
-        user_id: int = payload.get('id') # type: ignore
-        user_role: str = payload.get('role') # type: ignore
-        if username is None or user_id is None:
-            logout(request)
-        return {"username": username, "id": user_id}
+        user = user_from_claims(payload)
+        if user is None:
+            raise credentials_exception
+        token_cache.put(token, user, payload.get('exp'))
+        return user
     except JWTError:
         raise HTTPException(status_code=404, detail="Not Found")
     #         raise credentials_exception
@@ -150,7 +146,7 @@ async def login_for_access_token(response: Response, form_data: Annotated[ OAuth
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail='Could not validate credentials',
         headers={'WWW-Authenticate': 'Bearer'})
-    user = authenticate_user(form_data.username, form_data.password, db)
+    user = await authenticate_user(form_data.username, form_data.password, db)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect username or password")
     token_expires = timedelta(minutes=60)
@@ -174,17 +170,42 @@ async def login(request: Request, db: Session = Depends(get_db)):
             msg = "Invalid username or password"
             return templates.TemplateResponse("login.html", {"request": request, "msg": msg})
         return response
-    except HTTPException:
+    except HTTPException as e:
+        # hashing saturated: the password wasn't checked, don't call it wrong
+        if e.status_code == status.HTTP_503_SERVICE_UNAVAILABLE:
+            msg = "Server busy, try again in a moment"
+            return templates.TemplateResponse("login.html", {"request": request, "msg": msg},
+                                              status_code=e.status_code, headers=e.headers)
         msg = "Invalid username or password"
         return templates.TemplateResponse("login.html", {"request": request, "msg": msg})
     
+def revoke_tokens(request: Request):
+    tokens = [request.cookies.get("access_token")]
+    scheme, _, bearer = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() == "bearer":
+        tokens.append(bearer)
+    for token in filter(None, tokens):
+        try:
+            token_cache.revoke(token, jwt.get_unverified_claims(token).get('exp'))
+        except JWTError:
+            pass
+
+
 @router.get("/logout")
 async def logout(request: Request):
     msg="Logout Successful"
+    revoke_tokens(request)
     response = templates.TemplateResponse("login.html",{"request":request, "msg":msg})
     response.delete_cookie(key="access_token")
     return response 
 
+def _add_user(db: Session, user_model: models.Users):
+    db.add(user_model)
+    db.flush()
+    jobs.enqueue(db, 'welcome_email', {'user_id': user_model.id})
+    db.commit()
+
+
 @router.get("/register", response_class=HTMLResponse)
 async def register(request: Request):
     return templates.TemplateResponse("register.html",{"request": request})
@@ -192,9 +213,9 @@ async def register(request: Request):
 async def register_user(request: Request,email : str = Form(...), username : str = Form(...),
                         firstname: str = Form(...), lastname: str = Form(...), password: str = Form(...),
                         password2: str = Form(...), db: Session = Depends(get_db)):
-    validation1 = db.query(models.Users).filter(models.Users.username == username).first()
+    validation1 = await run_in_threadpool(db.query(models.Users).filter(models.Users.username == username).first)
 
-    validation2 = db.query(models.Users).filter(models.Users.email == email).first()
+    validation2 = await run_in_threadpool(db.query(models.Users).filter(models.Users.email == email).first)
 
     if password != password2 or validation1 is not None or validation2 is not None:
         msg="Solicitação de Registro inválida" 
@@ -205,12 +226,10 @@ async def register_user(request: Request,email : str = Form(...), username : str
     user_model.first_name = firstname
     user_model.last_name = lastname
 
-    hash_password = get_password_hash(password)
-    user_model.hashed_password = hash_password
+    user_model.hashed_password = await get_password_hash(password)
     user_model.is_active = True
 
-    db.add(user_model)
-    db.commit()
+    await run_in_threadpool(_add_user, db, user_model)
 
     msg="Usuario Criado com Sucesso" 
     return templates.TemplateResponse("login.html",{"request":request, "msg": msg})
\ No newline at end of file
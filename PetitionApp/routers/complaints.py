@@ -2,28 +2,26 @@ from typing import Annotated
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, Field
 
-from fastapi import Depends, HTTPException, Path, APIRouter
+from fastapi import Depends, HTTPException, Path, APIRouter, Response
 from models import Complaint
-from database import SessionLocal
+from schemas import ComplaintResponse
+from database import db_dependency
 from starlette import status
 from .auth import get_current_user
+from idempotency import IdempotentRoute
+from pagination import page_dependency, list_response
+import geo
+from reference import complaint_types
+from querystats import query_budget
 
 
 router = APIRouter(
     prefix='/complaints',
-    tags=['Complaints']
+    tags=['Complaints'],
+    route_class=IdempotentRoute
 )
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-        
-        
-db_dependency = Annotated[Session, Depends(get_db)]
 user_dependency = Annotated[dict, Depends(get_current_user)]
 
 
@@ -36,26 +34,34 @@ class ComplaintRequest(BaseModel):
     complaint_type: int
     complaint_text: str
 
-@router.get('/', status_code=status.HTTP_200_OK)
-async def read_all(user: user_dependency, db: db_dependency):
+@router.get('/', status_code=status.HTTP_200_OK, response_model=list[ComplaintResponse])
+@query_budget(3)
+def read_all(user: user_dependency, db: db_dependency, page: page_dependency, response: Response):
     if user is None:
         raise HTTPException(status_code=401, detail='Authentication Failed')
-    return db.query(Complaint).all()
+    rows = list_response(db, Complaint, ComplaintResponse, [], page, response)
+    if page.stream:
+        return rows
+    complaint_types.refresh(db)
+    return [{**row, 'complaint_type_label': complaint_types.label(row['complaint_type'])} for row in rows]
 
 
-@router.get('/{complaint_id}', status_code=status.HTTP_200_OK)
-async def read_complaint_by_id(user: user_dependency, db: db_dependency, complaint_id: int = Path(gt=0)):
+@router.get('/{complaint_id}', status_code=status.HTTP_200_OK, response_model=ComplaintResponse)
+def read_complaint_by_id(user: user_dependency, db: db_dependency, complaint_id: int = Path(gt=0)):
     if user is None:
         raise HTTPException(status_code=401, detail='Authentication Failed')
      
     signature_model = db.query(Complaint).filter(Complaint.id == complaint_id).first()
     if signature_model is not None:
-        return signature_model
+        complaint_types.refresh(db)
+        complaint = ComplaintResponse.model_validate(signature_model)
+        complaint.complaint_type_label = complaint_types.label(complaint.complaint_type)
+        return complaint
     raise HTTPException(status_code=404, detail='Complaint not found')
 
 
-@router.post('/', status_code=status.HTTP_201_CREATED)
-async def create_complaint(user: user_dependency, db: db_dependency, complaint_request: ComplaintRequest):
+@router.post('/', status_code=status.HTTP_201_CREATED, response_model=ComplaintResponse)
+def create_complaint(user: user_dependency, db: db_dependency, complaint_request: ComplaintRequest):
     
     # ----------->  Precisamos de autenticação para registrar uma reclamação/denúncia??
     if user is None:
@@ -65,13 +71,14 @@ async def create_complaint(user: user_dependency, db: db_dependency, complaint_r
     complaint_model = Complaint(**complaint_request.model_dump())
     
     db.add(complaint_model)
+    geo.record_complaint(db, complaint_model.complaint_type, complaint_model.state, complaint_model.city, 1)
     db.commit()
     db.refresh(complaint_model)
     return complaint_model
 
 
 @router.put('/{complaint_id}', status_code=status.HTTP_204_NO_CONTENT)
-async def update_complaint_by_id(user: user_dependency, db: db_dependency, complaint_request: ComplaintRequest, complaint_id: int = Path(gt=0)):
+def update_complaint_by_id(user: user_dependency, db: db_dependency, complaint_request: ComplaintRequest, complaint_id: int = Path(gt=0)):
     if user is None:
         raise HTTPException(status_code=401, detail='Authentication Failed')
     
@@ -79,6 +86,7 @@ async def update_complaint_by_id(user: user_dependency, db: db_dependency, compl
     if complaint_model is None:
         raise HTTPException(status_code=404, detail='Complaint not found')
     
+    geo.record_complaint(db, complaint_model.complaint_type, complaint_model.state, complaint_model.city, -1)
     complaint_model.name = complaint_request.name # type: ignore
     complaint_model.email = complaint_request.email # type: ignore
     complaint_model.phone = complaint_request.phone # type: ignore
@@ -87,12 +95,14 @@ async def update_complaint_by_id(user: user_dependency, db: db_dependency, compl
     complaint_model.complaint_type = complaint_request.complaint_type
     complaint_model.complaint_text = complaint_request.complaint_text
 
+    geo.record_complaint(db, complaint_model.complaint_type, complaint_model.state, complaint_model.city, 1)
     db.add(complaint_model)
     db.commit() 
 
 
 @router.delete('/{complaint_id}', status_code=status.HTTP_204_NO_CONTENT)
-async def delete_complaint_by_id(user: user_dependency, db: db_dependency, complaint_id: int = Path(gt=0)):
+@query_budget(3)
+def delete_complaint_by_id(user: user_dependency, db: db_dependency, complaint_id: int = Path(gt=0)):
     if user is None:
         raise HTTPException(status_code=401, detail='Authentication Failed')
     
@@ -100,4 +110,5 @@ async def delete_complaint_by_id(user: user_dependency, db: db_dependency, compl
     if complaint_model is None:
         raise HTTPException(status_code=404, detail='Complaint not found')
     db.query(Complaint).filter(Complaint.id == complaint_id).delete()
+    geo.record_complaint(db, complaint_model.complaint_type, complaint_model.state, complaint_model.city, -1)
     db.commit()
@@ -1,71 +1,73 @@
 from typing import Annotated
-from sqlalchemy.orm import Session
+from sqlalchemy import select, delete
 from pydantic import BaseModel, Field
 
-from fastapi import Depends, HTTPException, Path, APIRouter
+from fastapi import Depends, HTTPException, Path, APIRouter, Response
 from models import Complaint_Type
-from database import SessionLocal
+from schemas import ComplaintTypeResponse
+from database import async_db_dependency
 from starlette import status
 from .auth import get_current_user
+from idempotency import IdempotentRoute
+from pagination import page_dependency, list_response_async, memory_page
+from reference import complaint_types
 
 
 router = APIRouter(
     prefix='/complaint_types',
-    tags=['Complaint Types']
+    tags=['Complaint Types'],
+    route_class=IdempotentRoute
 )
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-        
-        
-db_dependency = Annotated[Session, Depends(get_db)]
 user_dependency = Annotated[dict, Depends(get_current_user)]
           
 class ComplaintRequest(BaseModel):
     complaint_type: int
     dictionary: str
 
-@router.get('/', status_code=status.HTTP_200_OK)
-async def read_all_complaint_types(user: user_dependency, db: db_dependency):
+@router.get('/', status_code=status.HTTP_200_OK, response_model=list[ComplaintTypeResponse])
+async def read_all_complaint_types(user: user_dependency, db: async_db_dependency, page: page_dependency, response: Response):
     if user is None:
         raise HTTPException(status_code=401, detail='Authentication Failed')
-    return db.query(Complaint_Type).all()
+    if page.stream:
+        return await list_response_async(db, Complaint_Type, ComplaintTypeResponse, [], page, response)
+    await complaint_types.refresh_async(db)
+    return memory_page(complaint_types.rows(), page, response)
 
 
-@router.get('/{complaint_type_id}', status_code=status.HTTP_200_OK)
-async def read_complaint_type_by_id(user: user_dependency, db: db_dependency, complaint_type_id: int = Path(gt=0)):
+@router.get('/{complaint_type_id}', status_code=status.HTTP_200_OK, response_model=ComplaintTypeResponse)
+async def read_complaint_type_by_id(user: user_dependency, db: async_db_dependency, complaint_type_id: int = Path(gt=0)):
     if user is None:
         raise HTTPException(status_code=401, detail='Authentication Failed')
      
-    complaint_model = db.query(Complaint_Type).filter(Complaint_Type.id == complaint_type_id).first()
+    await complaint_types.refresh_async(db)
+    complaint_model = complaint_types.get(complaint_type_id)
     if complaint_model is not None:
         return complaint_model
     raise HTTPException(status_code=404, detail='Complaint type not found')
 
 
-@router.post('/', status_code=status.HTTP_201_CREATED)
-async def create_complaint_type(db: db_dependency, user: user_dependency, complaint_request: ComplaintRequest):
+@router.post('/', status_code=status.HTTP_201_CREATED, response_model=ComplaintTypeResponse)
+async def create_complaint_type(db: async_db_dependency, user: user_dependency, complaint_request: ComplaintRequest):
     if user is None:
         raise HTTPException(status_code=401, detail='Authentication Failed')
     complaint_model = Complaint_Type(**complaint_request.model_dump()) 
     
     db.add(complaint_model)
-    db.commit()
-    db.refresh(complaint_model)
+    await complaint_types.bump(db)
+    await db.commit()
+    complaint_types.invalidate()
+    await db.refresh(complaint_model)
     return complaint_model
 
 
 @router.put('/{complaint_type_id}', status_code=status.HTTP_204_NO_CONTENT)
-async def update_complaint_type_by_id(user: user_dependency, db: db_dependency, complaint_request: ComplaintRequest, complaint_type_id: int = Path(gt=0)):
+async def update_complaint_type_by_id(user: user_dependency, db: async_db_dependency, complaint_request: ComplaintRequest, complaint_type_id: int = Path(gt=0)):
     if user is None:
         raise HTTPException(status_code=401, detail='Authentication Failed')
     
-    complaint_model = db.query(Complaint_Type).filter(Complaint_Type.id == complaint_type_id).first()
+    complaint_model = await db.scalar(select(Complaint_Type).where(Complaint_Type.id == complaint_type_id))
     if complaint_model is None:
         raise HTTPException(status_code=404, detail='Signature not found')
     
@@ -73,17 +75,21 @@ async def update_complaint_type_by_id(user: user_dependency, db: db_dependency,
     complaint_model.dictionary = complaint_request.dictionary # type: ignore
 
     db.add(complaint_model)
-    db.commit() 
+    await complaint_types.bump(db)
+    await db.commit()
+    complaint_types.invalidate()
 
 
 @router.delete('/{complaint_type_id}', status_code=status.HTTP_204_NO_CONTENT)
-async def delete_complaint_type_by_id(user: user_dependency, db: db_dependency, complaint_type_id: int = Path(gt=0)):
+async def delete_complaint_type_by_id(user: user_dependency, db: async_db_dependency, complaint_type_id: int = Path(gt=0)):
     if user is None:
         raise HTTPException(status_code=401, detail='Authentication Failed')
     
-    signature_model = db.query(Complaint_Type).filter(Complaint_Type.id == complaint_type_id).first()
+    signature_model = await db.scalar(select(Complaint_Type).where(Complaint_Type.id == complaint_type_id))
     if signature_model is None:
         raise HTTPException(status_code=404, detail='Signature not found')
-    db.query(Complaint_Type).filter(Complaint_Type.id == complaint_type_id).delete()
-    db.commit()
+    await db.execute(delete(Complaint_Type).where(Complaint_Type.id == complaint_type_id))
+    await complaint_types.bump(db)
+    await db.commit()
+    complaint_types.invalidate()
 
@@ -0,0 +1,22 @@
+import os
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+from starlette import status
+
+import metrics
+
+
+# when set, scrapers must send it as a bearer token
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+router = APIRouter(
+    tags=['Metrics']
+)
+
+
+@router.get('/metrics', status_code=status.HTTP_200_OK, response_class=PlainTextResponse, include_in_schema=False)
+async def read_metrics(request: Request):
+    if METRICS_TOKEN and request.headers.get('authorization') != f'Bearer {METRICS_TOKEN}':
+        raise HTTPException(status_code=401, detail='Authentication Failed')
+    return PlainTextResponse(metrics.render(), media_type='text/plain; version=0.0.4')
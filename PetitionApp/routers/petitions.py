@@ -3,15 +3,27 @@
 from typing import Optional
 from typing import Annotated
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
 from pydantic import BaseModel, Field
 from fastapi import FastAPI
 import models
 
-from fastapi import Depends, HTTPException, Path, APIRouter, Request
+from fastapi import Depends, HTTPException, Path, APIRouter, Request, Response, Query
 from models import Petition
-from database import engine, SessionLocal
+from schemas import PetitionResponse, response_columns
+from database import engine, get_db, db_dependency, SessionLocal
 from starlette import status
 from .auth import get_current_user
+from idempotency import IdempotentRoute
+import counters
+import live
+from response_cache import response_cache, etag, not_modified, not_modified_response, serialize, json_response, invalidate_petition
+from blobstore import blob_store, store_image
+import thumbnails
+import jobs
+from starlette.concurrency import run_in_threadpool
+from pagination import page_dependency, list_response
+from querystats import query_budget
 
 from fastapi.responses import RedirectResponse, JSONResponse, PlainTextResponse, FileResponse, StreamingResponse 
 from fastapi import status
@@ -23,33 +35,36 @@ from fastapi.templating import Jinja2Templates
 router = APIRouter(
     prefix='/petitions',
     tags=['Petitions'],
-    responses={404: {"description": "Not found"}}
+    responses={404: {"description": "Not found"}},
+    route_class=IdempotentRoute
 )
 
-models.Base.metadata.create_all(bind=engine)
 
 templates = Jinja2Templates(directory="templates")
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-        
-        
-db_dependency = Annotated[Session, Depends(get_db)]
 user_dependency = Annotated[dict, Depends(get_current_user)]
 
 
-@router.get("/",response_class=HTMLResponse)
+@router.get('/', status_code=status.HTTP_200_OK, response_model=list[PetitionResponse])
+def read_all(user: user_dependency, db: db_dependency, page: page_dependency, response: Response):
+    if user is None:
+        raise HTTPException(status_code=401, detail='Authentication Failed')
+    return list_response(db, Petition, PetitionResponse, [Petition.user_id == user.get('id')], page, response)
+
+
+# the page version of the list above, signed in through the login cookie
+@router.get("/list",response_class=HTMLResponse)
 async def read_all_by_user(request : Request, db: Session = Depends(get_db)):
-    user = await get_current_user(request)
+    token = request.cookies.get("access_token")
+    try:
+        user = await get_current_user(request, token) if token else None
+    except HTTPException:
+        user = None
     if user is None:
         return RedirectResponse(url="/auth", status_code=status.HTTP_302_FOUND)#adicionar para todas as paginas para quando nao tiver os cookie de login ele sera redirecionado para pagina de login
 
-    petition=db.query(models.Petition).filter(models.Petition.owner_id == user.get("id")).all()
+    petition = await run_in_threadpool(db.query(models.Petition).filter(models.Petition.user_id == user.get("id")).all)
     return templates.TemplateResponse("home.html",{"request":request,"user":user,"petition":petition})
 
 #add router get /
@@ -65,43 +80,111 @@ class PetitionRequest(BaseModel):
     images: str 
           
 
-@router.get('/', status_code=status.HTTP_200_OK)
-async def read_all(user: user_dependency, db: db_dependency):
+def _store_image(images):
+    try:
+        return store_image(images)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+# images are content addressed, a digest never changes content so clients and proxies may keep it forever.
+# A plain def: the blob store and variant lookups are file I/O, run in the threadpool
+@router.get('/images/{digest}', status_code=status.HTTP_200_OK)
+def read_image(request: Request, digest: str, w: Optional[int] = Query(None, gt=0)):
+    if not blob_store.exists(digest):
+        raise HTTPException(status_code=404, detail='Image not found')
+    # ?w= picks the closest resized variant, WebP when the client accepts it
+    variant = thumbnails.select_variant(digest, w, 'image/webp' in request.headers.get('accept', '')) if w else None
+    if w and variant is None:
+        # no variant yet (job pending or the image didn't decode): send the
+        # client to the original, and don't let anyone cache the redirect
+        return RedirectResponse(str(request.url.remove_query_params('w')), status_code=status.HTTP_302_FOUND,
+                                headers={'Cache-Control': 'no-store'})
+    headers = {'Cache-Control': 'public, max-age=31536000, immutable'}
+    if variant is not None:
+        path, media_type, width = variant
+        headers['ETag'] = f'"{digest}-{width}-{media_type[6:]}"'
+        headers['Vary'] = 'Accept'
+    else:
+        headers['ETag'] = f'"{digest}"'
+    if headers['ETag'] in request.headers.get('if-none-match', ''):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    if variant is not None:
+        return FileResponse(path, media_type=media_type, headers=headers)
+    headers['Content-Length'] = str(blob_store.size(digest))
+    return StreamingResponse(blob_store.iter(digest), media_type=blob_store.content_type(digest), headers=headers)
+
+
+@router.get('/{petition_id}', status_code=status.HTTP_200_OK, response_model=PetitionResponse)
+@query_budget(2)
+def read_petition_by_id(user: user_dependency, db: db_dependency, request: Request, petition_id: int = Path(gt=0)):
     if user is None:
         raise HTTPException(status_code=401, detail='Authentication Failed')
-    return db.query(Petition).filter(Petition.user_id == user.get('id')).all()
+     
+    # only the version is read until we know the client's copy is stale
+    version = db.query(Petition.version).filter(Petition.id == petition_id).filter(Petition.user_id == user.get('id')).scalar()
+    if version is None:
+        raise HTTPException(status_code=404, detail='Petition not found')
+    tag = etag('petition', petition_id, version)
+    if not_modified(request, tag):
+        response_cache.stats['not_modified'] += 1
+        return not_modified_response(tag)
+
+    body = response_cache.get(('petition', petition_id, version))
+    if body is None:
+        row = db.query(*response_columns(Petition, PetitionResponse)).filter(Petition.id == petition_id).first()
+        if row is None:
+            raise HTTPException(status_code=404, detail='Petition not found')
+        # the row may have moved on since the version was read
+        version = row.version
+        tag = etag('petition', petition_id, version)
+        # sent as is, so it goes through the response model here
+        body = serialize(PetitionResponse.model_validate(row).model_dump())
+        response_cache.put(('petition', petition_id, version), body)
+    return json_response(body, tag)
+
+
+# public, like the signature count: server-sent events with the running
+# total and validated counts of a petition
+@router.get('/{petition_id}/live', status_code=status.HTTP_200_OK)
+async def live_petition_counts(db: db_dependency, petition_id: int = Path(gt=0)):
+    if await run_in_threadpool(db.query(Petition.id).filter(Petition.id == petition_id).first) is None:
+        raise HTTPException(status_code=404, detail='Petition not found')
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    return StreamingResponse(live.count_events(petition_id, _read_counts), media_type='text/event-stream', headers=headers)
 
 
-@router.get('/{petition_id}', status_code=status.HTTP_200_OK)
-async def read_petition_by_id(user: user_dependency, db: db_dependency, petition_id: int = Path(gt=0)):
-    if user is None:
-        raise HTTPException(status_code=401, detail='Authentication Failed')
-     
-    petition_model = db.query(Petition).filter(Petition.id == petition_id).filter(Petition.user_id == user.get('id')).first()
-    if petition_model is not None:
-        return petition_model
-    raise HTTPException(status_code=404, detail='Petition not found')
+# the request session is closed by the time the stream starts, so the
+# snapshot gets its own
+def _read_counts(petition_id: int) -> dict:
+    db = SessionLocal()
+    try:
+        return counters.get_counts(db, petition_id)
+    finally:
+        db.close()
 
 
-@router.post('/', status_code=status.HTTP_201_CREATED)
-async def create_petition(user: user_dependency, db: db_dependency, petition_request: PetitionRequest):
+@router.post('/', status_code=status.HTTP_201_CREATED, response_model=PetitionResponse)
+def create_petition(user: user_dependency, db: db_dependency, petition_request: PetitionRequest):
     if user is None:
         raise HTTPException(status_code=401, detail='Authentication Failed')
     petition_model = Petition(
         petition_name=petition_request.petition_name,
         petition_text=petition_request.petition_text,
-        images=petition_request.images,
+        image_ref=_store_image(petition_request.images),
         user_id=user.get('id')
     )
     
     db.add(petition_model)
+    if petition_model.image_ref:
+        jobs.enqueue(db, 'thumbnails', {'digest': petition_model.image_ref})
     db.commit()
     db.refresh(petition_model)
     return petition_model
 
 
 @router.put('/{petition_id}', status_code=status.HTTP_204_NO_CONTENT)
-async def update_petition_by_id(user: user_dependency, db: db_dependency, petition_request: PetitionRequest, petition_id: int = Path(gt=0)):
+def update_petition_by_id(user: user_dependency, db: db_dependency, petition_request: PetitionRequest, petition_id: int = Path(gt=0)):
     if user is None:
         raise HTTPException(status_code=401, detail='Authentication Failed')
     
@@ -111,15 +194,25 @@ async def update_petition_by_id(user: user_dependency, db: db_dependency, petiti
     
     petition_model.petition_name = petition_request.petition_name # type: ignore
     petition_model.petition_text = petition_request.petition_text # type: ignore
-    petition_model.images = petition_request.images # type: ignore
+    petition_model.images = None # type: ignore
+    petition_model.image_ref = _store_image(petition_request.images) # type: ignore
 
 
     db.add(petition_model)
-    db.commit() 
+    if petition_model.image_ref:
+        jobs.enqueue(db, 'thumbnails', {'digest': petition_model.image_ref})
+    # the version column didn't match: someone else updated it since we read it
+    try:
+        db.commit()
+    except StaleDataError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail='Petition was changed by another request, reload it and try again')
+    invalidate_petition(petition_id)
 
 
 @router.delete('/{petition_id}', status_code=status.HTTP_204_NO_CONTENT)
-async def delete_petition_by_id(user: user_dependency, db: db_dependency, petition_id: int = Path(gt=0)):
+@query_budget(3)
+def delete_petition_by_id(user: user_dependency, db: db_dependency, petition_id: int = Path(gt=0)):
     if user is None:
         raise HTTPException(status_code=401, detail='Authentication Failed')
     
@@ -127,8 +220,10 @@ async def delete_petition_by_id(user: user_dependency, db: db_dependency, petiti
     if petition_model is None:
         raise HTTPException(status_code=404, detail='Petition not found')
     db.query(Petition).filter(Petition.id == petition_id).filter(Petition.user_id == user.get('id')).delete()
+    counters.drop(db, petition_id)
 
     db.commit()
+    invalidate_petition(petition_id)
 
 
     
\ No newline at end of file
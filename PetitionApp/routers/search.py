@@ -0,0 +1,35 @@
+from typing import Annotated, Literal, Optional
+
+from fastapi import Depends, HTTPException, Query, APIRouter, Response
+from database import db_dependency
+from starlette import status
+from .auth import get_current_user
+import fulltext
+
+
+router = APIRouter(
+    prefix='/search',
+    tags=['Search']
+)
+
+
+user_dependency = Annotated[dict, Depends(get_current_user)]
+
+
+# ranked full-text search; when the page is full, the cursor for the next
+# one comes back in the X-Next-Cursor header
+@router.get('/', status_code=status.HTTP_200_OK)
+def search(user: user_dependency, db: db_dependency, response: Response,
+           q: str = Query(min_length=1, max_length=200),
+           type: Literal['petition', 'complaint'] = 'petition',
+           limit: int = Query(20, gt=0, le=100), cursor: Optional[str] = None):
+    if user is None:
+        raise HTTPException(status_code=401, detail='Authentication Failed')
+    try:
+        after = fulltext.decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    hits = fulltext.search(db, type, q, limit, after)
+    if len(hits) == limit:
+        response.headers['X-Next-Cursor'] = fulltext.encode_cursor(hits[-1]['rank'], hits[-1]['id'])
+    return hits
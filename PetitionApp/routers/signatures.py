@@ -1,29 +1,35 @@
-from typing import Annotated
+from typing import Annotated, Optional
 from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
 from pydantic import BaseModel, Field
 
-from fastapi import Depends, HTTPException, Path, APIRouter
-from models import Signature
-from database import SessionLocal
+from fastapi import Depends, HTTPException, Path, APIRouter, Response, UploadFile
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from anyio import from_thread
+from models import Petition, Signature, SignatureImport
+from schemas import SignatureResponse
+from database import db_dependency
 from starlette import status
 from .auth import get_current_user
+from idempotency import IdempotentRoute
+import ingest
+import counters
+import dedup
+import live
+import bulk
+import validation
+import jobs
+from pagination import page_dependency, list_response
 
 
 router = APIRouter(
     prefix='/signatures',
-    tags=['Signatures']
+    tags=['Signatures'],
+    route_class=IdempotentRoute
 )
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-        
-        
-db_dependency = Annotated[Session, Depends(get_db)]
 user_dependency = Annotated[dict, Depends(get_current_user)]
 
 
@@ -38,15 +44,34 @@ class SignatureRequest(BaseModel):
     can_be_contacted: bool
           
 
-@router.get('/', status_code=status.HTTP_200_OK)
-async def read_all(user: user_dependency, db: db_dependency):
+@router.get('/', status_code=status.HTTP_200_OK, response_model=list[SignatureResponse])
+def read_all(user: user_dependency, db: db_dependency, page: page_dependency, response: Response):
     if user is None:
         raise HTTPException(status_code=401, detail='Authentication Failed')
-    return db.query(Signature).filter(Signature.user_id == user.get('id')).all()
+    return list_response(db, Signature, SignatureResponse, [Signature.user_id == user.get('id')], page, response)
+
+
+async def _validate(signature_id: int) -> bool:
+    if validation.validation_writer.running:
+        return await validation.validation_writer.submit(signature_id)
+    return (await run_in_threadpool(validation.apply_validations, [signature_id]))[0]
+
+
+# the link mailed to signers, checked from the token alone and applied with
+# the next batch of validations
+@router.put('/validate', status_code=status.HTTP_200_OK)
+@router.get('/validate', status_code=status.HTTP_200_OK)
+async def validate_signature(token: str):
+    signature_id = validation.read_token(token)
+    if signature_id is None:
+        raise HTTPException(status_code=400, detail='Invalid or expired validation token')
+    if not await _validate(signature_id):
+        raise HTTPException(status_code=404, detail='Signature not found')
+    return True
 
 
-@router.get('/{signature_id}', status_code=status.HTTP_200_OK)
-async def read_signature_by_id(user: user_dependency, db: db_dependency, signature_id: int = Path(gt=0)):
+@router.get('/{signature_id}', status_code=status.HTTP_200_OK, response_model=SignatureResponse)
+def read_signature_by_id(user: user_dependency, db: db_dependency, signature_id: int = Path(gt=0)):
     if user is None:
         raise HTTPException(status_code=401, detail='Authentication Failed')
      
@@ -56,21 +81,118 @@ async def read_signature_by_id(user: user_dependency, db: db_dependency, signatu
     raise HTTPException(status_code=404, detail='Signature not found')
 
 
-@router.post('/', status_code=status.HTTP_201_CREATED)
+@router.post('/', status_code=status.HTTP_201_CREATED, response_model=SignatureResponse)
 async def create_signature(db: db_dependency, signature_request: SignatureRequest): #, user: user_dependency):
     # É necessário estar autenticado para ASSINAR ALGO? <----------------------------------------------------------------
     # if user is None:
     #     raise HTTPException(status_code=401, detail='Authentication Failed')
+    already_signed = HTTPException(status_code=409, detail='Petition already signed with this email')
+    if await run_in_threadpool(dedup.deduper.is_duplicate, db, signature_request.petition_id, signature_request.email):
+        raise already_signed
+
+    if ingest.signature_writer.running:
+        # buffered path: the row is written with the next batch, we still hand back its id
+        signature = {**signature_request.model_dump(), 'validated_signature': False}
+        try:
+            signature['id'] = await ingest.signature_writer.submit(signature)
+        except dedup.DuplicateSignature:
+            dedup.deduper.stats['blocked_by_index'] += 1
+            raise already_signed
+        dedup.deduper.add(signature_request.petition_id, signature_request.email)
+        live.publish_counts(signature_request.petition_id, total=1)
+        return signature
+
+    signature_model = await run_in_threadpool(_insert_signature, db, signature_request)
+    if signature_model is None:
+        dedup.deduper.stats['blocked_by_index'] += 1
+        raise already_signed
+    dedup.deduper.add(signature_request.petition_id, signature_request.email)
+    live.publish_counts(signature_request.petition_id, total=1)
+    return signature_model
+
+
+# the unbuffered insert, in the threadpool. None when the unique index says
+# this email already signed
+def _insert_signature(db: Session, signature_request: SignatureRequest):
     signature_model = Signature(**signature_request.model_dump(), validated_signature = False) #,user_id=user.get('id')) 
     
     db.add(signature_model)
-    db.commit()
+    counters.increment(db, signature_model.petition_id, total=1)
+    try:
+        db.flush()
+        jobs.enqueue(db, 'validation_email', {'signature_id': signature_model.id})
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        if not dedup.is_duplicate_error(e):
+            raise
+        return None
     db.refresh(signature_model)
     return signature_model
 
 
+# petition owners and admins only, a 404 for everyone else
+def _own_petition(db: Session, user: dict, petition_id: int):
+    owner = db.query(Petition.user_id).filter(Petition.id == petition_id).scalar()
+    if owner is None or (owner != user.get('id') and user.get('user_role') != 'Admin'):
+        raise HTTPException(status_code=404, detail='Petition not found')
+
+
+def _own_import(db: Session, user: dict, import_id: int):
+    owner = db.query(SignatureImport.user_id).filter(SignatureImport.id == import_id).scalar()
+    if owner is None or (owner != user.get('id') and user.get('user_role') != 'Admin'):
+        raise HTTPException(status_code=404, detail='Import not found')
+
+
+# CSV with a header row of name,email,phone,city,state,show_signature,
+# can_be_contacted. Uploading the same file again resumes an interrupted import
+@router.post('/import/{petition_id}', status_code=status.HTTP_200_OK)
+async def import_signatures(user: user_dependency, db: db_dependency, file: UploadFile, petition_id: int = Path(gt=0)):
+    if user is None:
+        raise HTTPException(status_code=401, detail='Authentication Failed')
+    await run_in_threadpool(_own_petition, db, user, petition_id)
+    try:
+        import_id = await run_in_threadpool(bulk.import_csv, file.file, petition_id, user.get('id'), SignatureRequest)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except bulk.ImportConflict:
+        raise HTTPException(status_code=409, detail='This file is already being imported')
+    return await run_in_threadpool(bulk.import_summary, db, import_id)
+
+
+@router.get('/import/{import_id}', status_code=status.HTTP_200_OK)
+def read_import(user: user_dependency, db: db_dependency, import_id: int = Path(gt=0)):
+    if user is None:
+        raise HTTPException(status_code=401, detail='Authentication Failed')
+    _own_import(db, user, import_id)
+    return bulk.import_summary(db, import_id)
+
+
+@router.get('/import/{import_id}/errors', status_code=status.HTTP_200_OK)
+def read_import_errors(user: user_dependency, db: db_dependency, import_id: int = Path(gt=0)):
+    if user is None:
+        raise HTTPException(status_code=401, detail='Authentication Failed')
+    _own_import(db, user, import_id)
+    headers = {'Content-Disposition': f'attachment; filename="import-{import_id}-errors.csv"'}
+    return StreamingResponse(bulk.export_errors(import_id), media_type='text/csv', headers=headers)
+
+
+@router.get('/export/{petition_id}', status_code=status.HTTP_200_OK)
+def export_signatures(user: user_dependency, db: db_dependency, petition_id: int = Path(gt=0)):
+    if user is None:
+        raise HTTPException(status_code=401, detail='Authentication Failed')
+    _own_petition(db, user, petition_id)
+    headers = {'Content-Disposition': f'attachment; filename="petition-{petition_id}-signatures.csv"'}
+    return StreamingResponse(bulk.export_signatures(petition_id), media_type='text/csv', headers=headers)
+
+
+@router.get('/count/{petition_id}', status_code=status.HTTP_200_OK)
+def read_signature_count(db: db_dependency, petition_id: int = Path(gt=0)):
+    return counters.get_counts(db, petition_id)
+
+
 @router.put('/{signature_id}', status_code=status.HTTP_204_NO_CONTENT)
-async def update_signature_by_id(user: user_dependency, db: db_dependency, signature_id: int = Path(gt=0)):
+def update_signature_by_id(user: user_dependency, db: db_dependency, signature_id: int = Path(gt=0)):
     if user is None:
         raise HTTPException(status_code=401, detail='Authentication Failed')
     
@@ -88,7 +210,7 @@ async def update_signature_by_id(user: user_dependency, db: db_dependency, signa
 
 
 @router.delete('/{signature_id}', status_code=status.HTTP_204_NO_CONTENT)
-async def delete_signature_by_id(user: user_dependency, db: db_dependency, signature_id: int = Path(gt=0)):
+def delete_signature_by_id(user: user_dependency, db: db_dependency, signature_id: int = Path(gt=0)):
     if user is None:
         raise HTTPException(status_code=401, detail='Authentication Failed')
     
@@ -96,17 +218,20 @@ async def delete_signature_by_id(user: user_dependency, db: db_dependency, signa
     if signature_model is None:
         raise HTTPException(status_code=404, detail='Signature not found')
     db.query(Signature).filter(Signature.id == signature_id).filter(Signature.user_id == user.get('id')).delete()
+    validated = -1 if signature_model.validated_signature else 0
+    counters.increment(db, signature_model.petition_id, total=-1, validated=validated)
     db.commit()
+    from_thread.run_sync(live.publish_counts, signature_model.petition_id, -1, validated)
 
+# older link format. Needs the signed token for that signature, except for
+# links mailed before tokens existed, accepted until VALIDATION_LEGACY_LINKS_UNTIL
 @router.put('/validate/{signature_id}', status_code=status.HTTP_200_OK)
 @router.get('/validate/{signature_id}', status_code=status.HTTP_200_OK) # Added a get method for naked calls
-async def update_signature_by_id(db: db_dependency, signature_id: int = Path(gt=0)):
-
-    signature_model = db.query(Signature).filter(Signature.id == signature_id).first()
-    if signature_model is None:
+async def update_signature_by_id(signature_id: int = Path(gt=0), token: Optional[str] = None):
+    if token is None and not validation.legacy_links_open():
+        raise HTTPException(status_code=400, detail='Invalid or expired validation token')
+    if token is not None and validation.read_token(token) != signature_id:
+        raise HTTPException(status_code=400, detail='Invalid or expired validation token')
+    if not await _validate(signature_id):
         raise HTTPException(status_code=404, detail='Signature not found')
-    
-    signature_model.validated_signature = True
-    db.add(signature_model)
-    db.commit() 
-    return signature_model.validated_signature
+    return True
@@ -0,0 +1,49 @@
+from datetime import datetime
+from typing import Annotated, Literal, Optional
+
+from fastapi import Depends, HTTPException, Path, Query, APIRouter
+from database import db_dependency
+from starlette import status
+from .auth import get_current_user
+import rollups
+import geo
+
+
+router = APIRouter(
+    prefix='/stats',
+    tags=['Stats']
+)
+
+
+user_dependency = Annotated[dict, Depends(get_current_user)]
+
+
+# served from the rollup tables, cost depends on the number of buckets, not of signatures
+@router.get('/petitions/{petition_id}/timeseries', status_code=status.HTTP_200_OK,
+            description='New signatures show up within ROLLUP_INTERVAL_SECONDS plus WATERMARK_SETTLE_SECONDS. '
+                        'Deleted signatures, and ones whose transaction outlived the settle window, '
+                        'are corrected by the full reconcile every ROLLUP_RECONCILE_SECONDS.')
+def read_petition_timeseries(user: user_dependency, db: db_dependency, petition_id: int = Path(gt=0),
+                             period: Literal['hour', 'day'] = 'day',
+                             since: Optional[datetime] = None, until: Optional[datetime] = None):
+    if user is None:
+        raise HTTPException(status_code=401, detail='Authentication Failed')
+    return rollups.timeseries(db, petition_id, period, since, until)
+
+
+# exactly one of petition_id / complaint_type, answered from the geo rollup.
+# `top` caps the states and the cities returned, largest first
+@router.get('/geo', status_code=status.HTTP_200_OK,
+            description='Complaint counts are exact. Signature counts lag like the timeseries: deleted signatures, '
+                        'and ones whose transaction outlived the settle window, are corrected by the full '
+                        'reconcile every ROLLUP_RECONCILE_SECONDS.')
+def read_geo(user: user_dependency, db: db_dependency,
+             petition_id: Optional[int] = Query(None, gt=0), complaint_type: Optional[int] = None,
+             top: int = Query(geo.GEO_TOP, gt=0, le=500)):
+    if user is None:
+        raise HTTPException(status_code=401, detail='Authentication Failed')
+    if (petition_id is None) == (complaint_type is None):
+        raise HTTPException(status_code=422, detail='Pass either petition_id or complaint_type')
+    if petition_id is not None:
+        return geo.counts(db, 'signature', petition_id, top)
+    return geo.counts(db, 'complaint', complaint_type, top)
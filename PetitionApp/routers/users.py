@@ -1,13 +1,14 @@
 from typing import Annotated
-from sqlalchemy.orm import Session
+from sqlalchemy import select
 from pydantic import BaseModel, Field
 
 from fastapi import Depends, HTTPException, APIRouter
 from models import Users
-from database import SessionLocal
+from schemas import UserResponse
+from database import async_db_dependency
 from starlette import status
 from .auth import get_current_user
-from passlib.context import CryptContext
+from hashing import hash_password, verify_password
 
 router = APIRouter(
     prefix='/users',
@@ -15,42 +16,32 @@ router = APIRouter(
 )
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-        
-        
-db_dependency = Annotated[Session, Depends(get_db)]
 user_dependency = Annotated[dict, Depends(get_current_user)]
-bcrypt_context = CryptContext(schemes=['bcrypt'], deprecated='auto') # hash password
 
 class UserRequest(BaseModel):
    password: str
    new_password: str = Field(min_length=6)
 
-@router.get("/", status_code=status.HTTP_200_OK)
-async def get_users(user: user_dependency, db: db_dependency):
+@router.get("/", status_code=status.HTTP_200_OK, response_model=UserResponse)
+async def get_users(user: user_dependency, db: async_db_dependency):
     if user is None:
         raise HTTPException(status_code=401, detail='Authentication Failed')
     
-    users = db.query(Users).filter(Users.id == user.get('id')).first()
+    users = await db.scalar(select(Users).where(Users.id == user.get('id')))
     return users  
 
 
 @router.put('/psswrd-change', status_code=status.HTTP_204_NO_CONTENT)
-async def change_password(user: user_dependency, db: db_dependency, user_request: UserRequest):
+async def change_password(user: user_dependency, db: async_db_dependency, user_request: UserRequest):
     if user is None:
         raise HTTPException(status_code=401, detail='Authentication Failed')
 
-    user_model = db.query(Users).filter(Users.id == user.get('id')).first()
+    user_model = await db.scalar(select(Users).where(Users.id == user.get('id')))
     
-    if not bcrypt_context.verify(user_request.password, user_model.hashed_password): # type: ignore
+    if not await verify_password(user_request.password, user_model.hashed_password): # type: ignore
          raise HTTPException(status_code=401, detail='Error while changing the password')
-    user_model.hashed_password = bcrypt_context.hash(user_request.new_password) # type: ignore
+    user_model.hashed_password = await hash_password(user_request.new_password) # type: ignore
 
     db.add(user_model)
-    db.commit() 
+    await db.commit() 
          
\ No newline at end of file
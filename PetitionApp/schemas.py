@@ -0,0 +1,68 @@
+from datetime import datetime
+from typing import Optional
+
+from pydantic import BaseModel, ConfigDict
+
+
+# response models, validated straight from ORM instances or column-only rows.
+# hashed_password is deliberately not part of UserResponse
+class ORMModel(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+
+# the table columns a response model exposes, for handlers that serialize
+# rows themselves: they read and send nothing the model would have dropped
+def response_columns(model, schema) -> list:
+    return [model.__table__.c[name] for name in schema.model_fields if name in model.__table__.c]
+
+
+class UserResponse(ORMModel):
+    id: int
+    username: Optional[str] = None
+    email: Optional[str] = None
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    is_activate: Optional[bool] = None
+    role: Optional[str] = None
+
+
+class PetitionResponse(ORMModel):
+    id: int
+    user_id: Optional[int] = None
+    petition_name: Optional[str] = None
+    petition_text: Optional[str] = None
+    image_ref: Optional[str] = None # the legacy inline images column is never sent
+    version: int = 1
+
+
+class SignatureResponse(ORMModel):
+    id: int
+    petition_id: Optional[int] = None
+    name: Optional[str] = None
+    email: Optional[str] = None
+    phone: Optional[str] = None
+    city: Optional[str] = None
+    state: Optional[str] = None
+    show_signature: Optional[bool] = None
+    user_id: Optional[int] = None
+    validated_signature: Optional[bool] = None
+    can_be_contacted: Optional[bool] = None
+    created_at: Optional[datetime] = None
+
+
+class ComplaintResponse(ORMModel):
+    id: int
+    name: Optional[str] = None
+    email: Optional[str] = None
+    phone: Optional[str] = None
+    city: Optional[str] = None
+    state: Optional[str] = None
+    complaint_type: Optional[int] = None
+    complaint_type_label: Optional[str] = None
+    complaint_text: Optional[str] = None
+
+
+class ComplaintTypeResponse(ORMModel):
+    id: int
+    complaint_type: Optional[int] = None
+    dictionary: Optional[str] = None
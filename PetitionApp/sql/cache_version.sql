@@ -0,0 +1,4 @@
+CREATE TABLE cache_version (
+    name VARCHAR(50) PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
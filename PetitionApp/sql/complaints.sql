@@ -9,4 +9,4 @@ CREATE TABLE complaints (
     complaint_text TEXT
 );
 
-
+CREATE INDEX ix_complaints_complaint_type_id ON complaints (complaint_type, id);
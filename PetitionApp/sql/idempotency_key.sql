@@ -0,0 +1,10 @@
+CREATE TABLE idempotency_key (
+    key VARCHAR(64) PRIMARY KEY,
+    fingerprint VARCHAR(64) NOT NULL,
+    status_code INTEGER,
+    headers TEXT,
+    body BYTEA,
+    expires_at TIMESTAMPTZ NOT NULL
+);
+
+CREATE INDEX ix_idempotency_key_expires_at ON idempotency_key (expires_at);
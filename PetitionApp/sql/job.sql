@@ -0,0 +1,17 @@
+CREATE TABLE job (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(50) NOT NULL,
+    payload TEXT NOT NULL,
+    status VARCHAR(10) NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 5,
+    run_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    locked_by VARCHAR(100),
+    locked_at TIMESTAMPTZ,
+    last_error TEXT,
+    duration DOUBLE PRECISION,
+    created_at TIMESTAMPTZ DEFAULT now(),
+    finished_at TIMESTAMPTZ
+);
+
+CREATE INDEX ix_job_status_run_at ON job (status, run_at);
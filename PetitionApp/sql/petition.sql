@@ -3,7 +3,9 @@ CREATE TABLE petition (
     user_id INTEGER REFERENCES users(id),
     petition_name VARCHAR(255) NOT NULL,
     petition_text TEXT NOT NULL,
-    images BASE64
+    images TEXT,
+    image_ref VARCHAR(64),
+    version INTEGER NOT NULL DEFAULT 1
 );
 
-
+CREATE INDEX ix_petition_user_id_id ON petition (user_id, id);
@@ -0,0 +1,7 @@
+CREATE TABLE petition_counter (
+    petition_id INTEGER NOT NULL,
+    shard INTEGER NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    validated INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (petition_id, shard)
+);
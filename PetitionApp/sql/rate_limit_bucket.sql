@@ -0,0 +1,8 @@
+CREATE TABLE rate_limit_bucket (
+    key VARCHAR(100) PRIMARY KEY,
+    tokens DOUBLE PRECISION NOT NULL,
+    updated_at DOUBLE PRECISION NOT NULL,
+    allowed BOOLEAN NOT NULL DEFAULT TRUE
+);
+
+CREATE INDEX ix_rate_limit_bucket_updated_at ON rate_limit_bucket (updated_at);
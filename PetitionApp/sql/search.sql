@@ -0,0 +1,4 @@
+ALTER TABLE petition ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (setweight(to_tsvector('portuguese', coalesce(petition_name, '')), 'A') || setweight(to_tsvector('portuguese', coalesce(petition_text, '')), 'B')) STORED;
+CREATE INDEX IF NOT EXISTS ix_petition_search_vector ON petition USING gin (search_vector);
+ALTER TABLE complaints ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (setweight(to_tsvector('portuguese', coalesce(complaint_text, '')), 'A')) STORED;
+CREATE INDEX IF NOT EXISTS ix_complaints_search_vector ON complaints USING gin (search_vector);
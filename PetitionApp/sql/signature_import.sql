@@ -0,0 +1,21 @@
+CREATE TABLE signature_import (
+    id SERIAL PRIMARY KEY,
+    petition_id INTEGER REFERENCES petition(id),
+    user_id INTEGER REFERENCES users(id),
+    digest VARCHAR(64) NOT NULL,
+    status VARCHAR(10) NOT NULL DEFAULT 'running',
+    rows_done INTEGER NOT NULL DEFAULT 0,
+    inserted INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMPTZ DEFAULT now()
+);
+
+CREATE INDEX ix_signature_import_petition_digest ON signature_import (petition_id, digest);
+
+
+CREATE TABLE signature_import_error (
+    import_id INTEGER REFERENCES signature_import(id) ON DELETE CASCADE,
+    row INTEGER NOT NULL,
+    message TEXT NOT NULL,
+    PRIMARY KEY (import_id, row)
+);
@@ -0,0 +1,25 @@
+CREATE TABLE signature_rollup (
+    period VARCHAR(4) NOT NULL,
+    petition_id INTEGER NOT NULL,
+    bucket TIMESTAMPTZ NOT NULL,
+    state VARCHAR(50) NOT NULL,
+    city VARCHAR(100) NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (period, petition_id, bucket, state, city)
+);
+
+
+CREATE TABLE watermark (
+    name VARCHAR(50) PRIMARY KEY,
+    last_id INTEGER NOT NULL DEFAULT 0
+);
+
+
+CREATE TABLE geo_rollup (
+    source VARCHAR(10) NOT NULL,
+    scope_id INTEGER NOT NULL,
+    state VARCHAR(50) NOT NULL,
+    city VARCHAR(100) NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (source, scope_id, state, city)
+);
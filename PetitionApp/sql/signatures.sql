@@ -3,11 +3,18 @@ CREATE TABLE signature (
     petition_id INTEGER REFERENCES petition(id),
     name VARCHAR(255),
     email VARCHAR(255),
+    email_normalized VARCHAR(255),
     phone VARCHAR(20),
     city VARCHAR(100),
     state VARCHAR(50),
     show_signature BOOLEAN,
     can_be_contacted BOOLEAN,
     validated_signature BOOLEAN,
-    user_id INTEGER REFERENCES users(id)
+    user_id INTEGER REFERENCES users(id),
+    created_at TIMESTAMPTZ DEFAULT now()
 );
+
+CREATE INDEX ix_signature_petition_id_id ON signature (petition_id, id);
+CREATE INDEX ix_signature_user_id_id ON signature (user_id, id);
+CREATE INDEX ix_signature_email ON signature (email);
+CREATE UNIQUE INDEX ux_signature_petition_email ON signature (petition_id, email_normalized);
@@ -0,0 +1,45 @@
+from urllib.parse import urlencode
+
+from sqlalchemy import select
+
+from database import SessionLocal
+from jobs import job
+from models import Petition, Signature, Users
+import mailer
+import thumbnails
+import validation
+
+
+@job('validation_email')
+def send_validation_email(signature_id: int):
+    db = SessionLocal()
+    try:
+        row = db.execute(
+            select(Signature.name, Signature.email, Signature.validated_signature, Petition.petition_name)
+            .join(Petition, Petition.id == Signature.petition_id)
+            .where(Signature.id == signature_id)
+        ).first()
+    finally:
+        db.close()
+    if row is None or row.validated_signature or not row.email:
+        return
+    link = f'{mailer.APP_BASE_URL}/signatures/validate?' + urlencode({'token': validation.issue_token(signature_id)})
+    mailer.send(row.email, f'Confirme sua assinatura: {row.petition_name}',
+                f'Olá {row.name},\n\nPara confirmar sua assinatura, acesse:\n{link}\n')
+
+
+@job('welcome_email')
+def send_welcome_email(user_id: int):
+    db = SessionLocal()
+    try:
+        user = db.execute(select(Users.first_name, Users.email).where(Users.id == user_id)).first()
+    finally:
+        db.close()
+    if user is None or not user.email:
+        return
+    mailer.send(user.email, 'Bem-vindo', f'Olá {user.first_name},\n\nSeu cadastro foi criado com sucesso.\n')
+
+
+@job('thumbnails')
+def generate_thumbnails(digest: str):
+    thumbnails.generate(digest)
@@ -0,0 +1,59 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# a throwaway SQLite database built by the migrations, set before the app
+# modules read their settings
+APP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/test.db")
+os.environ.setdefault("AUTH_SECRET_KEY", "test-secret-key-test-secret-key!")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ROLLUP_INTERVAL_SECONDS", "0")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+os.environ.setdefault("QUERY_DEBUG", "1")
+os.environ.setdefault("QUERY_BUDGET_MODE", "raise")
+os.environ.setdefault("BLOB_STORE_ROOT", tempfile.mkdtemp())
+os.chdir(APP)
+sys.path.insert(0, APP)
+
+
+@pytest.fixture(scope='session')
+def migrated():
+    from alembic import command
+    from alembic.config import Config
+
+    command.upgrade(Config(os.path.join(APP, 'alembic.ini')), 'head')
+
+
+@pytest.fixture
+def db(migrated):
+    from database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture(scope='session')
+def client(migrated):
+    from fastapi.testclient import TestClient
+    import main
+
+    with TestClient(main.app) as client:
+        yield client
+
+
+@pytest.fixture
+def admin_headers(db):
+    from datetime import timedelta
+    from models import Users
+    from routers.auth import create_access_token
+
+    if db.get(Users, 1) is None:
+        db.add(Users(id=1, username='admin', email='admin@example.com', role='Admin', is_activate=True))
+        db.commit()
+    return {'Authorization': 'Bearer ' + create_access_token('admin', 1, 'Admin', timedelta(minutes=5))}
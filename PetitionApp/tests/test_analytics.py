@@ -0,0 +1,19 @@
+import analytics
+from models import Petition
+
+
+def test_data_version_moves_on_rename(db):
+    petition = Petition(user_id=1, petition_name='before', petition_text='analytics')
+    db.add(petition)
+    db.commit()
+    version = analytics.data_version(db)
+
+    petition.petition_name = 'after'
+    db.commit()
+    assert analytics.data_version(db) != version
+    assert {'id': petition.id, 'user_id': 1, 'petition_name': 'after', 'signature_count': 0, 'validated_count': 0} \
+        in analytics.petition_totals(db)
+
+
+def test_data_version_is_stable_without_changes(db):
+    assert analytics.data_version(db) == analytics.data_version(db)
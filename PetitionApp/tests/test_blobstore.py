@@ -0,0 +1,84 @@
+import base64
+import hashlib
+import io
+import os
+
+import pytest
+from PIL import Image
+
+from blobstore import BlobStore, LocalBlobStore, decode_image, sniff_content_type
+
+
+def png_bytes(width=4, height=4) -> bytes:
+    out = io.BytesIO()
+    Image.new('RGB', (width, height), 'red').save(out, format='PNG')
+    return out.getvalue()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LocalBlobStore(str(tmp_path))
+
+
+def test_blobs_are_keyed_by_sha256(store, tmp_path):
+    data = png_bytes()
+    digest = store.put(data)
+    assert digest == hashlib.sha256(data).hexdigest()
+    assert store.put(data) == digest
+    assert store.path(digest) == os.path.join(str(tmp_path), digest[:2], digest[2:4], digest)
+    assert store.exists(digest) and store.size(digest) == len(data)
+    assert b''.join(store.iter(digest, chunk_size=7)) == data
+    assert store.content_type(digest) == 'image/png'
+
+
+def test_delete_is_idempotent(store):
+    digest = store.put(b'gone')
+    store.delete(digest)
+    store.delete(digest)
+    assert not store.exists(digest)
+
+
+def test_only_digests_are_paths(store):
+    assert not store.exists('../../etc/passwd')
+    with pytest.raises(ValueError):
+        store.path('../../etc/passwd')
+
+
+def test_backends_must_implement_the_interface():
+    with pytest.raises(TypeError):
+        BlobStore()
+
+
+def test_decode_and_sniff():
+    data = png_bytes()
+    encoded = base64.b64encode(data).decode()
+    assert decode_image(encoded) == data
+    assert decode_image('data:image/png;base64,' + encoded) == data
+    with pytest.raises(ValueError):
+        decode_image('not base64!')
+    assert sniff_content_type(b'\xff\xd8\xff\xe0') == 'image/jpeg'
+    assert sniff_content_type(b'RIFF\0\0\0\0WEBPVP8 ') == 'image/webp'
+    assert sniff_content_type(b'plain') == 'application/octet-stream'
+
+
+def test_petition_image_is_stored_and_served(client, admin_headers):
+    data = png_bytes()
+    created = client.post('/petitions/', headers=admin_headers, json={
+        'petition_name': 'with image', 'petition_text': 'text', 'images': base64.b64encode(data).decode()})
+    assert created.status_code == 201, created.text
+    digest = created.json()['image_ref']
+    assert digest == hashlib.sha256(data).hexdigest()
+
+    image = client.get(f'/petitions/images/{digest}')
+    assert image.status_code == 200 and image.content == data
+    assert image.headers['content-type'] == 'image/png'
+    assert 'immutable' in image.headers['cache-control']
+    cached = client.get(f'/petitions/images/{digest}', headers={'If-None-Match': image.headers['etag']})
+    assert cached.status_code == 304
+    assert client.get('/petitions/images/' + '0' * 64).status_code == 404
+
+
+def test_bad_image_is_422(client, admin_headers):
+    response = client.post('/petitions/', headers=admin_headers, json={
+        'petition_name': 'bad image', 'petition_text': 'text', 'images': 'not base64!'})
+    assert response.status_code == 422
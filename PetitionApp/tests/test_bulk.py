@@ -0,0 +1,107 @@
+import csv
+import json
+import io
+
+import pytest
+from sqlalchemy import select
+
+import bulk
+import ingest
+from models import Petition, Signature, SignatureImport
+
+HEADER = 'name,email,phone,city,state,show_signature,can_be_contacted\n'
+
+
+@pytest.fixture
+def petition_id(db, admin_headers):
+    petition = Petition(user_id=1, petition_name='bulk', petition_text='bulk')
+    db.add(petition)
+    db.commit()
+    return petition.id
+
+
+def _csv(*emails):
+    return HEADER + ''.join(f'signer,{email},1,Rio,RJ,true,false\n' for email in emails)
+
+
+def _upload(client, headers, petition_id, body):
+    return client.post(f'/signatures/import/{petition_id}', headers=headers,
+                       files={'file': ('signatures.csv', body.encode(), 'text/csv')})
+
+
+def _emails(db, petition_id):
+    return sorted(db.scalars(select(Signature.email).where(Signature.petition_id == petition_id)))
+
+
+def test_import_reports_bad_rows(client, db, admin_headers, petition_id):
+    ingest.insert_signatures([dict(name='signer', email='already@example.com', petition_id=petition_id)])
+    body = _csv('a@example.com', 'b@example.com', 'A@example.com', 'already@example.com') + 'ab,c@example.com,1,Rio,RJ,true,false\n'
+    response = _upload(client, admin_headers, petition_id, body)
+    assert response.status_code == 200, response.text
+    summary = response.json()
+    assert (summary['status'], summary['rows_done'], summary['inserted'], summary['failed']) == ('done', 5, 2, 3)
+    assert [(e['row'], e['message']) for e in summary['errors']] == [
+        (3, 'Duplicate email in file'),
+        (4, 'Petition already signed with this email'),
+        (5, 'name: String should have at least 3 characters'),
+    ]
+    assert _emails(db, petition_id) == ['a@example.com', 'already@example.com', 'b@example.com']
+    assert client.get(f'/signatures/count/{petition_id}').json()['total'] == 3
+
+    errors = client.get(f"/signatures/import/{summary['id']}/errors", headers=admin_headers)
+    assert list(csv.reader(io.StringIO(errors.text)))[1:] == [[str(e['row']), e['message']] for e in summary['errors']]
+
+
+def test_missing_columns_are_rejected(client, admin_headers, petition_id):
+    response = _upload(client, admin_headers, petition_id, 'name,email\nsigner,x@example.com\n')
+    assert response.status_code == 422
+    assert 'Missing columns' in response.json()['detail']
+
+
+# an import that dies half way resumes from its last committed chunk when
+# the same file is uploaded again, without inserting anything twice
+def test_interrupted_import_resumes(client, db, admin_headers, petition_id, monkeypatch):
+    monkeypatch.setattr(bulk, 'IMPORT_CHUNK', 2)
+    body = _csv(*[f'resume{i}@example.com' for i in range(5)])
+    real_chunk, calls = bulk._import_chunk, []
+
+    def failing_chunk(*args, **kwargs):
+        calls.append(args[3])
+        if len(calls) == 2:
+            raise RuntimeError('worker died')
+        return real_chunk(*args, **kwargs)
+
+    monkeypatch.setattr(bulk, '_import_chunk', failing_chunk)
+    with pytest.raises(RuntimeError):
+        _upload(client, admin_headers, petition_id, body)
+    job = db.scalar(select(SignatureImport).where(SignatureImport.petition_id == petition_id))
+    assert (job.status, job.rows_done, job.inserted) == ('running', 2, 2)
+
+    monkeypatch.setattr(bulk, '_import_chunk', real_chunk)
+    summary = _upload(client, admin_headers, petition_id, body).json()
+    assert summary['id'] == job.id
+    assert (summary['status'], summary['rows_done'], summary['inserted'], summary['failed']) == ('done', 5, 5, 0)
+    assert _emails(db, petition_id) == [f'resume{i}@example.com' for i in range(5)]
+
+    # a finished import uploaded again is a no-op
+    again = _upload(client, admin_headers, petition_id, body).json()
+    assert again == summary
+    assert client.get(f'/signatures/count/{petition_id}').json()['total'] == 5
+
+
+def test_export_streams_every_signature(client, admin_headers, petition_id, monkeypatch):
+    monkeypatch.setattr(bulk, 'EXPORT_CHUNK', 2)
+    _upload(client, admin_headers, petition_id, _csv(*[f'export{i}@example.com' for i in range(5)]))
+    rows = list(csv.DictReader(io.StringIO(client.get(f'/signatures/export/{petition_id}', headers=admin_headers).text)))
+    assert [row['email'] for row in rows] == [f'export{i}@example.com' for i in range(5)]
+    assert list(rows[0]) == list(bulk.EXPORT_COLUMNS)
+
+
+def test_imported_signers_get_a_validation_email(client, db, admin_headers, petition_id):
+    from models import Job
+
+    summary = _upload(client, admin_headers, petition_id, _csv('mail1@example.com', 'mail2@example.com')).json()
+    assert summary['inserted'] == 2
+    ids = db.scalars(select(Signature.id).where(Signature.petition_id == petition_id)).all()
+    payloads = db.scalars(select(Job.payload).where(Job.name == 'validation_email')).all()
+    assert {id for id in ids} <= {json.loads(payload)['signature_id'] for payload in payloads}
@@ -0,0 +1,46 @@
+import pytest
+from sqlalchemy import func, select
+
+import counters
+from models import Petition, PetitionCounter, Signature
+
+
+@pytest.fixture
+def petition_id(db):
+    petition = Petition(user_id=1, petition_name='counted', petition_text='counted')
+    db.add(petition)
+    db.commit()
+    return petition.id
+
+
+def test_shards_add_up(db, petition_id, monkeypatch):
+    for shard in (0, 1, 1, 2):
+        monkeypatch.setattr(counters.random, 'randrange', lambda n, shard=shard: shard)
+        counters.increment(db, petition_id, total=2, validated=1)
+    counters.increment(db, petition_id, total=-1)
+    db.commit()
+
+    assert db.scalar(select(func.count()).where(PetitionCounter.petition_id == petition_id)) == 3
+    assert counters.get_counts(db, petition_id) == {'petition_id': petition_id, 'total': 7, 'validated': 4}
+    assert counters.get_all_counts(db, [petition_id])[petition_id]['total'] == 7
+
+
+def test_rebuild_matches_the_signature_table(db, petition_id):
+    db.add_all([Signature(petition_id=petition_id, email=f'r{i}@example.com', validated_signature=i < 2)
+                for i in range(5)])
+    counters.increment(db, petition_id, total=100)
+    db.commit()
+
+    counters.rebuild(db, petition_id)
+    assert counters.get_counts(db, petition_id) == {'petition_id': petition_id, 'total': 5, 'validated': 2}
+
+
+def test_sign_and_delete_move_the_count(client, admin_headers, db, petition_id):
+    signature = dict(name='abc', email='count@example.com', phone='1', city='Rio', state='RJ',
+                     show_signature=True, petition_id=petition_id, can_be_contacted=False)
+    created = client.post('/signatures/', json=signature)
+    assert created.status_code == 201
+    assert client.get(f'/signatures/count/{petition_id}').json()['total'] == 1
+
+    assert client.delete(f'/admin/signature/{created.json()["id"]}', headers=admin_headers).status_code == 202
+    assert client.get(f'/signatures/count/{petition_id}').json()['total'] == 0
@@ -0,0 +1,57 @@
+import pytest
+from sqlalchemy import select
+
+import dedup
+import ingest
+from models import Petition, Signature
+
+
+@pytest.fixture
+def petition_id(db):
+    petition = Petition(user_id=1, petition_name='dedup', petition_text='dedup')
+    db.add(petition)
+    db.commit()
+    return petition.id
+
+
+def _row(petition_id, email):
+    return dict(name='abc', email=email, phone='1', city='Rio', state='RJ', show_signature=True,
+                petition_id=petition_id, can_be_contacted=False)
+
+
+def test_stored_key_is_the_python_normalization(db, petition_id):
+    ingest.insert_signatures([_row(petition_id, ' JOÃO@Example.com\t')])
+    stored = db.scalar(select(Signature.email_normalized).where(Signature.petition_id == petition_id))
+    assert stored == dedup.normalize_email(' JOÃO@Example.com\t') == 'joão@example.com'
+
+
+# SQL lower(trim()) on SQLite leaves non-ASCII capitals and tabs alone, the
+# index on the stored column doesn't
+def test_index_agrees_with_the_lookup(client, db, petition_id, monkeypatch):
+    monkeypatch.setattr(dedup.deduper, 'loaded', False)
+    assert client.post('/signatures/', json=_row(petition_id, 'joão@example.com')).status_code == 201
+    assert client.post('/signatures/', json=_row(petition_id, '\tJOÃO@EXAMPLE.COM ')).status_code == 409
+    # bypassing the lookup, the unique index catches it the same way
+    results = ingest.insert_signatures([_row(petition_id, 'João@example.com\n')])
+    assert isinstance(results[0], dedup.DuplicateSignature)
+
+
+def test_prefilter_uses_the_stored_key(db, petition_id):
+    ingest.insert_signatures([_row(petition_id, 'Bloom@Example.com')])
+    deduper = dedup.SignatureDeduper(0.01, 16, 10 ** 9)
+    deduper.load()
+    assert deduper.loaded
+    assert 'bloom@example.com' in deduper.filters[petition_id]
+    assert deduper.is_duplicate(db, petition_id, ' BLOOM@example.com')
+    assert not deduper.is_duplicate(db, petition_id, 'other@example.com')
+
+
+def test_prefilter_is_off_past_max_entries(db, petition_id):
+    ingest.insert_signatures([_row(petition_id, 'capped@example.com')])
+    deduper = dedup.SignatureDeduper(0.01, 16, 0)
+    deduper.load()
+    assert not deduper.loaded and deduper.filters == {}
+    # every check goes to the index instead
+    assert deduper.is_duplicate(db, petition_id, 'Capped@example.com')
+    deduper.add(petition_id, 'later@example.com')
+    assert deduper.filters == {}
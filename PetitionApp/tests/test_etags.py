@@ -0,0 +1,69 @@
+import pytest
+
+from models import Petition
+from response_cache import response_cache
+from schemas import PetitionResponse
+
+
+@pytest.fixture
+def petition_id(db, admin_headers):
+    # a legacy row that still has its inline image
+    petition = Petition(user_id=1, petition_name='etag', petition_text='etag', images='aGVsbG8=')
+    db.add(petition)
+    db.commit()
+    return petition.id
+
+
+def test_not_modified_on_a_matching_etag(client, admin_headers, petition_id):
+    first = client.get(f'/petitions/{petition_id}', headers=admin_headers)
+    assert first.status_code == 200
+    tag = first.headers['etag']
+    assert tag.startswith('"') and tag.endswith('"')
+
+    for header in (tag, f'W/{tag}', f'"other", {tag}', '*'):
+        second = client.get(f'/petitions/{petition_id}', headers={**admin_headers, 'If-None-Match': header})
+        assert second.status_code == 304 and second.content == b''
+        assert second.headers['etag'] == tag
+    assert client.get(f'/petitions/{petition_id}',
+                      headers={**admin_headers, 'If-None-Match': '"other"'}).status_code == 200
+
+
+def test_body_goes_through_the_response_model(client, admin_headers, petition_id):
+    hits = response_cache.stats['hits']
+    for _ in range(2):
+        body = client.get(f'/petitions/{petition_id}', headers=admin_headers).json()
+        assert set(body) == set(PetitionResponse.model_fields)
+        assert 'images' not in body
+    assert response_cache.stats['hits'] == hits + 1
+
+
+def test_update_changes_the_etag(client, admin_headers, petition_id):
+    old = client.get(f'/petitions/{petition_id}', headers=admin_headers).headers['etag']
+    update = {'petition_name': 'renamed', 'petition_text': 'etag', 'images': ''}
+    assert client.put(f'/petitions/{petition_id}', headers=admin_headers, json=update).status_code == 204
+
+    fresh = client.get(f'/petitions/{petition_id}', headers={**admin_headers, 'If-None-Match': old})
+    assert fresh.status_code == 200
+    assert fresh.headers['etag'] != old
+    assert fresh.json()['petition_name'] == 'renamed'
+
+
+def test_other_users_petition_is_not_found(client, petition_id):
+    from datetime import timedelta
+    from routers.auth import create_access_token
+
+    headers = {'Authorization': 'Bearer ' + create_access_token('other', 999, 'User', timedelta(minutes=5))}
+    assert client.get(f'/petitions/{petition_id}', headers=headers).status_code == 404
+
+
+def test_admin_page_etag(client, admin_headers, petition_id):
+    path = f'/admin/petition?after={petition_id - 1}&limit=1'
+    first = client.get(path, headers=admin_headers)
+    assert first.status_code == 200
+    [row] = first.json()
+    assert row['id'] == petition_id and 'images' not in row
+    assert first.headers['x-next-after'] == str(petition_id)
+
+    second = client.get(path, headers={**admin_headers, 'If-None-Match': first.headers['etag']})
+    assert second.status_code == 304
+    assert second.headers['x-next-after'] == str(petition_id)
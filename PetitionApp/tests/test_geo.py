@@ -0,0 +1,78 @@
+import itertools
+from datetime import datetime, timezone
+
+from sqlalchemy import delete, select
+
+import geo
+import rollups
+from models import GeoRollup, Petition, Signature
+
+TYPES = itertools.count(50000)
+
+
+def _record(db, complaint_type, state, city, delta):
+    geo.record_complaint(db, complaint_type, state, city, delta)
+    db.commit()
+
+
+def test_spellings_share_a_row(db):
+    complaint_type = next(TYPES)
+    _record(db, complaint_type, 'São Paulo', '  são   PAULO ', 1)
+    _record(db, complaint_type, 'sp', 'Sao Paulo', 1)
+    assert geo.counts(db, 'complaint', complaint_type) == {
+        'states': [{'state': 'SP', 'total': 2}],
+        'cities': [{'state': 'SP', 'city': 'Sao Paulo', 'total': 2}],
+    }
+
+
+# a removal never takes a row below zero, and one with nothing to take from
+# (a complaint older than the backfill) doesn't create a row
+def test_removals_clamp_at_zero(db):
+    complaint_type = next(TYPES)
+    _record(db, complaint_type, 'RJ', 'Niterói', -1)
+    assert db.scalars(select(GeoRollup).where(GeoRollup.source == 'complaint',
+                                              GeoRollup.scope_id == complaint_type)).all() == []
+
+    _record(db, complaint_type, 'RJ', 'Niterói', 2)
+    geo._add(db, 'complaint', {(complaint_type, 'RJ', 'Niteroi'): -5})
+    db.commit()
+    total = db.scalar(select(GeoRollup.total).where(GeoRollup.source == 'complaint',
+                                                    GeoRollup.scope_id == complaint_type))
+    assert total == 0
+    # zero rows are left out of the answer
+    assert geo.counts(db, 'complaint', complaint_type) == {'states': [], 'cities': []}
+    _record(db, complaint_type, 'RJ', 'Niterói', 1)
+    assert geo.counts(db, 'complaint', complaint_type)['states'] == [{'state': 'RJ', 'total': 1}]
+
+
+def test_top_limits_states_and_cities(db):
+    complaint_type = next(TYPES)
+    for rank, (state, city) in enumerate([('SP', 'Campinas'), ('RJ', 'Rio De Janeiro'), ('MG', 'Belo Horizonte')]):
+        for _ in range(3 - rank):
+            _record(db, complaint_type, state, city, 1)
+    result = geo.counts(db, 'complaint', complaint_type, limit=2)
+    assert [row['state'] for row in result['states']] == ['SP', 'RJ']
+    assert [row['city'] for row in result['cities']] == ['Campinas', 'Rio De Janeiro']
+
+
+def test_reconcile_drops_deleted_signatures(db, monkeypatch):
+    monkeypatch.setattr(rollups, 'WATERMARK_SETTLE_SECONDS', 0)
+    petition = Petition(user_id=1, petition_name='geo', petition_text='geo')
+    db.add(petition)
+    db.commit()
+    created_at = datetime(2026, 1, 5, tzinfo=timezone.utc)
+    signatures = [Signature(petition_id=petition.id, email=f'geo{i}@example.com', state='Bahia', city='Salvador',
+                            created_at=created_at) for i in range(3)]
+    db.add_all(signatures)
+    db.commit()
+    while geo.refresh_signatures():
+        pass
+    assert geo.counts(db, 'signature', petition.id)['states'] == [{'state': 'BA', 'total': 3}]
+
+    db.execute(delete(Signature).where(Signature.id == signatures[0].id))
+    db.commit()
+    while geo.refresh_signatures():
+        pass
+    assert geo.counts(db, 'signature', petition.id)['states'] == [{'state': 'BA', 'total': 3}]
+    geo.reconcile_signatures()
+    assert geo.counts(db, 'signature', petition.id)['states'] == [{'state': 'BA', 'total': 2}]
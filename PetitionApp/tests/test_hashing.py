@@ -0,0 +1,63 @@
+import pytest
+
+import hashing
+from models import Users
+
+
+@pytest.fixture(scope='module')
+def login_user(migrated):
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        user = db.query(Users).filter(Users.username == 'hasher').first()
+        if user is None:
+            user = Users(username='hasher', email='hasher@example.com', role='User', is_activate=True,
+                         hashed_password=hashing.bcrypt_context.hash('right password'))
+            db.add(user)
+            db.commit()
+    finally:
+        db.close()
+    return {'username': 'hasher', 'password': 'right password'}
+
+
+# /auth/token sets the login cookie on the shared client
+@pytest.fixture(autouse=True)
+def no_cookies(client):
+    yield
+    client.cookies.clear()
+
+
+@pytest.fixture
+def saturated(monkeypatch):
+    # every hash finds the queue full
+    monkeypatch.setattr(hashing, 'HASH_MAX_PENDING', 0)
+
+
+def test_api_login_checks_the_password(client, login_user):
+    assert client.post('/auth/token', data=login_user).status_code == 200
+    assert client.post('/auth/token', data={**login_user, 'password': 'wrong'}).status_code == 401
+
+
+def test_api_login_is_503_when_saturated(client, login_user, saturated):
+    rejected = hashing.stats['rejected']
+    response = client.post('/auth/token', data=login_user)
+    assert response.status_code == 503
+    assert response.headers['retry-after'] == '1'
+    assert hashing.stats['rejected'] == rejected + 1
+
+
+def test_login_page_is_503_not_a_bad_password(client, login_user, saturated):
+    response = client.post('/auth/', data={'email': login_user['username'], 'password': login_user['password']},
+                           follow_redirects=False)
+    assert response.status_code == 503
+    assert response.headers['retry-after'] == '1'
+    assert 'Server busy' in response.text
+    assert 'Invalid username or password' not in response.text
+
+
+def test_login_page_still_rejects_a_bad_password(client, login_user):
+    response = client.post('/auth/', data={'email': login_user['username'], 'password': 'wrong'},
+                           follow_redirects=False)
+    assert response.status_code == 200
+    assert 'Invalid username or password' in response.text
@@ -0,0 +1,78 @@
+import uuid
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import func, select
+
+import idempotency
+import ratelimit
+from models import Petition, Signature
+from routers.auth import create_access_token
+
+
+@pytest.fixture
+def petition_id(db):
+    petition = Petition(user_id=1, petition_name='idempotency', petition_text='idempotency')
+    db.add(petition)
+    db.commit()
+    return petition.id
+
+
+def _signature(petition_id, email):
+    return dict(name='signer', email=email, phone='1', city='Rio', state='RJ', show_signature=True,
+                petition_id=petition_id, can_be_contacted=False)
+
+
+def _headers(key, **extra):
+    return {'Idempotency-Key': key, **extra}
+
+
+def test_retry_is_replayed_once_created(client, db, admin_headers):
+    key = str(uuid.uuid4())
+    body = {'petition_name': f'retry {key}', 'petition_text': 'text', 'images': ''}
+    first = client.post('/petitions/', json=body, headers=_headers(key, **admin_headers))
+    second = client.post('/petitions/', json=body, headers=_headers(key, **admin_headers))
+    assert first.status_code == second.status_code == 201
+    assert 'idempotent-replayed' not in first.headers and second.headers['idempotent-replayed'] == 'true'
+    assert second.json() == first.json()
+    assert db.scalar(select(func.count()).where(Petition.petition_name == body['petition_name'])) == 1
+
+    changed = client.post('/petitions/', json={**body, 'petition_text': 'other'}, headers=_headers(key, **admin_headers))
+    assert changed.status_code == 422
+
+
+def test_keys_are_per_token(client, admin_headers):
+    key = str(uuid.uuid4())
+    other = {'Authorization': 'Bearer ' + create_access_token('admin', 1, 'Admin', timedelta(minutes=6))}
+    body = {'petition_name': f'token {key}', 'petition_text': 'text', 'images': ''}
+    first = client.post('/petitions/', json=body, headers=_headers(key, **admin_headers))
+    second = client.post('/petitions/', json=body, headers=_headers(key, **other))
+    assert 'idempotent-replayed' not in second.headers
+    assert second.json()['id'] != first.json()['id']
+
+
+# the same key and body from another anonymous caller runs on its own rather
+# than getting the first caller's 201, and with it their signature
+def test_anonymous_callers_cannot_replay_each_other(client, db, petition_id, monkeypatch):
+    monkeypatch.setattr(ratelimit, 'RATE_LIMIT_TRUST_FORWARDED', True)
+    key, body = str(uuid.uuid4()), _signature(petition_id, 'anon@example.com')
+
+    first = client.post('/signatures/', json=body, headers=_headers(key, **{'X-Forwarded-For': '10.0.0.1'}))
+    retry = client.post('/signatures/', json=body, headers=_headers(key, **{'X-Forwarded-For': '10.0.0.1'}))
+    assert first.status_code == retry.status_code == 201
+    assert retry.headers['idempotent-replayed'] == 'true' and retry.json() == first.json()
+
+    other = client.post('/signatures/', json=body, headers=_headers(key, **{'X-Forwarded-For': '10.0.0.2'}))
+    assert 'idempotent-replayed' not in other.headers
+    assert other.status_code == 409
+    assert str(first.json()['id']) not in other.text
+    assert db.scalar(select(func.count()).where(Signature.petition_id == petition_id)) == 1
+
+
+def test_no_owner_means_no_replay(client, petition_id, monkeypatch):
+    monkeypatch.setattr(ratelimit, 'client_ip', lambda scope, headers, body: None)
+    replayed = idempotency.store.stats['replayed']
+    key, body = str(uuid.uuid4()), _signature(petition_id, 'nobody@example.com')
+    assert client.post('/signatures/', json=body, headers=_headers(key)).status_code == 201
+    assert client.post('/signatures/', json=body, headers=_headers(key)).status_code == 409
+    assert idempotency.store.stats['replayed'] == replayed
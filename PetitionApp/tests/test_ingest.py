@@ -0,0 +1,65 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import select
+
+import ingest
+from dedup import DuplicateSignature
+from models import Petition, Signature
+
+
+@pytest.fixture
+def petition_id(db):
+    petition = Petition(user_id=1, petition_name='ingest', petition_text='ingest')
+    db.add(petition)
+    db.commit()
+    return petition.id
+
+
+def _row(petition_id, email, **extra):
+    return dict(name='abc', email=email, phone='1', city='Rio', state='RJ', show_signature=True,
+                petition_id=petition_id, can_be_contacted=False, **extra)
+
+
+def _emails(db, petition_id):
+    return sorted(db.scalars(select(Signature.email).where(Signature.petition_id == petition_id)))
+
+
+def test_batch_is_one_insert(db, petition_id):
+    results = ingest.insert_signatures([_row(petition_id, f'batch{i}@example.com') for i in range(3)])
+    assert all(isinstance(result, int) for result in results)
+    assert _emails(db, petition_id) == ['batch0@example.com', 'batch1@example.com', 'batch2@example.com']
+
+
+# a failing row sends the batch down the row-by-row path, where only that
+# row fails: a duplicate as DuplicateSignature, anything else as its error
+def test_failed_row_is_retried_alone(db, petition_id):
+    results = ingest.insert_signatures([
+        _row(petition_id, 'good1@example.com'),
+        _row(petition_id, 'bad@example.com', created_at='not a date'),
+        _row(petition_id, 'good1@example.com'),
+        _row(petition_id, 'good2@example.com'),
+    ])
+    assert isinstance(results[0], int) and isinstance(results[3], int)
+    assert isinstance(results[1], Exception) and not isinstance(results[1], DuplicateSignature)
+    assert isinstance(results[2], DuplicateSignature)
+    assert _emails(db, petition_id) == ['good1@example.com', 'good2@example.com']
+
+
+def test_batched_callers_get_their_own_status(client, db, petition_id, monkeypatch):
+    # long enough for every request below to land in the same batch
+    monkeypatch.setattr(ingest.signature_writer, 'max_latency', 0.5)
+    batches = ingest.signature_writer.stats['batches']
+    client.portal.call(ingest.signature_writer.start)
+    try:
+        emails = ['same@example.com', 'other@example.com', 'same@example.com', 'third@example.com']
+        with ThreadPoolExecutor(len(emails)) as pool:
+            responses = list(pool.map(lambda email: client.post('/signatures/', json=_row(petition_id, email)), emails))
+    finally:
+        client.portal.call(ingest.signature_writer.stop)
+
+    statuses = [response.status_code for response in responses]
+    assert sorted(statuses) == [201, 201, 201, 409]
+    assert sorted(statuses[i] for i in (0, 2)) == [201, 409]
+    assert ingest.signature_writer.stats['batches'] == batches + 1
+    assert _emails(db, petition_id) == ['other@example.com', 'same@example.com', 'third@example.com']
@@ -0,0 +1,109 @@
+import json
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import select, update
+from sqlalchemy.dialects import postgresql
+
+import jobs
+from models import Job
+
+# far in the past, so these jobs sort ahead of any other test's in claim()
+LONG_AGO = -10 ** 9
+
+
+def _enqueue(db, name, count=1, **payload):
+    for _ in range(count):
+        jobs.enqueue(db, name, payload, delay=LONG_AGO, max_attempts=2)
+    db.commit()
+    return db.scalars(select(Job.id).where(Job.name == name, Job.status == 'queued').order_by(Job.id)).all()
+
+
+def test_backoff_doubles_up_to_the_cap(monkeypatch):
+    monkeypatch.setattr(jobs.random, 'uniform', lambda low, high: high)
+    monkeypatch.setattr(jobs, 'JOB_BACKOFF_SECONDS', 5)
+    monkeypatch.setattr(jobs, 'JOB_BACKOFF_MAX_SECONDS', 30)
+    assert [jobs.backoff(attempt) for attempt in range(1, 6)] == [5, 10, 20, 30, 30]
+    monkeypatch.setattr(jobs.random, 'uniform', lambda low, high: low)
+    assert jobs.backoff(1) == 2.5
+
+
+def test_failed_job_is_retried_then_given_up(db, monkeypatch):
+    calls = []
+
+    def flaky(value):
+        calls.append(value)
+        raise ValueError('smtp down')
+
+    monkeypatch.setitem(jobs.handlers, 'test_flaky', flaky)
+    [job_id] = _enqueue(db, 'test_flaky', value=7)
+    assert jobs.claim(db, 'worker-a', limit=1) == [job_id]
+    jobs.run(db, job_id, 'worker-a')
+
+    job = db.get(Job, job_id)
+    db.refresh(job)
+    assert (job.status, job.attempts, job.locked_by) == ('queued', 1, None)
+    assert 'smtp down' in job.last_error
+    delay = (job.run_at.replace(tzinfo=timezone.utc) - datetime.now(timezone.utc)).total_seconds()
+    assert 0 < delay <= jobs.JOB_BACKOFF_SECONDS
+    # not due yet, nothing to claim
+    assert job_id not in jobs.claim(db, 'worker-a', limit=1)
+
+    db.execute(update(Job).where(Job.id == job_id).values(run_at=datetime(1990, 1, 1, tzinfo=timezone.utc)))
+    db.commit()
+    assert jobs.claim(db, 'worker-a', limit=1) == [job_id]
+    jobs.run(db, job_id, 'worker-a')
+    db.refresh(job)
+    assert (job.status, job.attempts) == ('failed', 2)
+    assert job.finished_at is not None
+    assert calls == [7, 7]
+
+
+def test_successful_job(db, monkeypatch):
+    monkeypatch.setitem(jobs.handlers, 'test_ok', lambda value: None)
+    [job_id] = _enqueue(db, 'test_ok', value=1)
+    jobs.claim(db, 'worker-a', limit=1)
+    # another worker can't run a job it didn't claim
+    jobs.run(db, job_id, 'worker-b')
+    assert db.get(Job, job_id).status == 'running'
+    jobs.run(db, job_id, 'worker-a')
+    job = db.get(Job, job_id)
+    db.refresh(job)
+    assert (job.status, job.attempts, job.last_error) == ('done', 1, None)
+
+
+def test_two_claims_never_share_a_job(db):
+    ids = _enqueue(db, 'test_claim', count=3)
+    first = jobs.claim(db, 'worker-a', limit=2)
+    second = jobs.claim(db, 'worker-b', limit=1)
+    assert not set(first) & set(second)
+    assert sorted(first + second) == ids
+    owners = dict(db.execute(select(Job.id, Job.locked_by).where(Job.id.in_(ids))).all())
+    assert {owners[id] for id in first} == {'worker-a'} and owners[second[0]] == 'worker-b'
+
+
+def test_expired_lease_is_claimed_again(db):
+    [job_id] = _enqueue(db, 'test_lease')
+    jobs.claim(db, 'worker-a', limit=1)
+    stale = datetime.now(timezone.utc) - timedelta(seconds=jobs.JOB_LEASE_SECONDS + 1)
+    db.execute(update(Job).where(Job.id == job_id).values(locked_at=stale))
+    db.commit()
+    assert jobs.claim(db, 'worker-b', limit=1) == [job_id]
+    assert db.scalar(select(Job.attempts).where(Job.id == job_id)) == 2
+
+
+# the Postgres path, checked on the SQL it sends: due rows are picked with
+# SKIP LOCKED so concurrent workers pass over each other's rows
+def test_postgres_claim_skips_locked_rows():
+    sent = []
+    session = SimpleNamespace(
+        get_bind=lambda: SimpleNamespace(dialect=postgresql.dialect()),
+        execute=sent.append,
+        scalars=lambda stmt: sent.append(stmt) or SimpleNamespace(all=lambda: []),
+        commit=lambda: None,
+    )
+    assert jobs.claim(session, 'worker-a') == []
+    sql = str(sent[1].compile(dialect=postgresql.dialect()))
+    assert sql.rstrip().endswith('FOR UPDATE SKIP LOCKED')
+    assert 'ORDER BY job.run_at, job.id' in sql
@@ -0,0 +1,33 @@
+import live
+
+
+async def _first_two_events(read_counts):
+    events = live.count_events(1, read_counts)
+    try:
+        return [await events.__anext__(), await events.__anext__()]
+    finally:
+        await events.aclose()
+
+
+# a signature landing while the snapshot is read still reaches the stream:
+# it subscribes first, so the delta is queued rather than lost
+def test_subscribes_before_the_snapshot(client, monkeypatch):
+    monkeypatch.setattr(live, 'LIVE_UPDATE_INTERVAL', 0)
+
+    def read_counts(petition_id):
+        assert live.broker.subscribers.get(petition_id)
+        live.publish_counts(petition_id, total=1)
+        return {'petition_id': petition_id, 'total': 3, 'validated': 0}
+
+    first, second = client.portal.call(_first_two_events, read_counts)
+    assert first == 'event: counts\ndata: {"petition_id": 1, "total": 3, "validated": 0}\n\n'
+    assert second == 'event: counts\ndata: {"petition_id": 1, "total": 4, "validated": 0}\n\n'
+    assert 1 not in live.broker.subscribers
+
+
+def test_deltas_between_updates_are_summed():
+    subscription = live.Subscription(1)
+    subscription.push({'total': 1})
+    subscription.push({'total': 1, 'validated': 1})
+    assert subscription.pending == {'total': 2, 'validated': 1}
+    assert subscription.event.is_set()
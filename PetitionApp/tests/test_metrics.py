@@ -0,0 +1,68 @@
+import re
+
+import metrics
+from metrics import Histogram
+from models import Petition
+from routers import metrics as metrics_router
+
+
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{.*\})? (\S+)$')
+
+
+def _samples(text: str) -> dict:
+    samples = {}
+    for line in text.splitlines():
+        if not line.startswith('#'):
+            name, labels, value = SAMPLE.match(line).groups()
+            samples[name + (labels or '')] = float(value)
+    return samples
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram('h', 'help', ('route',), (1, 5))
+    for value in (0.5, 1, 3, 7):
+        histogram.observe(('/a',), value)
+    assert histogram.render() == [
+        '# HELP h help', '# TYPE h histogram',
+        'h_bucket{route="/a",le="1"} 2', 'h_bucket{route="/a",le="5"} 3', 'h_bucket{route="/a",le="+Inf"} 4',
+        'h_sum{route="/a"} 11.5', 'h_count{route="/a"} 4',
+    ]
+
+
+def test_label_values_are_escaped():
+    assert metrics._labels(('a', 'b'), ('x"y', 'back\\slash\n')) == '{a="x\\"y",b="back\\\\slash\\n"}'
+
+
+def test_requests_are_labelled_by_route_template(client, admin_headers, db):
+    petition = Petition(user_id=1, petition_name='metrics', petition_text='metrics')
+    db.add(petition)
+    db.commit()
+    route = ('GET', '/petitions/{petition_id}')
+    before = metrics.requests[route + (200,)]
+    assert client.get(f'/petitions/{petition.id}', headers=admin_headers).status_code == 200
+    assert client.get('/no/such/path').status_code == 404
+
+    assert metrics.requests[route + (200,)] == before + 1
+    assert metrics.requests[('GET', 'unmatched', 404)] >= 1
+    assert not any(str(petition.id) in values[1] for values in metrics.requests)
+    assert metrics.request_queries.series[route][-1] >= 1
+
+
+def test_scrape_is_valid_text_format(client):
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/plain; version=0.0.4')
+    samples = _samples(response.text)
+    assert samples['http_requests_in_flight'] == 1
+    assert 'bcrypt_seconds_count' in samples and 'db_queries_total' in samples
+    assert 'cache_events_total{cache="token",event="hits"}' in samples
+
+    families = re.findall(r'^# TYPE (\S+) ', response.text, re.M)
+    assert len(families) == len(set(families))
+
+
+def test_scrapes_need_the_token_when_one_is_set(client, monkeypatch):
+    monkeypatch.setattr(metrics_router, 'METRICS_TOKEN', 'scraper')
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer other'}).status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer scraper'}).status_code == 200
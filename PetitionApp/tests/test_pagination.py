@@ -0,0 +1,65 @@
+import itertools
+import json
+from datetime import timedelta
+
+import pytest
+
+from models import Petition, Signature
+from routers.auth import create_access_token
+from schemas import PetitionResponse, SignatureResponse
+
+# a fresh owner per test, so each one sees only its own petitions
+OWNERS = itertools.count(300)
+
+
+@pytest.fixture
+def owner_headers(db):
+    owner = next(OWNERS)
+    db.add_all([Petition(user_id=owner, petition_name=f'page {i}', petition_text='text') for i in range(5)])
+    db.commit()
+    return {'Authorization': 'Bearer ' + create_access_token('pager', owner, 'User', timedelta(minutes=5))}
+
+
+def test_petitions_are_paged_by_id(client, owner_headers):
+    first = client.get('/petitions/?limit=2', headers=owner_headers)
+    assert first.status_code == 200, first.text
+    assert [row['petition_name'] for row in first.json()] == ['page 0', 'page 1']
+
+    ids = []
+    after = 0
+    while True:
+        page = client.get(f'/petitions/?limit=2&after={after}', headers=owner_headers)
+        ids += [row['id'] for row in page.json()]
+        if 'x-next-after' not in page.headers:
+            break
+        after = page.headers['x-next-after']
+    assert len(ids) == 5 and ids == sorted(ids)
+
+
+def test_petitions_stream_as_ndjson(client, owner_headers):
+    response = client.get('/petitions/?stream=true', headers=owner_headers)
+    assert response.headers['content-type'].startswith('application/x-ndjson')
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row['petition_name'] for row in rows] == [f'page {i}' for i in range(5)]
+    assert all(set(row) == set(PetitionResponse.model_fields) for row in rows)
+
+
+# the stream is sent as is, it must carry only what the response model
+# would: no legacy images, no email_normalized
+def test_stream_has_only_the_response_fields(client, db, owner_headers):
+    petition = db.query(Petition).filter(Petition.petition_name == 'page 0').order_by(Petition.id.desc()).first()
+    petition.images = 'aGVsbG8='
+    db.add(Signature(petition_id=petition.id, user_id=petition.user_id, email='Stream@Example.com'))
+    db.commit()
+
+    rows = [json.loads(line) for line in client.get('/petitions/?stream=true', headers=owner_headers).text.splitlines()]
+    assert rows[0]['id'] == petition.id and 'images' not in rows[0]
+    [signature] = [json.loads(line) for line in
+                   client.get('/signatures/?stream=true', headers=owner_headers).text.splitlines()]
+    assert set(signature) == set(SignatureResponse.model_fields)
+
+
+def test_list_needs_a_token(client):
+    assert client.get('/petitions/').status_code == 401
+    page = client.get('/petitions/list', follow_redirects=False)
+    assert page.status_code == 302 and page.headers['location'] == '/auth'
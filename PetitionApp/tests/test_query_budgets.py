@@ -0,0 +1,46 @@
+import pytest
+
+import querystats
+from models import Complaint, Petition, Signature
+
+
+@pytest.fixture
+def rows(db):
+    petitions = [Petition(user_id=1, petition_name='petição', petition_text='texto') for _ in range(3)]
+    db.add_all(petitions)
+    db.flush()
+    signature = Signature(petition_id=petitions[0].id, name='abc', email='budget@example.com')
+    complaints = [Complaint(name='abc', city='Rio', state='RJ', complaint_type=1, complaint_text='x') for _ in range(2)]
+    db.add(signature)
+    db.add_all(complaints)
+    db.commit()
+    return {'petitions': [p.id for p in petitions], 'signature': signature.id, 'complaints': [c.id for c in complaints]}
+
+
+def _check(response, budget):
+    assert response.status_code < 500, response.text
+    assert int(response.headers['x-query-count']) <= budget
+
+
+# each endpoint with a @query_budget, run in QUERY_BUDGET_MODE=raise (see
+# conftest), where going over answers 500 with the offending statements
+def test_budgeted_endpoints_stay_within_budget(client, admin_headers, rows):
+    assert querystats.QUERY_DEBUG and querystats.QUERY_BUDGET_MODE == 'raise'
+    first, second, third = rows['petitions']
+
+    _check(client.get(f'/petitions/{first}', headers=admin_headers), 2)
+    _check(client.get('/complaints/', headers=admin_headers), 3)
+    _check(client.delete(f'/admin/signature/{rows["signature"]}', headers=admin_headers), 3)
+    _check(client.delete(f'/petitions/{second}', headers=admin_headers), 3)
+    _check(client.delete(f'/admin/petition/{third}', headers=admin_headers), 3)
+    _check(client.delete(f'/complaints/{rows["complaints"][0]}', headers=admin_headers), 3)
+
+
+def test_going_over_budget_fails_the_request(client, admin_headers, rows, monkeypatch):
+    import routers.petitions
+
+    monkeypatch.setattr(routers.petitions.read_petition_by_id, 'query_budget', 1)
+    response = client.get(f'/petitions/{rows["petitions"][0]}', headers=admin_headers)
+    assert response.status_code == 500
+    assert response.json()['detail'] == 'Query budget exceeded'
+    assert len(response.json()['statements']) == 2
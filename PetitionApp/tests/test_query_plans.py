@@ -0,0 +1,64 @@
+import os
+
+import pytest
+from sqlalchemy import insert, select, text
+
+from models import Complaint, Petition, Signature
+from pagination import PageParams, _page_query
+from schemas import ComplaintResponse, PetitionResponse, SignatureResponse
+
+
+# enough rows, spread over enough keys, that the planner has a real choice.
+# Owners, types and emails sit outside the ranges other tests use
+PLAN_ROWS = int(os.getenv("QUERY_PLAN_ROWS", "20000"))
+
+
+@pytest.fixture(scope='module')
+def seeded(migrated):
+    from database import engine
+
+    petitions = max(1, PLAN_ROWS // 10)
+    with engine.begin() as conn:
+        first = conn.scalar(select(Petition.id).order_by(Petition.id.desc()).limit(1)) or 0
+        conn.execute(insert(Petition), [
+            {'user_id': 10000 + i % 500, 'petition_name': f'plan {i}', 'petition_text': 'seeded'}
+            for i in range(petitions)])
+        conn.execute(insert(Signature), [
+            {'petition_id': first + 1 + i % petitions, 'user_id': 10000 + i % 2000,
+             'email': f'plan{i}@example.com', 'name': 'seeded'}
+            for i in range(PLAN_ROWS)])
+        conn.execute(insert(Complaint), [
+            {'complaint_type': 10000 + i % 50, 'name': 'seeded', 'city': 'Rio', 'state': 'RJ', 'complaint_text': 'seeded'}
+            for i in range(petitions)])
+        # planner statistics, as a live database would have them
+        conn.execute(text('ANALYZE'))
+
+
+def _page(model, schema, *filters):
+    return _page_query(model, schema, list(filters), PageParams(limit=100, after=0, stream=False))
+
+
+# the query shapes behind the list endpoints, the dedup lookup and the
+# per-petition counts
+HOT_QUERIES = {
+    'signatures of a petition': _page(Signature, SignatureResponse, Signature.petition_id == 7),
+    'signatures of a user': _page(Signature, SignatureResponse, Signature.user_id == 10007),
+    'signature by email': select(Signature.id).where(Signature.email == 'plan7@example.com'),
+    'dedup lookup': select(Signature.id).where(Signature.petition_id == 7, Signature.email_normalized == 'plan7@example.com'),
+    'petitions of a user': _page(Petition, PetitionResponse, Petition.user_id == 10007),
+    'complaints of a type': _page(Complaint, ComplaintResponse, Complaint.complaint_type == 10007),
+}
+
+
+def _plan(db, stmt) -> list[str]:
+    sql = str(stmt.compile(db.get_bind(), compile_kwargs={'literal_binds': True}))
+    if db.get_bind().dialect.name == 'postgresql':
+        return [row[0] for row in db.execute(text(f'EXPLAIN {sql}'))]
+    return [row[-1] for row in db.execute(text(f'EXPLAIN QUERY PLAN {sql}'))]
+
+
+def test_hot_queries_use_an_index(seeded, db):
+    for name, stmt in HOT_QUERIES.items():
+        plan = _plan(db, stmt)
+        scans = [step for step in plan if 'Seq Scan' in step or step.startswith('SCAN ')]
+        assert not scans, f'{name} scans the table: {plan}'
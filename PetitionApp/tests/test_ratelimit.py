@@ -0,0 +1,148 @@
+import asyncio
+import itertools
+import json
+import time
+from datetime import timedelta
+
+import pytest
+
+import ratelimit
+from ratelimit import DatabaseBackend, Limit, MemoryBackend, Policy, RateLimitMiddleware
+from routers.auth import create_access_token
+from token_cache import token_cache
+
+
+emails = (f'limited{n}@example.com' for n in itertools.count())
+
+
+@pytest.fixture
+def limited(monkeypatch):
+    monkeypatch.setattr(ratelimit, 'RATE_LIMIT_ENABLED', True)
+    monkeypatch.setattr(ratelimit, 'RATE_LIMIT_BODY_BYTES', 1024)
+    monkeypatch.setattr(ratelimit, 'backend', MemoryBackend(100))
+    seen = []
+
+    # records the body each request that got through arrived with
+    async def app(scope, receive, send):
+        body, more_body = b'', True
+        while more_body:
+            message = await receive()
+            body += message.get('body', b'')
+            more_body = message.get('more_body', False)
+        seen.append(body)
+        await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    policies = [
+        Policy('sign', {'POST'}, r'/sign', [Limit('ip', '3/minute'), Limit('email', '1/minute')]),
+        Policy('write', {'POST'}, r'/write', [Limit('user', '1/minute')]),
+    ]
+    return RateLimitMiddleware(app, policies), seen
+
+
+# one request straight through the ASGI interface, so headers and chunking
+# are exactly what the test says. Returns the status and response headers
+def _call(middleware, path, headers=(), chunks=(b'',), client='10.0.0.1'):
+    scope = {'type': 'http', 'method': 'POST', 'path': path, 'client': (client, 1234),
+             'headers': [(name.encode(), value.encode()) for name, value in headers]}
+    messages = [{'type': 'http.request', 'body': chunk, 'more_body': n < len(chunks) - 1}
+                for n, chunk in enumerate(chunks)]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(middleware(scope, receive, send))
+    start = sent[0]
+    return start['status'], {name.decode(): value.decode() for name, value in start['headers']}
+
+
+def _json(email):
+    body = json.dumps({'email': email}).encode()
+    return [('content-type', 'application/json'), ('content-length', str(len(body)))], body
+
+
+def test_ip_limit_answers_429_with_retry_after(limited):
+    middleware, seen = limited
+    for _ in range(3):
+        assert _call(middleware, '/sign')[0] == 200
+    status, headers = _call(middleware, '/sign')
+    assert status == 429 and int(headers['retry-after']) >= 1
+    assert _call(middleware, '/sign', client='10.0.0.2')[0] == 200
+    assert len(seen) == 4
+
+
+def test_email_limit_reads_the_body_and_replays_it(limited):
+    middleware, seen = limited
+    email = next(emails)
+    headers, body = _json(email)
+    assert _call(middleware, '/sign', headers, [body], client='10.0.1.1')[0] == 200
+    assert seen == [body]
+    # normalized, so case and spaces don't make a new key
+    headers, body = _json(f' {email.upper()} ')
+    assert _call(middleware, '/sign', headers, [body], client='10.0.1.2')[0] == 429
+
+
+def test_chunked_bodies_are_read_up_to_the_cap(limited):
+    middleware, seen = limited
+    email = next(emails)
+    body = json.dumps({'email': email}).encode()
+    chunked = [('content-type', 'application/json')]
+    assert _call(middleware, '/sign', chunked, [body[:5], body[5:]], client='10.0.2.1')[0] == 200
+    assert _call(middleware, '/sign', chunked, [body], client='10.0.2.2')[0] == 429
+
+    # past the cap the email isn't looked at, and the app still gets every byte
+    large = json.dumps({'email': email, 'padding': 'x' * 2000}).encode()
+    parts = [large[:600], large[600:1200], large[1200:]]
+    assert _call(middleware, '/sign', chunked, parts, client='10.0.2.3')[0] == 200
+    assert seen[-1] == large
+
+
+@pytest.mark.parametrize('length', ['abc', '-', '1e3'])
+def test_malformed_content_length_skips_the_email_key(limited, length):
+    middleware, seen = limited
+    email = next(emails)
+    body = json.dumps({'email': email}).encode()
+    headers = [('content-type', 'application/json'), ('content-length', length)]
+    for n in range(2):
+        assert _call(middleware, '/sign', headers, [body], client=f'10.0.3.{n}')[0] == 200
+    assert seen[-1] == body
+
+
+def test_declared_length_over_the_cap_skips_the_email_key(limited):
+    middleware, seen = limited
+    headers, body = _json(next(emails))
+    headers = [headers[0], ('content-length', '4096')]
+    for n in range(2):
+        assert _call(middleware, '/sign', headers, [body], client=f'10.0.4.{n}')[0] == 200
+
+
+def test_user_limit_reuses_the_token_cache_without_counting(limited):
+    middleware, _ = limited
+    token = create_access_token('limited', 424242, 'User', timedelta(minutes=5))
+    headers = [('authorization', f'Bearer {token}')]
+    stats = dict(token_cache.stats)
+
+    assert ratelimit.bearer_user({}, dict(headers), {}) == 424242
+    assert token_cache.stats == stats
+    # verified once, then the route's own lookup is a hit
+    assert token_cache.peek(token) == {'username': 'limited', 'id': 424242, 'user_role': 'User'}
+
+    assert _call(middleware, '/write', headers)[0] == 200
+    assert _call(middleware, '/write', headers, client='10.0.5.1')[0] == 429
+    assert token_cache.stats == stats
+
+    token_cache.revoke(token)
+    assert ratelimit.bearer_user({}, dict(headers), {}) is None
+    assert ratelimit.bearer_user({}, {'authorization': 'Bearer not-a-jwt'}, {}) is None
+
+
+def test_database_backend_shares_one_bucket(client):
+    backend = DatabaseBackend()
+    key = f'test:{time.time()}'
+    waits = [client.portal.call(backend.take, key, 2, 1 / 60) for _ in range(3)]
+    assert waits[:2] == [0, 0]
+    assert 0 < waits[2] <= 60
@@ -0,0 +1,79 @@
+import itertools
+
+from sqlalchemy import delete
+
+import reference
+from database import upsert
+from models import CacheVersion, Complaint_Type
+from reference import ComplaintTypeCache
+
+
+codes = itertools.count(70000)
+
+
+# what another worker does: write the row and bump the stamp together
+def _write_elsewhere(db, code, dictionary):
+    row = Complaint_Type(complaint_type=code, dictionary=dictionary)
+    db.add(row)
+    db.execute(reference._bump_statement(db, ComplaintTypeCache.name))
+    db.commit()
+    return row
+
+
+def test_reads_within_the_window_skip_the_database(monkeypatch, db):
+    monkeypatch.setattr(reference, 'REFERENCE_CHECK_SECONDS', 60)
+    cache = ComplaintTypeCache()
+    cache.refresh(db)
+    assert cache.stats == {'hits': 0, 'reloads': 1, 'checks': 1}
+
+    code = next(codes)
+    _write_elsewhere(db, code, 'not seen yet')
+    cache.refresh(db)
+    assert cache.stats['hits'] == 1 and cache.stats['checks'] == 1
+    assert cache.label(code) is None
+
+
+def test_a_moved_stamp_reloads_after_the_window(monkeypatch, db):
+    monkeypatch.setattr(reference, 'REFERENCE_CHECK_SECONDS', 0)
+    cache = ComplaintTypeCache()
+    cache.refresh(db)
+    cache.refresh(db)
+    assert cache.stats['reloads'] == 1 and cache.stats['checks'] == 2
+
+    code = next(codes)
+    row = _write_elsewhere(db, code, 'buraco')
+    cache.refresh(db)
+    assert cache.stats['reloads'] == 2
+    assert cache.label(code) == 'buraco'
+    assert cache.get(row.id) == {'id': row.id, 'complaint_type': code, 'dictionary': 'buraco'}
+    assert [r['id'] for r in cache.rows()] == sorted(r['id'] for r in cache.rows())
+
+
+def test_a_missing_stamp_reads_as_version_zero(monkeypatch, db):
+    monkeypatch.setattr(reference, 'REFERENCE_CHECK_SECONDS', 0)
+    db.execute(delete(CacheVersion).where(CacheVersion.name == ComplaintTypeCache.name))
+    db.commit()
+    cache = ComplaintTypeCache()
+    cache.refresh(db)
+    assert cache.version == 0
+    db.execute(upsert(db, CacheVersion).values(name=ComplaintTypeCache.name, version=1)
+               .on_conflict_do_nothing(index_elements=['name']))
+    db.commit()
+    cache.refresh(db)
+    assert cache.version == 1 and cache.stats['reloads'] == 2
+
+
+def test_api_writes_are_read_back_at_once(monkeypatch, client, admin_headers):
+    monkeypatch.setattr(reference, 'REFERENCE_CHECK_SECONDS', 60)
+    code = next(codes)
+    created = client.post('/complaint_types/', json={'complaint_type': code, 'dictionary': 'lixo'}, headers=admin_headers)
+    assert created.status_code == 201
+    type_id = created.json()['id']
+    assert client.get(f'/complaint_types/{type_id}', headers=admin_headers).json()['dictionary'] == 'lixo'
+
+    client.put(f'/complaint_types/{type_id}', json={'complaint_type': code, 'dictionary': 'entulho'}, headers=admin_headers)
+    assert client.get(f'/complaint_types/{type_id}', headers=admin_headers).json()['dictionary'] == 'entulho'
+    assert reference.complaint_types.label(code) == 'entulho'
+
+    assert client.delete(f'/complaint_types/{type_id}', headers=admin_headers).status_code == 204
+    assert client.get(f'/complaint_types/{type_id}', headers=admin_headers).status_code == 404
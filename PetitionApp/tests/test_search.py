@@ -0,0 +1,68 @@
+from models import Complaint, Petition
+
+
+def _search(client, headers, **params):
+    return client.get('/search/', params=params, headers=headers)
+
+
+def test_name_matches_rank_first_and_accents_are_ignored(client, admin_headers, db):
+    in_text = Petition(user_id=1, petition_name='praça', petition_text='reforma da Quixadá')
+    in_name = Petition(user_id=1, petition_name='Reforma de Quixadá', petition_text='praça')
+    db.add_all([in_text, in_name])
+    db.commit()
+
+    response = _search(client, admin_headers, q='quixada')
+    assert response.status_code == 200
+    assert [hit['id'] for hit in response.json()] == [in_name.id, in_text.id]
+    assert set(response.json()[0]) == {'id', 'user_id', 'petition_name', 'rank'}
+    assert 'X-Next-Cursor' not in response.headers
+
+
+def test_complaints_are_searched_by_text(client, admin_headers, db):
+    complaint = Complaint(name='c', city='Rio', state='RJ', complaint_type=1, complaint_text='buraco em Jacarepaguá')
+    db.add(complaint)
+    db.commit()
+
+    hits = _search(client, admin_headers, q='jacarepagua', type='complaint').json()
+    assert [hit['id'] for hit in hits] == [complaint.id]
+    assert hits[0]['complaint_text'] == 'buraco em Jacarepaguá'
+    assert _search(client, admin_headers, q='jacarepagua').json() == []
+
+
+def test_cursor_pages_through_every_hit_once(client, admin_headers, db):
+    petitions = [Petition(user_id=1, petition_name=f'paginada {i}', petition_text='x') for i in range(5)]
+    db.add_all(petitions)
+    db.commit()
+
+    seen, params = [], {'q': 'paginada', 'limit': 2}
+    while True:
+        response = _search(client, admin_headers, **params)
+        seen += [hit['id'] for hit in response.json()]
+        if 'X-Next-Cursor' not in response.headers:
+            break
+        params['cursor'] = response.headers['X-Next-Cursor']
+    assert sorted(seen) == sorted(p.id for p in petitions)
+    assert len(seen) == len(set(seen))
+
+
+def test_edits_and_deletes_reach_the_index(client, admin_headers, db):
+    petition = Petition(user_id=1, petition_name='antiga', petition_text='x')
+    db.add(petition)
+    db.commit()
+    assert len(_search(client, admin_headers, q='antiga').json()) == 1
+
+    petition.petition_name = 'renomeada'
+    db.commit()
+    assert _search(client, admin_headers, q='antiga').json() == []
+    assert [hit['id'] for hit in _search(client, admin_headers, q='renomeada').json()] == [petition.id]
+
+    db.delete(petition)
+    db.commit()
+    assert _search(client, admin_headers, q='renomeada').json() == []
+
+
+def test_bad_requests(client, admin_headers):
+    assert _search(client, admin_headers, q='x', cursor='not-a-cursor').status_code == 422
+    assert _search(client, admin_headers, q='x', type='user').status_code == 422
+    assert _search(client, admin_headers, q='!!!').json() == []
+    assert client.get('/search/', params={'q': 'x'}).status_code == 401
@@ -0,0 +1,81 @@
+import base64
+import io
+import json
+
+import pytest
+from PIL import Image
+
+import thumbnails
+from blobstore import blob_store
+
+
+def image_bytes(mode='RGB', size=(800, 400), fmt='PNG') -> bytes:
+    out = io.BytesIO()
+    Image.new(mode, size, 'blue').save(out, format=fmt)
+    return out.getvalue()
+
+
+@pytest.fixture
+def photo():
+    return blob_store.put(image_bytes(fmt='JPEG'))
+
+
+def test_variants_cover_each_width(photo):
+    thumbnails.generate(photo)
+    path, media_type, width = thumbnails.select_variant(photo, 200, accept_webp=True)
+    assert (media_type, width) == ('image/webp', 320)
+    assert Image.open(path).size == (320, 160)
+
+    path, media_type, width = thumbnails.select_variant(photo, 200, accept_webp=False)
+    assert (media_type, width) == ('image/jpeg', 320)
+
+    # never upscaled past the original's 800px
+    path, _, width = thumbnails.select_variant(photo, 5000, accept_webp=True)
+    assert width == 1280 and Image.open(path).size == (800, 400)
+
+
+def test_transparent_images_fall_back_to_png():
+    digest = blob_store.put(image_bytes(mode='RGBA', size=(200, 100)))
+    thumbnails.generate(digest)
+    _, media_type, _ = thumbnails.select_variant(digest, 160, accept_webp=False)
+    assert media_type == 'image/png'
+
+
+def test_undecodable_blob_gets_no_variants():
+    digest = blob_store.put(b'not an image at all')
+    thumbnails.generate(digest)
+    assert thumbnails.select_variant(digest, 160, accept_webp=True) is None
+
+
+def test_missing_variant_redirects_to_the_original(client):
+    digest = blob_store.put(image_bytes(size=(300, 300)))
+    response = client.get(f'/petitions/images/{digest}?w=160', follow_redirects=False)
+    assert response.status_code == 302
+    assert response.headers['location'].endswith(f'/petitions/images/{digest}')
+    assert response.headers['cache-control'] == 'no-store'
+
+
+def test_variant_is_served_by_accept(client):
+    digest = blob_store.put(image_bytes(size=(300, 300)))
+    thumbnails.generate(digest)
+
+    webp = client.get(f'/petitions/images/{digest}?w=100', headers={'Accept': 'image/webp,*/*'})
+    assert webp.status_code == 200 and webp.headers['content-type'] == 'image/webp'
+    assert webp.headers['vary'] == 'Accept' and webp.headers['etag'] == f'"{digest}-160-webp"'
+    assert Image.open(io.BytesIO(webp.content)).size == (160, 160)
+
+    png = client.get(f'/petitions/images/{digest}?w=100')
+    assert png.headers['content-type'] == 'image/jpeg'
+    again = client.get(f'/petitions/images/{digest}?w=100', headers={'If-None-Match': png.headers['etag']})
+    assert again.status_code == 304
+
+
+def test_thumbnail_job_is_queued_for_new_images(client, admin_headers, db):
+    from models import Job
+
+    created = client.post('/petitions/', headers=admin_headers, json={
+        'petition_name': 'queued', 'petition_text': 'text',
+        'images': base64.b64encode(image_bytes(size=(64, 64))).decode()})
+    digest = created.json()['image_ref']
+    payloads = [json.loads(payload) for payload, in db.query(Job.payload).filter(Job.name == 'thumbnails')]
+    assert {'digest': digest} in payloads
@@ -0,0 +1,69 @@
+import time
+from datetime import timedelta
+
+from routers.auth import create_access_token
+from token_cache import REVOKED, TokenCache, token_cache
+
+
+def test_entries_live_until_the_token_expires(monkeypatch):
+    cache = TokenCache(10)
+    now = time.time()
+    cache.put('token', {'id': 1}, now + 60)
+    assert cache.get('token') == {'id': 1}
+
+    monkeypatch.setattr(time, 'time', lambda: now + 61)
+    assert cache.get('token') is None
+    assert cache.stats['expired'] == 1 and len(cache) == 0
+
+
+def test_least_recently_used_is_evicted():
+    cache = TokenCache(2)
+    exp = time.time() + 60
+    cache.put('a', 'A', exp)
+    cache.put('b', 'B', exp)
+    cache.get('a')
+    cache.put('c', 'C', exp)
+    assert cache.get('b') is None
+    assert cache.get('a') == 'A' and cache.get('c') == 'C'
+
+
+def test_tokens_without_exp_are_not_cached():
+    cache = TokenCache(2)
+    cache.put('forever', {'id': 1}, None)
+    assert len(cache) == 0
+
+
+def test_revoked_until_expiry_even_if_never_cached():
+    cache = TokenCache(2)
+    cache.put('cached', {'id': 1}, time.time() + 60)
+    cache.revoke('cached')
+    cache.revoke('unseen', time.time() + 60)
+    cache.revoke('no exp')
+    assert cache.get('cached') is REVOKED and cache.get('unseen') is REVOKED
+    assert len(cache) == 2
+
+
+def _headers(minutes=5):
+    return {'Authorization': 'Bearer ' + create_access_token('cached', 404, 'User', timedelta(minutes=minutes))}
+
+
+def test_repeat_requests_hit_the_cache(client):
+    headers = _headers()
+    assert client.get('/petitions/', headers=headers).status_code == 200
+    hits = token_cache.stats['hits']
+    assert client.get('/petitions/', headers=headers).status_code == 200
+    assert token_cache.stats['hits'] == hits + 1
+
+
+def test_logout_revokes_the_token(client):
+    headers = _headers()
+    assert client.get('/petitions/', headers=headers).status_code == 200
+    assert client.get('/auth/logout', headers=headers).status_code == 200
+    assert client.get('/petitions/', headers=headers).status_code == 401
+
+
+# get_current_user answers a token jose refuses with 404, and caches nothing
+def test_expired_token_is_refused(client):
+    cached = len(token_cache)
+    assert client.get('/petitions/', headers=_headers(minutes=-1)).status_code == 404
+    assert len(token_cache) == cached
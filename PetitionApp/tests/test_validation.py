@@ -0,0 +1,75 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from starlette.concurrency import run_in_threadpool
+
+import validation
+from models import Petition, Signature
+
+MISSING = 10 ** 9
+
+
+@pytest.fixture
+def signature_id(db):
+    petition = Petition(user_id=1, petition_name='validation', petition_text='validation')
+    db.add(petition)
+    db.flush()
+    signature = Signature(petition_id=petition.id, email=f'validate{petition.id}@example.com', validated_signature=False)
+    db.add(signature)
+    db.commit()
+    return signature.id
+
+
+def _validated(db, signature_id):
+    db.expire_all()
+    return db.get(Signature, signature_id).validated_signature
+
+
+def test_results_are_per_id(client, db, signature_id):
+    results = client.portal.call(run_in_threadpool, validation.apply_validations, [signature_id, MISSING, signature_id])
+    assert results == [True, False, True]
+    assert _validated(db, signature_id)
+    # already validated still answers True
+    assert client.portal.call(run_in_threadpool, validation.apply_validations, [signature_id]) == [True]
+
+
+def test_token_link(client, db, signature_id):
+    response = client.get('/signatures/validate', params={'token': validation.issue_token(signature_id)})
+    assert response.status_code == 200 and response.json() is True
+    assert _validated(db, signature_id)
+    assert client.get('/signatures/validate', params={'token': 'forged'}).status_code == 400
+
+
+# one batch holding a real and a missing signature answers each on its own
+def test_missing_signature_is_404_in_a_batch(client, db, signature_id):
+    assert validation.validation_writer.running
+    tokens = [validation.issue_token(signature_id), validation.issue_token(MISSING)]
+    with ThreadPoolExecutor(2) as pool:
+        responses = list(pool.map(lambda token: client.put('/signatures/validate', params={'token': token}), tokens))
+    assert [response.status_code for response in responses] == [200, 404]
+    assert _validated(db, signature_id)
+
+
+def test_old_link_needs_its_token_once_the_window_closes(client, db, signature_id, monkeypatch):
+    monkeypatch.setattr(validation, 'LEGACY_LINKS_UNTIL', None)
+    assert client.get(f'/signatures/validate/{signature_id}').status_code == 400
+    other = validation.issue_token(signature_id + 1)
+    assert client.get(f'/signatures/validate/{signature_id}', params={'token': other}).status_code == 400
+    assert not _validated(db, signature_id)
+
+    token = validation.issue_token(signature_id)
+    assert client.get(f'/signatures/validate/{signature_id}', params={'token': token}).status_code == 200
+    assert _validated(db, signature_id)
+
+
+def test_old_link_without_token_during_the_window(client, db, signature_id, monkeypatch):
+    now = datetime.now(timezone.utc)
+    monkeypatch.setattr(validation, 'LEGACY_LINKS_UNTIL', now - timedelta(minutes=1))
+    assert client.get(f'/signatures/validate/{signature_id}').status_code == 400
+
+    monkeypatch.setattr(validation, 'LEGACY_LINKS_UNTIL', now + timedelta(days=1))
+    assert client.get(f'/signatures/validate/{MISSING}').status_code == 404
+    response = client.get(f'/signatures/validate/{signature_id}')
+    assert response.status_code == 200 and response.json() is True
+    assert _validated(db, signature_id)
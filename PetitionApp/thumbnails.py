@@ -0,0 +1,79 @@
+import io
+import os
+import tempfile
+
+from PIL import Image
+
+from blobstore import BLOB_STORE_ROOT, blob_store, is_digest
+
+
+# derivatives are generated once per image, in the background, and cached on
+# disk next to the blob store. Widths larger than the original are capped to it
+THUMBNAIL_WIDTHS = sorted(int(w) for w in os.getenv("THUMBNAIL_WIDTHS", "160,320,640,1280").split(','))
+DERIVATIVES_ROOT = os.getenv("DERIVATIVES_ROOT", os.path.join(BLOB_STORE_ROOT, 'derivatives'))
+WEBP_QUALITY = int(os.getenv("WEBP_QUALITY", "80"))
+JPEG_QUALITY = int(os.getenv("JPEG_QUALITY", "85"))
+
+MEDIA_TYPES = {'webp': 'image/webp', 'jpeg': 'image/jpeg', 'png': 'image/png'}
+
+
+def derivative_path(digest: str, width: int, fmt: str) -> str:
+    return os.path.join(DERIVATIVES_ROOT, digest[:2], digest, f'{width}.{fmt}')
+
+
+def _save(image: Image.Image, path: str, fmt: str, **options):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            image.save(f, format=fmt.upper(), **options)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+# the non-WebP fallback keeps transparency as PNG, everything else becomes JPEG
+def _fallback_format(image: Image.Image) -> str:
+    return 'png' if image.mode in ('RGBA', 'LA', 'P') else 'jpeg'
+
+
+def generate(digest: str):
+    if not blob_store.exists(digest):
+        return
+    try:
+        original = Image.open(io.BytesIO(b''.join(blob_store.iter(digest))))
+        original.load()
+    except (OSError, Image.DecompressionBombError):
+        return  # not an image we can decode, the original is still served as is
+
+    os.makedirs(os.path.dirname(derivative_path(digest, 0, 'webp')), exist_ok=True)
+    fallback = _fallback_format(original)
+    for width in THUMBNAIL_WIDTHS:
+        if os.path.exists(derivative_path(digest, width, 'webp')):
+            continue
+        target = min(width, original.width)
+        height = max(1, round(original.height * target / original.width))
+        resized = original.resize((target, height), Image.LANCZOS)
+        if fallback == 'jpeg':
+            resized = resized.convert('RGB')
+            _save(resized, derivative_path(digest, width, 'jpeg'), 'jpeg', quality=JPEG_QUALITY, optimize=True)
+        else:
+            resized = resized.convert('RGBA')
+            _save(resized, derivative_path(digest, width, 'png'), 'png', optimize=True)
+        # webp last: its presence marks the width as done
+        _save(resized, derivative_path(digest, width, 'webp'), 'webp', quality=WEBP_QUALITY)
+
+
+# smallest cached width that covers the request, or the largest one we have.
+# Returns (path, media_type, width) or None if nothing has been generated yet
+def select_variant(digest: str, width: int, accept_webp: bool):
+    if not is_digest(digest):
+        return None
+    candidates = [w for w in THUMBNAIL_WIDTHS if w >= width] or THUMBNAIL_WIDTHS[-1:]
+    chosen = candidates[0]
+    formats = ('webp', 'jpeg', 'png') if accept_webp else ('jpeg', 'png')
+    for fmt in formats:
+        path = derivative_path(digest, chosen, fmt)
+        if os.path.exists(path):
+            return path, MEDIA_TYPES[fmt], chosen
+    return None
@@ -0,0 +1,85 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
+
+
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+
+# stored in place of the claims when a token is logged out, so it stays
+# rejected until it would have expired anyway
+REVOKED = object()
+
+
+# bounded LRU of token digest -> verified claims, each entry lives until the
+# token's own `exp`. Only touched from the event loop, so no locking
+class TokenCache:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self.stats = {'hits': 0, 'misses': 0, 'expired': 0, 'revoked': 0}
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+    def get(self, token: str):
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats['misses'] += 1
+            return None
+        exp, claims = entry
+        if exp <= time.time():
+            del self._entries[key]
+            self.stats['expired'] += 1
+            self.stats['misses'] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats['hits'] += 1
+        return claims
+
+    # the cached claims without counting a lookup or refreshing the entry,
+    # for callers that aren't the authentication itself
+    def peek(self, token: str):
+        entry = self._entries.get(self._key(token))
+        if entry is None or entry[0] <= time.time():
+            return None
+        return entry[1]
+
+    def put(self, token: str, claims, exp):
+        if exp is None:
+            return
+        key = self._key(token)
+        self._entries[key] = (exp, claims)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def revoke(self, token: str, exp=None):
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is not None:
+            exp = entry[0]
+        if exp is None:
+            return
+        self._entries[key] = (exp, REVOKED)
+        self.stats['revoked'] += 1
+
+    def hit_rate(self) -> float:
+        lookups = self.stats['hits'] + self.stats['misses']
+        return self.stats['hits'] / lookups if lookups else 0.0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# what the cache holds for a verified token, None when the claims don't name
+# a user
+def user_from_claims(payload: dict) -> dict | None:
+    if payload.get('sub') is None or payload.get('id') is None:
+        return None
+    return {'username': payload['sub'], 'id': payload['id'], 'user_role': payload.get('role')}
+
+
+token_cache = TokenCache(TOKEN_CACHE_SIZE)
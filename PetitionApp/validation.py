@@ -0,0 +1,141 @@
+import hashlib
+import hmac
+import os
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from anyio import from_thread
+from dotenv import load_dotenv
+from jose import jwt, JWTError
+from sqlalchemy import Integer, any_, bindparam, select, update
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from ingest import BatchWriter
+from models import Signature
+import counters
+import live
+
+load_dotenv()
+
+SECRET_KEY = os.getenv("AUTH_SECRET_KEY")
+ALGORITHM = os.getenv("ALGORITHM")
+
+# validation links are signed with their own key and audience, so a link
+# mailed to a signer can never pass as a login token. Derived from the auth
+# key unless set
+VALIDATION_SECRET_KEY = os.getenv("VALIDATION_SECRET_KEY") or hmac.new(
+    (SECRET_KEY or '').encode(), b'signature-validation', hashlib.sha256).hexdigest()
+VALIDATION_AUDIENCE = 'signature-validation'
+
+VALIDATION_BATCHING = os.getenv("VALIDATION_BATCHING", "1") == "1"
+VALIDATION_BATCH_SIZE = int(os.getenv("VALIDATION_BATCH_SIZE", "1000"))
+VALIDATION_BATCH_MAX_LATENCY_MS = int(os.getenv("VALIDATION_BATCH_MAX_LATENCY_MS", "100"))
+VALIDATION_TOKEN_TTL_HOURS = int(os.getenv("VALIDATION_TOKEN_TTL_HOURS", "168"))
+BULK_VALIDATION_CHUNK = 5000
+# links mailed before validation tokens carried only the signature id. They
+# keep working until this ISO 8601 moment (UTC unless it says otherwise);
+# unset, every link needs its token
+VALIDATION_LEGACY_LINKS_UNTIL = os.getenv("VALIDATION_LEGACY_LINKS_UNTIL")
+LEGACY_LINKS_UNTIL = None
+if VALIDATION_LEGACY_LINKS_UNTIL:
+    LEGACY_LINKS_UNTIL = datetime.fromisoformat(VALIDATION_LEGACY_LINKS_UNTIL)
+    if LEGACY_LINKS_UNTIL.tzinfo is None:
+        LEGACY_LINKS_UNTIL = LEGACY_LINKS_UNTIL.replace(tzinfo=timezone.utc)
+
+
+def legacy_links_open() -> bool:
+    return LEGACY_LINKS_UNTIL is not None and datetime.now(timezone.utc) < LEGACY_LINKS_UNTIL
+
+
+# for the validation link mailed to a signer, checked on click without
+# reading the signature
+def issue_token(signature_id: int) -> str:
+    expires = datetime.now(timezone.utc) + timedelta(hours=VALIDATION_TOKEN_TTL_HOURS)
+    claims = {'sub': 'validate', 'aud': VALIDATION_AUDIENCE, 'sid': signature_id, 'exp': expires}
+    return jwt.encode(claims, VALIDATION_SECRET_KEY, algorithm=ALGORITHM)
+
+
+# the signature id, or None if the token is forged, expired or not a
+# validation token
+def read_token(token: str) -> int | None:
+    try:
+        claims = jwt.decode(token, VALIDATION_SECRET_KEY, algorithms=[ALGORITHM], audience=VALIDATION_AUDIENCE)
+    except JWTError:
+        return None
+    if claims.get('sub') != 'validate' or not isinstance(claims.get('sid'), int):
+        return None
+    return claims['sid']
+
+
+# one bound array on Postgres, so the statement text (and its plan) is the
+# same whatever the number of ids
+def _id_in(db: Session, ids: list[int]):
+    if db.get_bind().dialect.name == 'postgresql':
+        return Signature.id == any_(bindparam('ids', ids, type_=ARRAY(Integer)))
+    return Signature.id.in_(ids)
+
+
+# flips validated_signature for every id that isn't already in that state in
+# one UPDATE, and moves the validated counters by the rows that did change
+def set_validated(db: Session, ids: list[int], validated: bool) -> Counter:
+    changed = Counter()
+    for start in range(0, len(ids), BULK_VALIDATION_CHUNK):
+        chunk = ids[start:start + BULK_VALIDATION_CHUNK]
+        stmt = (
+            update(Signature)
+            .where(_id_in(db, chunk))
+            .where(Signature.validated_signature.is_(True) if not validated
+                   else (Signature.validated_signature.is_(False) | Signature.validated_signature.is_(None)))
+            .values(validated_signature=validated)
+            .returning(Signature.petition_id)
+            .execution_options(synchronize_session=False)
+        )
+        changed.update(petition_id for petition_id in db.scalars(stmt) if petition_id is not None)
+    step = 1 if validated else -1
+    counters.increment_many(db, {petition_id: (0, step * count) for petition_id, count in changed.items()})
+    return changed
+
+
+def _publish(changed: Counter, step: int):
+    for petition_id, count in changed.items():
+        live.publish_counts(petition_id, validated=step * count)
+
+
+# flush for the validation buffer, runs in the threadpool. Each caller gets
+# True if its signature is (now) validated, False if there is no such
+# signature, e.g. deleted after its link was mailed
+def apply_validations(ids: list[int]) -> list:
+    unique = sorted(set(ids))
+    db = SessionLocal()
+    try:
+        changed = set_validated(db, unique, True)
+        found = set()
+        for start in range(0, len(unique), BULK_VALIDATION_CHUNK):
+            chunk = unique[start:start + BULK_VALIDATION_CHUNK]
+            found.update(db.scalars(select(Signature.id).where(_id_in(db, chunk))))
+        db.commit()
+    finally:
+        db.close()
+    from_thread.run_sync(_publish, changed, 1)
+    return [id in found for id in ids]
+
+
+# from the admin endpoint, also run in the threadpool
+def bulk_set_validated(ids: list[int], validated: bool) -> int:
+    db = SessionLocal()
+    try:
+        changed = set_validated(db, sorted(set(ids)), validated)
+        db.commit()
+    finally:
+        db.close()
+    from_thread.run_sync(_publish, changed, 1 if validated else -1)
+    return sum(changed.values())
+
+
+validation_writer = BatchWriter(
+    apply_validations,
+    batch_size=VALIDATION_BATCH_SIZE,
+    max_latency=VALIDATION_BATCH_MAX_LATENCY_MS / 1000,
+)